@@ -0,0 +1,91 @@
+import argparse
+import json
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from mini_firehose.adaptive import AdaptiveFlushConfig
+from mini_firehose.mini_firehose import MiniFirehose, FirehoseConfig
+from sinks.local.local_sink import LocalSink
+
+# (messages per second, seconds), a burst between two quiet periods
+PHASES = ((200, 3), (50_000, 3), (200, 3))
+
+
+class TimedSink(LocalSink):
+    # Records how long the oldest message of each flush waited until the flush was written
+    def __init__(self, directory):
+        super().__init__(directory, "json")
+        self.latencies = []
+        self.lock = threading.Lock()
+
+    def deliver(self, data, filename=None):
+        result = super().deliver(data, filename)
+        delivered = time.time()
+        with self.lock:
+            self.latencies.append(delivered - min(record["created_at"] for record in data))
+        return result
+
+
+def produce(firehose, phases, chunk=100):
+    # Paced in chunks of messages, each stamped with the time it was added
+    i = 0
+    for rate, seconds in phases:
+        ends = time.time() + seconds
+        while time.time() < ends:
+            started = time.time()
+            count = max(int(rate * 0.01), 1)
+            for start in range(0, count, chunk):
+                firehose.add_messages([{"id": i + n, "created_at": time.time(), "payload": "x" * 100}
+                                       for n in range(min(chunk, count - start))])
+            i += count
+            time.sleep(max(0.01 - (time.time() - started), 0))
+    return i
+
+
+def run_mode(mode, phases, target_latency, static_count):
+    if mode == "adaptive":
+        config = FirehoseConfig(buffer_size_limit_mb=-1,
+                                adaptive=AdaptiveFlushConfig(min_count=100, target_latency=target_latency))
+    else:
+        config = FirehoseConfig(buffer_count_limit=static_count, buffer_time_limit=60, buffer_size_limit_mb=-1)
+    with tempfile.TemporaryDirectory() as directory:
+        sink = TimedSink(directory)
+        firehose = MiniFirehose(f"adaptive-bench-{mode}", [sink], config)
+        firehose.start()
+        messages = produce(firehose, phases)
+        stats = firehose.stats()
+        firehose.stop()
+    latencies = np.array(sink.latencies)
+    return {
+        "benchmark": "adaptive_flush",
+        "mode": mode,
+        "messages": messages,
+        "files": len(latencies),
+        "messages_per_file": round(messages / len(latencies)),
+        # The final flush on stop is included, static limits hold the quiet tail until then
+        "oldest_message_latency_p50_s": round(float(np.percentile(latencies, 50)), 3),
+        "oldest_message_latency_max_s": round(float(latencies.max()), 3),
+        "adaptive": stats.get("adaptive"),
+    }
+
+
+def run(target_latency=1.0, static_count=10_000, phases=PHASES):
+    # static: the default time limit of 60 s with a count limit sized for the burst
+    return [run_mode(mode, phases, target_latency, static_count) for mode in ("static", "adaptive")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flush latency and file count of static and adaptive flushing "
+                                                 "under a burst of messages")
+    parser.add_argument("--target-latency", type=float, default=1.0)
+    parser.add_argument("--static-count", type=int, default=10_000)
+    args = parser.parse_args()
+    for result in run(args.target_latency, args.static_count):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import json
+import threading
+import time
+
+from mini_firehose.mini_firehose import MiniFirehose, FirehoseConfig
+from sinks.sink import Sink
+
+
+class NullSink(Sink):
+    def deliver(self, data, filename=None):
+        pass
+
+
+class LockedFlushMiniFirehose(MiniFirehose):
+    # Reproduces the previous ingest path, which dispatched the flush while holding buffer_lock
+    def add_message(self, message):
+        with self.buffer_lock:
+            self.buffer.append(message)
+            self.buffer_count += 1
+            self.buffer_size_in_mb += self.size_estimator.estimate(message) / (1024 * 1024)
+            if self.buffer_count >= self.config.buffer_count_limit:
+                self._dispatch(self._swap_buffer(), "buffer-reached")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(producers=16, messages_per_producer=20000, buffer_count_limit=1000, locked=False):
+    config = FirehoseConfig(buffer_count_limit=buffer_count_limit, buffer_time_limit=-1, buffer_size_limit_mb=-1)
+    firehose_class = LockedFlushMiniFirehose if locked else MiniFirehose
+    firehose = firehose_class(name="contention-bench", sinks=[NullSink()], config=config)
+    message = {"id": 1, "region": "East", "payload": "x" * 64}
+    latencies = [[] for _ in range(producers)]
+    barrier = threading.Barrier(producers)
+
+    def produce(samples):
+        barrier.wait()
+        for _ in range(messages_per_producer):
+            started = time.perf_counter_ns()
+            firehose.add_message(message)
+            samples.append(time.perf_counter_ns() - started)
+
+    threads = [threading.Thread(target=produce, args=(samples,)) for samples in latencies]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    firehose.stop()
+
+    all_latencies = sorted(sample for samples in latencies for sample in samples)
+    return {
+        "benchmark": "add_message_contention",
+        "mode": "locked-flush" if locked else "double-buffered",
+        "producers": producers,
+        "messages": len(all_latencies),
+        "flushes": len(all_latencies) // buffer_count_limit,
+        "records_per_sec": round(len(all_latencies) / elapsed),
+        "p50_us": percentile(all_latencies, 50) / 1000,
+        "p99_us": percentile(all_latencies, 99) / 1000,
+        "p999_us": percentile(all_latencies, 99.9) / 1000,
+        "max_us": all_latencies[-1] / 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="add_message latency under producer contention")
+    parser.add_argument("--producers", type=int, default=16)
+    parser.add_argument("--messages", type=int, default=20000, help="Messages per producer")
+    parser.add_argument("--buffer-count", type=int, default=1000)
+    args = parser.parse_args()
+    for locked in (True, False):
+        print(json.dumps(run(args.producers, args.messages, args.buffer_count, locked)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import json
+import time
+
+from mini_firehose.mini_firehose import MiniFirehose, FirehoseConfig
+from sinks.sink import Sink
+
+
+class NullSink(Sink):
+    def deliver(self, data, filename=None):
+        pass
+
+
+def make_record(i):
+    return {"id": i, "region": ["East", "West", "North", "South"][i % 4], "payload": "x" * 64}
+
+
+def run(messages=1_000_000, chunk_size=1000, buffer_count_limit=10_000):
+    records = [make_record(i) for i in range(messages)]
+    results = []
+    for mode in ("add_message", "add_messages"):
+        config = FirehoseConfig(buffer_count_limit=buffer_count_limit, buffer_time_limit=-1, buffer_size_limit_mb=64)
+        firehose = MiniFirehose(name="add-messages-bench", sinks=[NullSink()], config=config)
+        started = time.perf_counter()
+        if mode == "add_message":
+            for record in records:
+                firehose.add_message(record)
+        else:
+            firehose.add_messages(records, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+        firehose.stop()
+        results.append({
+            "benchmark": "add_messages",
+            "mode": mode,
+            "messages": messages,
+            "records_per_sec": round(messages / elapsed),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-message and batch ingestion rates")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    for result in run(args.messages, args.chunk_size):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import json
+import socket
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+import httpx
+
+from mini_firehose.api import MiniFirehoseApi
+
+FIREHOSE = "load-test"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port):
+    # Signal handlers can only be installed from the main thread, the server runs in a background one
+    with patch("mini_firehose.api.signal.signal"):
+        api = MiniFirehoseApi(port=port)
+    api.server.config.log_level = "warning"
+    thread = threading.Thread(target=asyncio.run, args=(api.start(),), daemon=True)
+    thread.start()
+    while not api.server.started:
+        time.sleep(0.05)
+    return api, thread
+
+
+def create_firehose(client, directory):
+    response = client.post("/minifirehoses", json={
+        "name": FIREHOSE, "buffer-count": 10000, "buffer-size": 16, "buffer-time": 60,
+        "sink": "local", "sink-config": {"directory": directory, "output-format": "json"}
+    })
+    response.raise_for_status()
+
+
+def single_route(client, records, batch_size):
+    for record in records:
+        client.post(f"/minifirehoses/{FIREHOSE}/message", json={"message": record}).raise_for_status()
+    return len(records)
+
+
+def batch_route(client, records, batch_size):
+    for start in range(0, len(records), batch_size):
+        client.post(f"/minifirehoses/{FIREHOSE}/messages", json=records[start:start + batch_size]).raise_for_status()
+    return (len(records) + batch_size - 1) // batch_size
+
+
+def stream_route(client, records, batch_size):
+    def body():
+        for start in range(0, len(records), batch_size):
+            yield "".join(json.dumps(record) + "\n" for record in records[start:start + batch_size]).encode()
+
+    client.post(f"/minifirehoses/{FIREHOSE}/messages/stream", content=body(),
+                headers={"Content-Type": "application/x-ndjson"}).raise_for_status()
+    return 1
+
+
+def run(records=20000, batch_size=1000, url=None):
+    server = None
+    if url is None:
+        port = free_port()
+        server, thread = start_server(port)
+        url = f"http://127.0.0.1:{port}"
+    payload = [json.dumps({"id": i, "region": "East", "payload": "x" * 64}) for i in range(records)]
+    results = []
+    with tempfile.TemporaryDirectory() as directory, httpx.Client(base_url=url, timeout=60) as client:
+        create_firehose(client, directory)
+        for route, send in (("message", single_route), ("messages", batch_route), ("messages/stream", stream_route)):
+            started = time.perf_counter()
+            requests = send(client, payload, batch_size)
+            elapsed = time.perf_counter() - started
+            results.append({
+                "benchmark": "api_load_test",
+                "route": route,
+                "records": records,
+                "requests_per_sec": round(requests / elapsed, 1),
+                "records_per_sec": round(records / elapsed),
+            })
+        client.delete(f"/minifirehoses/{FIREHOSE}")
+    if server is not None:
+        asyncio.run(server.stop())
+        thread.join(5)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the single message, batch and NDJSON stream API routes")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--url", default=None, help="Target a running API instead of starting one in-process")
+    args = parser.parse_args()
+    for result in run(args.records, args.batch_size, args.url):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import json
+import time
+import tracemalloc
+
+import pandas as pd
+
+from common.columnar_buffer import ColumnarBuffer
+
+SCHEMA = {"id": "int64", "region": "str", "city": "str", "amount": "float64", "active": "bool"}
+REGIONS = ["East", "West", "North", "South"]
+CITIES = ["City-" + str(i) for i in range(100)]
+
+
+def make_record(i):
+    return {"id": i, "region": REGIONS[i % 4], "city": CITIES[i % 100], "amount": i * 0.5, "active": i % 2 == 0}
+
+
+def fill(path, records):
+    buffer = ColumnarBuffer(SCHEMA) if path == "columnar" else []
+    for record in records:
+        buffer.append(record)
+    return buffer
+
+
+def to_frame(path, buffer):
+    return buffer.to_frame() if path == "columnar" else pd.DataFrame(buffer)
+
+
+def measure_throughput(path, messages):
+    records = [make_record(i) for i in range(messages)]
+    started = time.perf_counter()
+    buffer = fill(path, records)
+    appended = time.perf_counter()
+    df = to_frame(path, buffer)
+    finished = time.perf_counter()
+    assert len(df) == messages
+    return appended - started, finished - appended
+
+
+def measure_memory(path, messages):
+    # Records are generated lazily so only what the buffer retains is counted
+    tracemalloc.start()
+    buffer = fill(path, map(make_record, range(messages)))
+    buffered = tracemalloc.get_traced_memory()[0]
+    to_frame(path, buffer)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return buffered / (1024 * 1024), peak / (1024 * 1024)
+
+
+def run(messages=1_000_000):
+    results = []
+    for path in ("list-of-dicts", "columnar"):
+        append_seconds, flush_seconds = measure_throughput(path, messages)
+        buffered_mb, peak_mb = measure_memory(path, messages)
+        results.append({
+            "benchmark": "columnar_buffer",
+            "path": path,
+            "messages": messages,
+            "append_records_per_sec": round(messages / append_seconds),
+            "flush_seconds": round(flush_seconds, 4),
+            "end_to_end_records_per_sec": round(messages / (append_seconds + flush_seconds)),
+            "buffered_mb": round(buffered_mb, 1),
+            "peak_mb": round(peak_mb, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list-of-dicts and schema-declared columnar buffering")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    args = parser.parse_args()
+    for result in run(args.messages):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
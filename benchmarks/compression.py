@@ -0,0 +1,71 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from sinks.local.local_sink import LocalSink
+
+CODECS = {
+    "csv": [None, "gzip", "zstd", "lz4"],
+    "json": [None, "gzip", "zstd", "lz4"],
+    "parquet": ["none", "snappy", "gzip", "zstd", "lz4", "brotli"],
+}
+
+
+def sample_frame(rows):
+    # Log like records: repeated categories, increasing ids and some free text
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "region": np.random.choice(["East", "West", "North", "South"], rows),
+        "status": np.random.choice([200, 201, 404, 500], rows, p=[0.7, 0.1, 0.15, 0.05]),
+        "amount": np.round(np.random.random(rows) * 1000, 2),
+        "message": "request served in " + pd.Series(np.random.randint(1, 500, rows)).astype(str) + " ms",
+    })
+
+
+def run(output_format="csv", rows=200000, flushes=5, level=None):
+    df = sample_frame(rows)
+    results = []
+    raw_size = None
+    for codec in CODECS[output_format]:
+        with tempfile.TemporaryDirectory() as directory:
+            codec_level = level if codec not in (None, "none", "snappy") else None
+            sink = LocalSink(directory, output_format, compression=codec, compression_level=codec_level)
+            started = time.perf_counter()
+            for _ in range(flushes):
+                sink.deliver(df)
+            elapsed = time.perf_counter() - started
+            size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+            if raw_size is None:
+                # The first codec writes uncompressed files, every ratio is relative to them
+                raw_size = size
+            results.append({
+                "benchmark": "compression",
+                "output_format": output_format,
+                "codec": codec or "none",
+                "level": codec_level,
+                "rows": rows * flushes,
+                "mb_per_sec": round(raw_size / 1024 / 1024 / elapsed, 1),
+                "size_mb": round(size / 1024 / 1024, 2),
+                "ratio": round(raw_size / size, 2),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write throughput against compression ratio for each codec")
+    parser.add_argument("--output-format", default="csv", choices=list(CODECS))
+    parser.add_argument("--rows", type=int, default=200000, help="Rows per flush")
+    parser.add_argument("--flushes", type=int, default=5)
+    parser.add_argument("--level", type=int, default=None, help="Compression level of the codecs supporting one")
+    args = parser.parse_args()
+    for result in run(args.output_format, args.rows, args.flushes, args.level):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import copy
+import json
+import time
+import tracemalloc
+
+
+def make_buffer(size):
+    return [{"id": i, "region": "East", "city": "City-" + str(i % 100), "amount": i * 0.5} for i in range(size)]
+
+
+def deepcopy_handoff(buffer):
+    # Previous flush path: every flush deep copied the buffer before clearing it
+    buffer_to_flush = copy.deepcopy(buffer)
+    buffer.clear()
+    return buffer_to_flush
+
+
+def swap_handoff(buffer):
+    # Current flush path: the full list is swapped out and ownership moves to the flush task
+    buffer_to_flush, buffer = buffer, []
+    return buffer_to_flush
+
+
+def measure(handoff, size):
+    buffer = make_buffer(size)
+    tracemalloc.start()
+    started = time.perf_counter()
+    flushed = handoff(buffer)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(flushed) == size
+    return {
+        "seconds": round(elapsed, 6),
+        "messages_per_sec": round(size / elapsed) if elapsed else None,
+        "peak_extra_mb": round(peak / (1024 * 1024), 2),
+    }
+
+
+def run(sizes=(10_000, 100_000, 1_000_000)):
+    results = []
+    for size in sizes:
+        for name, handoff in (("deepcopy", deepcopy_handoff), ("swap", swap_handoff)):
+            results.append({"benchmark": "flush_handoff", "path": name, "messages": size, **measure(handoff, size)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare deepcopy and zero-copy buffer handoff on flush")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    for result in run(args.sizes):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
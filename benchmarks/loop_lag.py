@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from mini_firehose.async_mini_firehose import AsyncMiniFirehose
+from mini_firehose.mini_firehose import FirehoseConfig, MiniFirehose
+from sinks.local.local_sink import LocalSink
+
+
+def sample_records(count, offset=0):
+    return [{"Region": ["East", "West", "North", "South"][i % 4], "id": i, "name": f"name-{i}", "payload": "x" * 40}
+            for i in range(offset, offset + count)]
+
+
+async def probe(stop, lags, interval=0.001):
+    # How late a periodic timer fires is how long the loop could not serve anything else, e.g. a request
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - started - interval)
+
+
+async def produce(firehose, records, request_size):
+    # Like API requests of request_size messages each
+    for start in range(0, len(records), request_size):
+        chunk = records[start:start + request_size]
+        if isinstance(firehose, AsyncMiniFirehose):
+            await firehose.add_messages(chunk)
+        else:
+            firehose.add_messages(chunk)
+        await asyncio.sleep(0)
+
+
+async def run_mode(mode, output_format, records, producers, request_size, buffer_count, max_in_flight_batches):
+    config = FirehoseConfig(buffer_count_limit=buffer_count, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                            max_in_flight_batches=max_in_flight_batches)
+    with tempfile.TemporaryDirectory() as directory:
+        sink = LocalSink(directory, output_format, partition_cols=["Region"], compression="gzip")
+        if mode == "async":
+            firehose = AsyncMiniFirehose("bench", [sink], config)
+            await firehose.start()
+        else:
+            firehose = MiniFirehose("bench", [sink], config)
+            firehose.start()
+        lags = []
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(stop, lags))
+        per_producer = records // producers
+        started = time.perf_counter()
+        await asyncio.gather(*[produce(firehose, sample_records(per_producer, index * per_producer), request_size)
+                               for index in range(producers)])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe_task
+        if mode == "async":
+            await firehose.stop()
+        else:
+            firehose.stop()
+    lags_ms = np.array(lags) * 1000
+    return {
+        "benchmark": "loop_lag",
+        "mode": mode,
+        "output_format": output_format,
+        "records": per_producer * producers,
+        "records_per_sec": round(per_producer * producers / elapsed),
+        "lag_p50_ms": round(float(np.percentile(lags_ms, 50)), 2),
+        "lag_p99_ms": round(float(np.percentile(lags_ms, 99)), 2),
+        "lag_max_ms": round(float(lags_ms.max()), 2),
+    }
+
+
+def run(output_format="parquet", records=200000, producers=8, request_size=500, buffer_count=20000,
+        max_in_flight_batches=2):
+    # mode "sync" is the thread based MiniFirehose called from the loop, as the API server used to
+    return [asyncio.run(run_mode(mode, output_format, records, producers, request_size, buffer_count,
+                                 max_in_flight_batches))
+            for mode in ("sync", "async")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event loop lag while a firehose flushes under load")
+    parser.add_argument("--output-format", default="parquet", choices=["csv", "json", "parquet"])
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--producers", type=int, default=8, help="Concurrent producer coroutines")
+    parser.add_argument("--request-size", type=int, default=500, help="Messages per add_messages call")
+    parser.add_argument("--buffer-count", type=int, default=20000)
+    parser.add_argument("--max-in-flight-batches", type=int, default=2)
+    args = parser.parse_args()
+    for result in run(args.output_format, args.records, args.producers, args.request_size, args.buffer_count,
+                      args.max_in_flight_batches):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import gc
+import json
+import tempfile
+import time
+
+from mini_firehose.mini_firehose import MiniFirehose, FirehoseConfig
+from sinks.local.local_sink import LocalSink
+from sinks.sink import Sink
+
+
+class NullSink(Sink):
+    def deliver(self, data, filename=None):
+        pass
+
+
+def make_record(i):
+    return {"id": i, "region": ["East", "West", "North", "South"][i % 4], "payload": "x" * 64}
+
+
+def ingest(records, mode, metrics, sink, chunk_size, buffer_count_limit):
+    config = FirehoseConfig(buffer_count_limit=buffer_count_limit, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                            metrics=metrics)
+    firehose = MiniFirehose(name="metrics-overhead-bench", sinks=[sink], config=config)
+    firehose.start()
+    # The buffers of the previous run would otherwise be collected during this one
+    gc.collect()
+    started = time.perf_counter()
+    if mode == "add_message":
+        for record in records:
+            firehose.add_message(record)
+    else:
+        firehose.add_messages(records, chunk_size=chunk_size)
+    # Waits for the deliveries, so flushes to a real sink are part of the measurement
+    firehose.stop()
+    return time.perf_counter() - started
+
+
+def run(messages=500_000, chunk_size=1000, buffer_count_limit=50_000, repeats=3):
+    # Best of several runs, metrics off and on alternate and swap order so both see the same machine noise.
+    # The handler and S3 upload metrics stay on in both modes, they cost once per file or part.
+    records = [make_record(i) for i in range(messages)]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        sinks = {"null": NullSink, "local-csv": lambda: LocalSink(directory, "csv", partition_cols=["region"])}
+        for sink_name, make_sink in sinks.items():
+            for mode in ("add_message", "add_messages"):
+                timings = {False: [], True: []}
+                for repeat in range(repeats):
+                    for metrics in ((False, True) if repeat % 2 == 0 else (True, False)):
+                        timings[metrics].append(ingest(records, mode, metrics, make_sink(), chunk_size,
+                                                       buffer_count_limit))
+                without, with_metrics = min(timings[False]), min(timings[True])
+                results.append({
+                    "benchmark": "metrics_overhead",
+                    "sink": sink_name,
+                    "mode": mode,
+                    "messages": messages,
+                    "records_per_sec_without_metrics": round(messages / without),
+                    "records_per_sec_with_metrics": round(messages / with_metrics),
+                    "overhead_pct": round((with_metrics - without) / without * 100, 1),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of a firehose with and without its metrics")
+    parser.add_argument("--messages", type=int, default=500_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--buffer-count", type=int, default=50_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    for result in run(args.messages, args.chunk_size, args.buffer_count, args.repeats):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from sinks.local.handlers.local_csv_handler import LocalCSVHandler
+
+
+def legacy_partition_path(handler, group_name):
+    # The previous implementation: a stat, and a makedirs when missing, for every partition of every flush
+    folder_parts = [handler.directory] + [f"{col}={val}" for col, val in zip(handler.partition_cols, group_name)]
+    partition_path = os.path.join(*folder_parts)
+    if not os.path.exists(partition_path): os.makedirs(partition_path)
+    return os.path.join(partition_path, handler._generate_filename())
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def run(partitions=10_000, flushes=5):
+    names = [(f"region-{i // 100}", f"city-{i % 100}") for i in range(partitions)]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        handler = LocalCSVHandler(directory, partition_cols=["Region", "City"])
+        cold = timed(handler.get_partition_paths, names)
+        warm = min(timed(handler.get_partition_paths, names) for _ in range(flushes))
+        legacy = min(timed(lambda: [legacy_partition_path(handler, name) for name in names]) for _ in range(flushes))
+    for mode, elapsed in (("legacy-exists-makedirs", legacy), ("cached-cold", cold), ("cached-warm", warm)):
+        results.append({
+            "benchmark": "partition_directories",
+            "mode": mode,
+            "partitions": partitions,
+            "seconds_per_flush": round(elapsed, 4),
+            "partitions_per_sec": round(partitions / elapsed),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of resolving partition directories for every flush")
+    parser.add_argument("--partitions", type=int, default=10_000)
+    parser.add_argument("--flushes", type=int, default=5, help="Warm flushes, the fastest one is reported")
+    args = parser.parse_args()
+    for result in run(args.partitions, args.flushes):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
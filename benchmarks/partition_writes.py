@@ -0,0 +1,77 @@
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from sinks.local.handlers.local_csv_handler import LocalCSVHandler
+
+
+class LatencyCSVHandler(LocalCSVHandler):
+    # Adds a fixed delay to every file, standing in for the round trip of an object store
+    def __init__(self, directory, partition_cols, partition_workers, latency):
+        super().__init__(directory, partition_cols, partition_workers=partition_workers)
+        self.latency = latency
+
+    def _write_data(self, df, file_path):
+        time.sleep(self.latency)
+        super()._write_data(df, file_path)
+
+
+def sample_frame(partitions, rows_per_partition):
+    rows = partitions * rows_per_partition
+    partition = np.arange(rows) % partitions
+    return pd.DataFrame({
+        "Region": "region-" + pd.Series(partition // 25).astype(str),
+        "City": "city-" + pd.Series(partition % 25).astype(str),
+        "SalesAmount": np.random.random(rows),
+        "Payload": "x" * 32,
+    })
+
+
+def serial_write(handler, df):
+    # The previous implementation: a copy per group, a second copy to drop the partition columns
+    for group_name, group_data in df.groupby(handler.partition_cols):
+        group_data = group_data.drop(columns=handler.partition_cols)
+        handler._write_data(group_data, handler.get_partition_path(group_name))
+
+
+def run(partitions=500, rows_per_partition=20, workers=(1, 4, 8, 16), latency_ms=5):
+    df = sample_frame(partitions, rows_per_partition)
+    results = []
+    modes = [("serial-groupby", 1)] + [("parallel", count) for count in workers]
+    for mode, count in modes:
+        with tempfile.TemporaryDirectory() as directory:
+            handler = LatencyCSVHandler(directory, ["Region", "City"], count, latency_ms / 1000)
+            started = time.perf_counter()
+            if mode == "serial-groupby":
+                serial_write(handler, df)
+            else:
+                handler.write(df)
+            elapsed = time.perf_counter() - started
+        results.append({
+            "benchmark": "partition_writes",
+            "mode": mode,
+            "workers": count,
+            "partitions": partitions,
+            "latency_ms": latency_ms,
+            "seconds": round(elapsed, 3),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flush wall time of a partitioned write against worker count")
+    parser.add_argument("--partitions", type=int, default=500)
+    parser.add_argument("--rows-per-partition", type=int, default=20)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--latency-ms", type=float, default=5, help="Simulated latency per written file")
+    args = parser.parse_args()
+    for result in run(args.partitions, args.rows_per_partition, args.workers, args.latency_ms):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
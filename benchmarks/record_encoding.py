@@ -0,0 +1,56 @@
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from common.record_encoder import JSON_BACKEND
+from sinks.local.local_sink import LocalSink
+
+
+def sample_records(rows, partitions):
+    regions = np.random.randint(0, partitions, rows)
+    return [{"Region": f"region-{regions[i]}", "id": i, "amount": float(i) * 0.5, "name": f"name-{i}",
+             "active": i % 2 == 0} for i in range(rows)]
+
+
+def run(output_format="json", flushes=20, rows_per_flush=50000, partitions=0):
+    records = sample_records(rows_per_flush, max(partitions, 1))
+    partition_cols = ["Region"] if partitions else None
+    results = []
+    for mode in ("pandas", "records"):
+        with tempfile.TemporaryDirectory() as directory:
+            sink = LocalSink(directory, output_format, partition_cols=partition_cols)
+            if mode == "pandas":
+                # An identity transformation keeps the sink on the DataFrame path
+                sink.transformation_callback = lambda df: df
+            started = time.perf_counter()
+            for _ in range(flushes):
+                sink.deliver(records)
+            elapsed = time.perf_counter() - started
+            results.append({
+                "benchmark": "record_encoding",
+                "mode": mode,
+                "json_backend": JSON_BACKEND,
+                "output_format": output_format,
+                "partitions": partitions,
+                "rows_per_flush": rows_per_flush,
+                "records_per_sec": round(flushes * rows_per_flush / elapsed),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writing dict records through pandas against the direct encoders")
+    parser.add_argument("--output-format", default="json", choices=["csv", "json"])
+    parser.add_argument("--flushes", type=int, default=20)
+    parser.add_argument("--rows-per-flush", type=int, default=50000)
+    parser.add_argument("--partitions", type=int, default=0, help="Partition by a column with this many values")
+    args = parser.parse_args()
+    for result in run(args.output_format, args.flushes, args.rows_per_flush, args.partitions):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
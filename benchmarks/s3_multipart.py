@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import time
+
+import boto3
+import numpy as np
+import pandas as pd
+from moto import mock_s3
+
+from sinks.s3.handlers.s3_csv_handler import S3CSVHandler
+
+BUCKET = "bench-bucket"
+
+
+def sample_frame(size_mb):
+    # Roughly 100 bytes per CSV row
+    rows = int(size_mb * 1024 * 1024 / 100)
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "region": np.random.choice(["East", "West", "North", "South"], rows),
+        "amount": np.random.random(rows),
+        "payload": "x" * 55,
+    })
+
+
+def run(size_mb=1024, part_size_mb=8, upload_concurrency=4):
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    df = sample_frame(size_mb)
+    results = []
+    with mock_s3():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        handler = S3CSVHandler(BUCKET, "bench", part_size_mb=part_size_mb, upload_concurrency=upload_concurrency)
+
+        def single_write():
+            # The previous implementation: encode everything, then upload it in one request
+            with handler.s3_fs.open(f"s3://{BUCKET}/bench/single.csv", mode="w") as f:
+                df.to_csv(f, index=False)
+
+        for mode, write in (("single", single_write),
+                            ("multipart", lambda: handler.write(df, "multipart.csv"))):
+            started = time.perf_counter()
+            write()
+            elapsed = time.perf_counter() - started
+            results.append({
+                "benchmark": "s3_multipart",
+                "mode": mode,
+                "size_mb": size_mb,
+                "part_size_mb": part_size_mb,
+                "upload_concurrency": upload_concurrency,
+                "mb_per_sec": round(size_mb / elapsed, 1),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of a large S3 flush against moto")
+    parser.add_argument("--size-mb", type=float, default=1024, help="Approximate size of the flushed CSV")
+    parser.add_argument("--part-size-mb", type=int, default=8)
+    parser.add_argument("--upload-concurrency", type=int, default=4)
+    args = parser.parse_args()
+    for result in run(args.size_mb, args.part_size_mb, args.upload_concurrency):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from mini_firehose.mini_firehose import FirehoseConfig, MiniFirehose
+from mini_firehose.sharded import ShardedMiniFirehose
+from sinks.local.local_sink import LocalSink
+
+
+def sample_records(count, offset=0):
+    return [{"Region": ["East", "West", "North", "South"][i % 4], "id": i, "amount": i * 0.5,
+             "name": f"name-{i}", "payload": "x" * 40} for i in range(offset, offset + count)]
+
+
+def ingest(firehose, producers, records_per_producer):
+    chunks = [sample_records(records_per_producer, index * records_per_producer) for index in range(producers)]
+    threads = [threading.Thread(target=firehose.add_messages, args=(chunk,)) for chunk in chunks]
+    firehose.start()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Stopping flushes what is left and waits for every delivery, so the time covers the files being written
+    firehose.stop()
+    return time.perf_counter() - started
+
+
+def run(output_format="parquet", compression="gzip", cores=(1, 2, 4, 8), records=400000, buffer_count=50000):
+    config = FirehoseConfig(buffer_count_limit=buffer_count, buffer_time_limit=-1, buffer_size_limit_mb=-1)
+    results = []
+    for count in cores:
+        for mode in ("single", "sharded"):
+            if mode == "single" and count > 1:
+                continue
+            with tempfile.TemporaryDirectory() as directory:
+                sink = LocalSink(directory, output_format, partition_cols=["Region"], compression=compression)
+                if mode == "single":
+                    firehose = MiniFirehose("bench", [sink], config)
+                else:
+                    firehose = ShardedMiniFirehose("bench", [sink], config, shards=count, encode_processes=count)
+                elapsed = ingest(firehose, count, records // count)
+            results.append({
+                "benchmark": "sharded_ingest",
+                "mode": mode,
+                "cores": count,
+                "cpu_count": os.cpu_count(),
+                "output_format": output_format,
+                "compression": compression,
+                "records": records,
+                "records_per_sec": round(records / elapsed),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Records per second of a sharded firehose from 1 to 8 cores")
+    parser.add_argument("--output-format", default="parquet", choices=["csv", "json", "parquet"])
+    parser.add_argument("--compression", default="gzip")
+    parser.add_argument("--cores", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Producer threads, shards and encode processes of each run")
+    parser.add_argument("--records", type=int, default=400000)
+    parser.add_argument("--buffer-count", type=int, default=50000)
+    args = parser.parse_args()
+    for result in run(args.output_format, args.compression, args.cores, args.records, args.buffer_count):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
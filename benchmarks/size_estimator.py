@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from mini_firehose.size_estimator import SampledSizeEstimator
+from sinks.local.local_sink import LocalSink
+
+
+def make_record(i):
+    return {"id": i, "region": ["East", "West", "North", "South"][i % 4], "city": "City-" + str(i % 100),
+            "amount": round(i * 0.37, 2), "comment": "x" * (i % 50)}
+
+
+def per_message_ns(estimate, messages):
+    started = time.perf_counter_ns()
+    for message in messages:
+        estimate(message)
+    return (time.perf_counter_ns() - started) / len(messages)
+
+
+def run(messages=100_000):
+    records = [make_record(i) for i in range(messages)]
+    estimator = SampledSizeEstimator()
+    results = [{
+        "benchmark": "size_estimator",
+        "estimator": name,
+        "ns_per_message": round(per_message_ns(estimate, records)),
+    } for name, estimate in (("len-str", lambda message: len(str(message))),
+                             ("sampled", SampledSizeEstimator().estimate))]
+
+    estimated = sum(estimator.estimate(record) for record in records)
+    legacy = sum(len(str(record)) for record in records)
+    with tempfile.TemporaryDirectory() as directory:
+        for output_format in ("json", "csv", "parquet"):
+            filename = "estimate." + output_format
+            LocalSink(directory, output_format).deliver(records, filename)
+            actual = os.path.getsize(os.path.join(directory, filename))
+            results.append({
+                "benchmark": "size_estimator",
+                "format": output_format,
+                "actual_bytes": actual,
+                "sampled_ratio": round(estimated / actual, 3),
+                "len_str_ratio": round(legacy / actual, 3),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Size estimator cost and accuracy against actual output files")
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+    for result in run(args.messages):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from sinks.local.appenders import StreamingWriterConfig
+from sinks.local.local_sink import LocalSink
+
+
+def sample_frame(rows, partitions):
+    return pd.DataFrame({
+        "Region": "region-" + pd.Series(np.random.randint(0, partitions, rows)).astype(str),
+        "id": np.arange(rows),
+        "amount": np.random.random(rows),
+        "payload": "x" * 32,
+    })
+
+
+def count_files(directory):
+    return sum(len(names) for _, _, names in os.walk(directory))
+
+
+def run(output_format="parquet", flushes=200, rows_per_flush=1000, partitions=20):
+    frames = [sample_frame(rows_per_flush, partitions) for _ in range(10)]
+    results = []
+    for mode in ("file-per-flush", "streaming"):
+        with tempfile.TemporaryDirectory() as directory:
+            streaming = StreamingWriterConfig() if mode == "streaming" else None
+            sink = LocalSink(directory, output_format, partition_cols=["Region"], streaming_writers=streaming)
+            started = time.perf_counter()
+            for i in range(flushes):
+                sink.deliver(frames[i % len(frames)])
+            sink.stop()
+            elapsed = time.perf_counter() - started
+            results.append({
+                "benchmark": "streaming_writers",
+                "mode": mode,
+                "output_format": output_format,
+                "flushes": flushes,
+                "partitions": partitions,
+                "flushes_per_sec": round(flushes / elapsed, 1),
+                "files": count_files(directory),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="High flush rate with a file per flush against streaming writers")
+    parser.add_argument("--output-format", default="parquet", choices=["csv", "json", "parquet"])
+    parser.add_argument("--flushes", type=int, default=200)
+    parser.add_argument("--rows-per-flush", type=int, default=1000)
+    parser.add_argument("--partitions", type=int, default=20)
+    args = parser.parse_args()
+    for result in run(args.output_format, args.flushes, args.rows_per_flush, args.partitions):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
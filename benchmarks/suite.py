@@ -0,0 +1,304 @@
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from common.metrics import BYTES_WRITTEN, FILES_WRITTEN
+from common.record_encoder import JSON_BACKEND
+from mini_firehose.mini_firehose import MiniFirehose, FirehoseConfig
+from sinks.local.local_sink import LocalSink
+from sinks.s3.s3_sink import S3Sink
+
+BUCKET = "bench-bucket"
+FORMATS = ("csv", "json", "parquet")
+SINKS = ("local", "s3")
+SEED = 42
+
+
+class Workload:
+    def __init__(self, output_format="json", sink="local", records=100_000, record_bytes=200, partition_cardinality=0,
+                 producers=1, chunk_size=1000, buffer_count=20_000, compression=None):
+        if output_format not in FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        if sink not in SINKS:
+            raise ValueError(f"Unsupported sink: {sink}")
+        if record_bytes < 50:
+            raise ValueError("Record bytes should not be less than 50.")
+        if producers < 1:
+            raise ValueError("Producers should not be less than 1.")
+        self.output_format = output_format
+        self.sink = sink
+        self.records = records
+        # Approximate size of a record encoded as compact JSON
+        self.record_bytes = record_bytes
+        # Distinct values of the partition column, 0 writes unpartitioned files
+        self.partition_cardinality = partition_cardinality
+        self.producers = producers
+        self.chunk_size = chunk_size
+        self.buffer_count = buffer_count
+        self.compression = compression
+
+    @property
+    def name(self):
+        name = (f"{self.sink}-{self.output_format}-{self.record_bytes}b-{self.partition_cardinality}p-"
+                f"{self.producers}w")
+        return f"{name}-{self.compression}" if self.compression else name
+
+    def to_dict(self):
+        return {"name": self.name, "output_format": self.output_format, "sink": self.sink, "records": self.records,
+                "record_bytes": self.record_bytes, "partition_cardinality": self.partition_cardinality,
+                "producers": self.producers, "chunk_size": self.chunk_size, "buffer_count": self.buffer_count,
+                "compression": self.compression}
+
+
+def _matrix(records, record_bytes, cardinalities, producers, formats, sinks):
+    return [Workload(output_format, sink, records, size, cardinality, workers)
+            for sink, output_format, size, cardinality, workers in
+            itertools.product(sinks, formats, record_bytes, cardinalities, producers)]
+
+
+SUITES = {
+    # One axis at a time around a baseline, runs in a couple of minutes
+    "quick": lambda records, formats, sinks: [
+        Workload(output_format, sink, records, record_bytes, cardinality, producers)
+        for sink, output_format in itertools.product(sinks, formats)
+        for record_bytes, cardinality, producers in [(200, 0, 1), (1000, 0, 1), (200, 100, 1), (200, 0, 4)]],
+    "full": lambda records, formats, sinks: _matrix(records, (100, 1000, 4000), (0, 10, 1000), (1, 4, 16),
+                                                    formats, sinks),
+}
+
+
+def make_records(count, record_bytes, partition_cardinality, seed=SEED):
+    # Seeded, every run of a workload ingests the same messages
+    rng = random.Random(seed)
+    padding = max(record_bytes - 90, 1)
+    alphabet = "abcdefghijklmnopqrstuvwxyz"
+    payloads = ["".join(rng.choices(alphabet, k=padding)) for _ in range(64)]
+    cardinality = max(partition_cardinality, 1)
+    return [{"id": i, "partition": f"p{rng.randrange(cardinality)}", "amount": round(rng.random() * 1000, 2),
+             "created_at": 1700000000 + i, "payload": payloads[i % len(payloads)]} for i in range(count)]
+
+
+def _sink(workload, directory):
+    partition_cols = ["partition"] if workload.partition_cardinality > 0 else None
+    if workload.sink == "local":
+        return LocalSink(directory, workload.output_format, partition_cols=partition_cols,
+                         compression=workload.compression)
+    return S3Sink(BUCKET, os.path.basename(directory), workload.output_format, partition_cols=partition_cols,
+                  compression=workload.compression)
+
+
+def _percentiles(values):
+    return {"p50": round(float(np.percentile(values, 50)), 6), "p99": round(float(np.percentile(values, 99)), 6)}
+
+
+def run_workload(workload: Workload, records, run_id=0):
+    storage = BYTES_WRITTEN.labels(workload.sink)
+    files = FILES_WRITTEN.labels(workload.output_format)
+    config = FirehoseConfig(buffer_count_limit=workload.buffer_count, buffer_time_limit=-1, buffer_size_limit_mb=-1)
+    with tempfile.TemporaryDirectory() as directory:
+        # A name per run, so the metrics of the firehose only hold this run
+        firehose = MiniFirehose(f"bench-{workload.name}-{run_id}", [_sink(workload, directory)], config)
+        firehose.start()
+        bytes_before, files_before = storage.value, files.value
+        per_producer = -(-len(records) // workload.producers)
+        call_seconds = []
+        lock = threading.Lock()
+
+        def produce(part):
+            timings = []
+            for start in range(0, len(part), workload.chunk_size):
+                started = time.perf_counter()
+                firehose.add_messages(part[start:start + workload.chunk_size], workload.chunk_size)
+                timings.append(time.perf_counter() - started)
+            with lock:
+                call_seconds.extend(timings)
+
+        threads = [threading.Thread(target=produce, args=(records[start:start + per_producer],))
+                   for start in range(0, len(records), per_producer)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ingested = time.perf_counter() - started
+        # Waits for the final flush and every delivery, they are part of the measurement
+        firehose.stop()
+        elapsed = time.perf_counter() - started
+        stats = firehose.stats()
+    return {
+        "elapsed_seconds": round(elapsed, 4),
+        "ingest_seconds": round(ingested, 4),
+        "records_per_sec": round(len(records) / elapsed),
+        "input_mb_per_sec": round(len(records) * workload.record_bytes / elapsed / 1024 / 1024, 2),
+        "add_messages_seconds": _percentiles(call_seconds),
+        "flushes": sum(stats["flushes"].values()),
+        "flush_seconds": {key: stats["flush-seconds"][key] for key in ("p50", "p99")},
+        "delivery_seconds": {key: stats["sinks"][0]["delivery-seconds"][key] for key in ("p50", "p99")},
+        "delivery_failures": stats["sinks"][0]["failures"],
+        "files_written": files.value - files_before,
+        "bytes_written": storage.value - bytes_before,
+    }
+
+
+def _median_run(runs):
+    # The run with the median throughput represents the workload, the others are kept for their spread
+    ordered = sorted(runs, key=lambda result: result["records_per_sec"])
+    result = dict(ordered[(len(ordered) - 1) // 2])
+    result["runs_records_per_sec"] = [run["records_per_sec"] for run in runs]
+    result["stdev_pct"] = round(statistics.pstdev(result["runs_records_per_sec"]) /
+                                statistics.mean(result["runs_records_per_sec"]) * 100, 1)
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+        "json_backend": JSON_BACKEND,
+    }
+
+
+@contextlib.contextmanager
+def mock_s3_bucket():
+    # An in-process moto S3, imported here so local workloads run without the test dependencies
+    import boto3
+    from moto import mock_s3
+    for key, value in [("AWS_ACCESS_KEY_ID", "testing"), ("AWS_SECRET_ACCESS_KEY", "testing"),
+                       ("AWS_DEFAULT_REGION", "us-east-1")]:
+        os.environ.setdefault(key, value)
+    region = os.environ["AWS_DEFAULT_REGION"]
+    with mock_s3():
+        location = {} if region == "us-east-1" else {"CreateBucketConfiguration": {"LocationConstraint": region}}
+        boto3.client("s3", region_name=region).create_bucket(Bucket=BUCKET, **location)
+        yield
+
+
+def run(workloads, repeats=3, progress=None):
+    # Returns the report of the workloads, a JSON document to compare against the report of another commit
+    if repeats < 1:
+        raise ValueError("Repeats should not be less than 1.")
+    results = []
+    s3 = any(workload.sink == "s3" for workload in workloads)
+    with mock_s3_bucket() if s3 else contextlib.nullcontext():
+        for workload in workloads:
+            records = make_records(workload.records, workload.record_bytes, workload.partition_cardinality)
+            # Creates clients, thread pools and directories first, so the first run does not pay for them
+            run_workload(workload, records[:workload.chunk_size], "warm-up")
+            runs = [run_workload(workload, records, run_id) for run_id in range(repeats)]
+            result = {"workload": workload.to_dict(), **_median_run(runs)}
+            if progress is not None:
+                progress(result)
+            results.append(result)
+    return {"environment": environment(), "repeats": repeats, "results": results}
+
+
+def suite(name="quick", records=100_000, formats=FORMATS, sinks=SINKS):
+    if name not in SUITES:
+        raise ValueError(f"Unknown benchmark suite: {name}")
+    return SUITES[name](records, formats, sinks)
+
+
+def compare(baseline, current, threshold_pct=10):
+    # Matches the workloads of two reports by name. A workload regressed when its throughput dropped by more
+    # than threshold_pct, compare runs of the same suite on the same machine.
+    baseline_results = {result["workload"]["name"]: result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        name = result["workload"]["name"]
+        if name not in baseline_results:
+            continue
+        before, after = baseline_results[name]["records_per_sec"], result["records_per_sec"]
+        change_pct = round((after - before) / before * 100, 1)
+        rows.append({"workload": name, "baseline_records_per_sec": before, "records_per_sec": after,
+                     "change_pct": change_pct, "regression": change_pct < -threshold_pct})
+    return rows
+
+
+def add_arguments(parser):
+    parser.add_argument("--suite", default="quick", choices=sorted(SUITES))
+    parser.add_argument("--records", type=int, default=100_000, help="Messages per workload run")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per workload, the median run is reported")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="Comma separated, e.g. csv,json")
+    parser.add_argument("--sinks", default=",".join(SINKS), help="Comma separated, local and/or s3 (moto)")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+
+
+def add_compare_arguments(parser):
+    parser.add_argument("baseline", help="JSON report of the baseline run")
+    parser.add_argument("current", help="JSON report to compare against the baseline")
+    parser.add_argument("--threshold", type=float, default=10,
+                        help="Throughput drop in percent that counts as a regression")
+
+
+def run_from_args(args):
+    # Every flush logs at INFO, keep stderr to the progress lines
+    logging.getLogger().setLevel(logging.WARNING)
+    workloads = suite(args.suite, args.records, args.formats.split(","), args.sinks.split(","))
+    report = run(workloads, args.repeats,
+                 progress=lambda result: print(f"{result['workload']['name']}: {result['records_per_sec']} records/sec",
+                                               file=sys.stderr))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+def compare_from_args(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold)
+    for row in rows:
+        print(json.dumps(row))
+    # Non-zero, so CI can fail on a regression
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+def main(argv=None, prog=None):
+    # Also run by `mini-firehose bench`, returns the exit code
+    parser = argparse.ArgumentParser(prog=prog,
+                                     description="Throughput and latency of MiniFirehose over synthetic workloads")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_arguments(subparsers.add_parser("run", help="Run a benchmark suite and emit a JSON report"))
+    add_compare_arguments(subparsers.add_parser("compare", help="Compare two JSON reports"))
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        return compare_from_args(args)
+    run_from_args(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
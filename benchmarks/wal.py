@@ -0,0 +1,71 @@
+import argparse
+import json
+import tempfile
+import threading
+import time
+
+from mini_firehose.mini_firehose import MiniFirehose, FirehoseConfig
+from sinks.sink import Sink
+
+
+class NullSink(Sink):
+    def deliver(self, data, filename=None):
+        pass
+
+
+def ingest(firehose, producers, messages_per_producer, batch_size):
+    message = {"id": 1, "region": "East", "payload": "x" * 64}
+
+    def produce():
+        if batch_size > 1:
+            for _ in range(messages_per_producer // batch_size):
+                firehose.add_messages([message] * batch_size)
+        else:
+            for _ in range(messages_per_producer):
+                firehose.add_message(message)
+
+    threads = [threading.Thread(target=produce) for _ in range(producers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def run(producers=16, messages_per_producer=5000, batch_size=1):
+    results = []
+    baseline = None
+    for mode in ("memory", "group", "interval", "always"):
+        with tempfile.TemporaryDirectory() as directory:
+            wal = {} if mode == "memory" else {"wal_directory": directory, "wal_fsync_policy": mode,
+                                               "wal_fsync_interval": 0.1}
+            config = FirehoseConfig(buffer_count_limit=10_000, buffer_time_limit=-1, buffer_size_limit_mb=-1, **wal)
+            firehose = MiniFirehose(name="wal-bench", sinks=[NullSink()], config=config)
+            elapsed = ingest(firehose, producers, messages_per_producer, batch_size)
+            firehose.stop()
+        records_per_sec = producers * messages_per_producer / elapsed
+        baseline = baseline or records_per_sec
+        results.append({
+            "benchmark": "wal",
+            "mode": mode,
+            "producers": producers,
+            "batch_size": batch_size,
+            "records_per_sec": round(records_per_sec),
+            "slowdown_vs_memory": round(baseline / records_per_sec, 2),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest throughput of the WAL fsync policies against in-memory mode")
+    parser.add_argument("--producers", type=int, default=16)
+    parser.add_argument("--messages", type=int, default=5000, help="Messages per producer")
+    parser.add_argument("--batch-size", type=int, default=1, help="Use add_messages with batches of this size")
+    args = parser.parse_args()
+    for result in run(args.producers, args.messages, args.batch_size):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import re
+import socket
+import threading
+import time
+from datetime import datetime
+
+FILENAME_STRATEGIES = ("unique", "datetime", "epoch")
+
+# Shared by every generator of the process, so sinks writing to the same place never hand out the same name
+_lock = threading.Lock()
+_last_ns = 0
+_sequence = 0
+
+
+def _next_timestamp():
+    # Nanosecond wall clock, forced to increase so names sort in creation order even if the clock steps back
+    global _last_ns, _sequence
+    with _lock:
+        _last_ns = max(time.time_ns(), _last_ns + 1)
+        _sequence += 1
+        return _last_ns, _sequence
+
+
+def _reset_after_fork():
+    global _lock
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _host_id():
+    return re.sub(r"[^A-Za-z0-9_.]", "_", socket.gethostname())[:32] or "host"
+
+
+class FileNameGenerator:
+    # unique: {nanoseconds}-{host}-{pid}[-{worker_id}]-{sequence}, unique across flushes, sinks, processes and hosts.
+    # datetime and epoch only have a resolution of one second, files written within the same second overwrite
+    # each other.
+    def __init__(self, file_type, strategy="unique", worker_id=None):
+        if strategy not in FILENAME_STRATEGIES:
+            raise ValueError(f"Unsupported filename strategy: {strategy}")
+        self.file_type = file_type
+        self.strategy = strategy
+        self.host_id = _host_id()
+        self.worker_id = worker_id
+
+    def generate(self, strategy=None):
+        strategy = strategy or self.strategy
+        if strategy == "unique":
+            return self._unique()
+        elif strategy == "datetime":
+            return f"{datetime.now().strftime('%Y%m%d%H%M%S')}.{self.file_type}"
+        else:
+            return f"{int(time.time())}.{self.file_type}"
+
+    def _unique(self):
+        timestamp, sequence = _next_timestamp()
+        # The pid is read on every call, a forked worker must not reuse its parent's names
+        worker = str(os.getpid()) if self.worker_id is None else f"{os.getpid()}-{self.worker_id}"
+        return f"{timestamp:019d}-{self.host_id}-{worker}-{sequence:06d}.{self.file_type}"
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pandas as pd
+
+from common.columnar_buffer import ColumnarBuffer
+from common.metrics import FRAME_BUILD_SECONDS
+
+
+class Batch:
+    def __init__(self, data, size_mb=0, event=""):
+        # data is the swapped out buffer: a list of records or a ColumnarBuffer
+        self.data = data
+        self._records = None if isinstance(data, ColumnarBuffer) else data
+        self.size_mb = size_mb
+        self.event = event
+        self.consumers = 1
+        self.pending = 0
+        self.uncommitted = 0
+        # Write-ahead log segment holding this batch, checkpointed once every sink committed it
+        self.segment = None
+        self.failed = False
+        # perf_counter() of the flush that handed the batch to the sinks
+        self.dispatched_at = None
+        # Seconds the buffer took to fill, None for batches replayed from the write-ahead log
+        self.fill_seconds = None
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    @property
+    def columnar(self):
+        return isinstance(self.data, ColumnarBuffer)
+
+    @property
+    def records(self):
+        if self._records is None:
+            self._records = self.frame().to_dict("records")
+        return self._records
+
+    @property
+    def shared(self):
+        return self.consumers > 1
+
+    def expect(self, tasks):
+        self.consumers = tasks
+        self.pending = tasks
+        self.uncommitted = tasks
+
+    def task_done(self):
+        # Returns True for the last outstanding task, i.e. when every sink is done with the batch
+        with self._lock:
+            self.pending -= 1
+            return self.pending == 0
+
+    def commit_done(self):
+        # Returns True once every sink durably stored the batch, or spooled it as a dead letter
+        with self._lock:
+            self.uncommitted -= 1
+            return self.uncommitted == 0
+
+    def frame(self):
+        # Built once on first use and then shared read-only by every sink of the flush
+        if self._frame is None:
+            with self._lock:
+                if self._frame is None:
+                    started = time.perf_counter()
+                    self._frame = self.data.to_frame() if self.columnar else pd.DataFrame(self.data)
+                    FRAME_BUILD_SECONDS.labels().observe(time.perf_counter() - started)
+        return self._frame
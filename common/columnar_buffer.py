@@ -0,0 +1,110 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+STRING_TYPES = ("str", "string", "object")
+ACCEPTED_TYPES = {
+    "i": (int, np.integer),
+    "u": (int, np.integer),
+    "f": (int, float, np.integer, np.floating),
+    "b": (bool, np.bool_),
+    "M": (date, np.datetime64),
+    "O": (str,),
+}
+# bool is a subclass of int, True and False are not numbers here
+REJECTED_TYPES = {
+    "i": (bool,),
+    "u": (bool,),
+    "f": (bool,),
+}
+
+
+class Column:
+    def __init__(self, name, dtype):
+        self.name = name
+        self.dtype = np.dtype(object) if dtype in STRING_TYPES else np.dtype(dtype)
+        if self.dtype.kind not in ACCEPTED_TYPES:
+            raise ValueError(f"Unsupported column type for '{name}': {dtype}")
+        self.accepts = ACCEPTED_TYPES[self.dtype.kind]
+        self.rejects = REJECTED_TYPES.get(self.dtype.kind, ())
+        # Out of range integers would wrap around or fail the seal of a whole chunk, so they are checked on append
+        self.bounds = None
+        if self.dtype.kind in ("i", "u"):
+            info = np.iinfo(self.dtype)
+            self.bounds = (int(info.min), int(info.max))
+        # Integers and booleans have no native null, so a validity mask is kept for them
+        self.nullable = self.dtype.kind in ("i", "u", "b")
+        self.pending = []
+        self.chunks = []
+        self.masks = []
+
+    def seal(self):
+        # Converts the pending values into a typed chunk, so at most one chunk per column stays boxed
+        if not self.pending:
+            return
+        values = self.pending
+        mask = None
+        if self.nullable and None in values:
+            mask = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+            values = [0 if value is None else value for value in values]
+        if self.dtype.kind == "O":
+            chunk = np.fromiter(values, dtype=object, count=len(values))
+        else:
+            chunk = np.array(values, dtype=self.dtype)
+        self.chunks.append(chunk)
+        self.masks.append(mask)
+        self.pending = []
+
+    def finalize(self):
+        self.seal()
+        if not self.chunks:
+            return np.empty(0, dtype=self.dtype)
+        values = np.concatenate(self.chunks) if len(self.chunks) > 1 else self.chunks[0]
+        if all(mask is None for mask in self.masks):
+            return values
+        mask = np.concatenate([np.zeros(len(chunk), dtype=bool) if mask is None else mask
+                               for chunk, mask in zip(self.chunks, self.masks)])
+        if self.dtype.kind == "b":
+            return pd.arrays.BooleanArray(values, mask)
+        return pd.arrays.IntegerArray(values, mask)
+
+
+class ColumnarBuffer:
+    def __init__(self, schema, chunk_size=65536):
+        if not schema:
+            raise ValueError("Columnar buffer requires a schema with at least one column.")
+        self.schema = schema
+        self.chunk_size = chunk_size
+        self.columns = [Column(name, dtype) for name, dtype in schema.items()]
+        self.column_names = set(schema)
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
+
+    def append(self, record):
+        if not isinstance(record, dict):
+            raise ValueError("Columnar buffer only accepts dict messages.")
+        if not record.keys() <= self.column_names:
+            unknown = sorted(record.keys() - self.column_names)
+            raise ValueError(f"Message has columns that are not in the schema: {unknown}")
+        values = [record.get(column.name) for column in self.columns]
+        # Every value is checked before any column is touched, so a rejected message leaves no partial row
+        for column, value in zip(self.columns, values):
+            if value is not None and (not isinstance(value, column.accepts) or isinstance(value, column.rejects)):
+                raise ValueError(f"Column '{column.name}' expects {column.dtype}, got {type(value).__name__}")
+            if value is not None and column.bounds and not column.bounds[0] <= int(value) <= column.bounds[1]:
+                raise ValueError(f"Column '{column.name}' expects {column.dtype}, {value} is out of range")
+        for column, value in zip(self.columns, values):
+            column.pending.append(value)
+        self.length += 1
+        if self.length % self.chunk_size == 0:
+            for column in self.columns:
+                column.seal()
+
+    def to_frame(self):
+        return pd.DataFrame({column.name: column.finalize() for column in self.columns}, copy=False)
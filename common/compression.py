@@ -0,0 +1,50 @@
+import io
+
+import pyarrow as pa
+
+# Codecs of csv and json files and the extension they add, e.g. 1700000000.csv.gz
+TEXT_CODECS = {"gzip": "gz", "zstd": "zst", "lz4": "lz4"}
+# Codecs of the column chunks of parquet files, None keeps the parquet default (snappy)
+PARQUET_CODECS = ("snappy", "gzip", "zstd", "lz4", "brotli", "none")
+
+
+class Compression:
+    def __init__(self, file_type, codec=None, level=None):
+        supported = PARQUET_CODECS if file_type == "parquet" else tuple(TEXT_CODECS)
+        if codec is not None and codec not in supported:
+            raise ValueError(f"Unsupported compression for {file_type}: {codec}, expected one of {', '.join(supported)}")
+        if level is not None:
+            if codec is None or codec in ("snappy", "none"):
+                raise ValueError(f"Compression level is not supported by compression: {codec}")
+            minimum = pa.Codec.minimum_compression_level(codec)
+            maximum = pa.Codec.maximum_compression_level(codec)
+            if not minimum <= level <= maximum:
+                raise ValueError(f"Compression level of {codec} should be between {minimum} and {maximum}.")
+        self.file_type = file_type
+        self.codec = codec
+        self.level = level
+        self.compresses_text = codec is not None and file_type != "parquet"
+        self.extension = f"{file_type}.{TEXT_CODECS[codec]}" if self.compresses_text else file_type
+
+    def compress(self, data: bytes) -> bytes:
+        # Every call produces a complete gzip member, zstd frame or lz4 frame. Their concatenation is still a
+        # valid file, so a file can be written, uploaded or appended to piece by piece. Arrow releases the GIL
+        # while compressing, flushes compressing in the delivery threads do not hold up ingestion.
+        if not self.compresses_text:
+            return data
+        # Codec objects keep their stream state between calls, they are not shared between threads
+        return pa.Codec(self.codec, compression_level=self.level).compress(data, asbytes=True)
+
+    def open_input(self, source):
+        # source is a path or a binary file object, the result can be handed to the pandas readers
+        if not self.compresses_text:
+            return source
+        if not isinstance(source, str):
+            source = pa.PythonFile(source, mode="r")
+        with pa.CompressedInputStream(source, self.codec) as stream:
+            return io.BytesIO(stream.read())
+
+    def parquet_options(self):
+        if self.codec is None:
+            return {}
+        return {"compression": self.codec, "compression_level": self.level}
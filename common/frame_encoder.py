@@ -0,0 +1,38 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from common.compression import Compression
+from common.record_encoder import encode_csv, encode_ndjson, record_columns
+
+
+def encode_frame(file_type, data, compression=None, compression_level=None, exclude=None, chunk_rows=50000) -> bytes:
+    # Encodes and compresses a whole file in memory. It is a module level function of plain arguments,
+    # so handlers can run it in a process pool and only ship the data and the encoded bytes.
+    # data is a DataFrame or a list of dict records, exclude names record keys that are left out.
+    codec = Compression(file_type, compression, compression_level)
+    if file_type == "parquet":
+        df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+        buffer = pa.BufferOutputStream()
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), buffer, **codec.parquet_options())
+        return buffer.getvalue().to_pybytes()
+
+    records = isinstance(data, list)
+    length = len(data) if records else data.shape[0]
+    columns = record_columns(data, exclude) if records and file_type == "csv" else None
+    parts = []
+    for start in range(0, max(length, 1), chunk_rows):
+        chunk = data[start:start + chunk_rows] if records else data.iloc[start:start + chunk_rows]
+        if file_type == "csv":
+            encoded = encode_csv(chunk, columns, header=start == 0) if records else \
+                chunk.to_csv(index=False, header=start == 0).encode("utf-8")
+        else:
+            encoded = encode_ndjson(chunk, exclude) if records else \
+                chunk.to_json(index=False, orient='records', lines=True).encode("utf-8")
+        parts.append(codec.compress(encoded))
+    return b"".join(parts)
+
+
+def warm_up():
+    # Submitted once per pool worker on start, so the first flush does not wait for the imports above
+    return True
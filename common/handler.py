@@ -1,24 +1,182 @@
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from common.FileNameGenerator import FileNameGenerator
+from common.compression import Compression
+from common.frame_encoder import encode_frame
+from common.record_encoder import group_records
+from common.metrics import FILE_WRITE_SECONDS, FILES_WRITTEN, PARTITION_SPLIT_SECONDS, SERIALIZE_SECONDS
+
+DEFAULT_PARTITION_WORKERS = 8
+# Rows encoded at a time, so serializing a large flush does not hold the whole encoded object in memory
+ENCODE_CHUNK_ROWS = 50000
+
+
+class PartitionWriteResult:
+    def __init__(self, partition, path, records, error=None):
+        # partition maps each partition column to its value, it is None for unpartitioned writes
+        self.partition = partition
+        self.path = path
+        self.records = records
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class PartitionWriteError(Exception):
+    def __init__(self, results):
+        self.results = results
+        failed = [result for result in results if not result.ok]
+        super().__init__(f"Failed to write {len(failed)} of {len(results)} partitions, first error: {failed[0].error}")
 
 
 class Handler:
-    def __init__(self, file_type, filename_based_on='datetime'):
+    # Handlers that can write a list of dict records as they are, without a DataFrame
+    encodes_records = False
+
+    def __init__(self, file_type, filename_based_on='unique', partition_workers=DEFAULT_PARTITION_WORKERS,
+                 compression=None, compression_level=None):
+        if partition_workers < 1:
+            raise ValueError("Partition workers should not be less than 1.")
         self.file_type = file_type
+        self.compression = Compression(file_type, compression, compression_level)
+        # Compressed csv and json files carry the codec in their extension, e.g. .csv.gz
+        self.file_extension = self.compression.extension
         self.filename_based_on = filename_based_on
+        self.filename_generator = FileNameGenerator(self.file_extension, filename_based_on)
+        self.partition_workers = partition_workers
+        self.partition_executor = None
+        # A process pool set by ShardedMiniFirehose, files are then encoded and compressed in it
+        self.encode_pool = None
+        self.file_write_seconds = FILE_WRITE_SECONDS.labels(file_type)
+        self.files_written = FILES_WRITTEN.labels(file_type)
+        self.partition_split_seconds = PARTITION_SPLIT_SECONDS.labels(file_type)
+        self.serialize_seconds = SERIALIZE_SECONDS.labels(file_type)
 
     def _get_filename_based_on(self):
         return self.filename_based_on
 
-    def __generate_filename_based_on_datetime(self):
-        current_time = datetime.now()
-        return f"{current_time.strftime('%Y%m%d%H%M%S')}.{self.file_type}"
+    def _generate_filename(self):
+        return self.filename_generator.generate(self._get_filename_based_on())
+
+    # Implemented by subclasses, that also define partition_cols and has_partitions
+    def get_file_path(self, filename=None):
+        raise NotImplementedError("This method should be implemented by subclasses")
 
-    def __generate_filename_based_on_epoch(self):
-        return f"{int(time.time())}.{self.file_type}"
+    def get_partition_path(self, group_name):
+        raise NotImplementedError("This method should be implemented by subclasses")
 
-    def _generate_filename(self):
-        if self._get_filename_based_on() == "datetime":
-            return self.__generate_filename_based_on_datetime()
+    def _write_data(self, df, file_path):
+        raise NotImplementedError("This method should be implemented by subclasses")
+
+    def _read_data(self, file_path):
+        raise NotImplementedError("This method should be implemented by subclasses")
+
+    def _store(self, file_path, data):
+        # Writes an already encoded file
+        raise NotImplementedError("This method should be implemented by subclasses")
+
+    @staticmethod
+    def _chunks(data):
+        if isinstance(data, list):
+            for start in range(0, max(len(data), 1), ENCODE_CHUNK_ROWS):
+                yield start, data[start:start + ENCODE_CHUNK_ROWS]
+            return
+        for start in range(0, max(data.shape[0], 1), ENCODE_CHUNK_ROWS):
+            yield start, data.iloc[start:start + ENCODE_CHUNK_ROWS]
+
+    def _serialize(self, chunks):
+        # Compresses the encoded pieces of a file, timing how long each one takes to encode and compress
+        chunks = iter(chunks)
+        while True:
+            started = time.perf_counter()
+            data = next(chunks, None)
+            if data is None:
+                return
+            data = self.compression.compress(data)
+            self.serialize_seconds.observe(time.perf_counter() - started)
+            yield data
+
+    def get_partition_paths(self, group_names):
+        return [self.get_partition_path(group_name) for group_name in group_names]
+
+    def _partition_failed(self, path):
+        pass
+
+    def _partition_pool(self):
+        if self.partition_executor is None:
+            self.partition_executor = ThreadPoolExecutor(max_workers=self.partition_workers,
+                                                         thread_name_prefix="partition-writer")
+        return self.partition_executor
+
+    def _map_partitions(self, fn, items):
+        if len(items) <= 1 or self.partition_workers == 1:
+            return [fn(item) for item in items]
+        return list(self._partition_pool().map(fn, items))
+
+    def write(self, df, filename=None):
+        # df is a DataFrame, or a list of dict records if the handler encodes_records.
+        # Returns a PartitionWriteResult per written file, or raises PartitionWriteError once every
+        # partition has been attempted if any of them failed
+        if not self.has_partitions:
+            file_path = self.get_file_path(filename)
+            self._write_file(df, file_path)
+            return [PartitionWriteResult(None, file_path, len(df))]
+
+        started = time.perf_counter()
+        groups = list(self._split_partitions(df))
+        self.partition_split_seconds.observe(time.perf_counter() - started)
+        paths = self.get_partition_paths([name for name, _ in groups])
+        partitions = [(dict(zip(self.partition_cols, name)), path, data) for (name, data), path in zip(groups, paths)]
+        results = self._map_partitions(lambda partition: self._write_partition(*partition), partitions)
+        if not all(result.ok for result in results):
+            raise PartitionWriteError(results)
+        return results
+
+    def _split_partitions(self, df):
+        if isinstance(df, list):
+            yield from group_records(df, self.partition_cols)
+            return
+        # One pass: number the groups, sort the rows by group once and slice the sorted frame, instead of
+        # copying every group and then copying it again to drop the partition columns.
+        # Rows with a missing partition value are skipped, like groupby does.
+        codes = df.groupby(self.partition_cols, sort=False).ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        order = np.argsort(codes, kind="stable")
+        order = order[codes[order] >= 0]
+        codes = codes[order]
+        starts = np.flatnonzero(np.diff(codes, prepend=-1))
+        ends = np.append(starts[1:], len(order))
+        data = df.drop(columns=self.partition_cols).take(order)
+        names = df[self.partition_cols].take(order[starts]).itertuples(index=False, name=None)
+        for name, start, end in zip(names, starts, ends):
+            yield name, data.iloc[start:end]
+
+    def _write_file(self, data, path):
+        started = time.perf_counter()
+        if self.encode_pool is None:
+            self._write_data(data, path)
         else:
-            return self.__generate_filename_based_on_epoch()
+            exclude = self.partition_cols if self.has_partitions else None
+            encoded = self.encode_pool.submit(encode_frame, self.file_type, data, self.compression.codec,
+                                              self.compression.level, exclude, ENCODE_CHUNK_ROWS).result()
+            self.serialize_seconds.observe(time.perf_counter() - started)
+            self._store(path, encoded)
+        self.file_write_seconds.observe(time.perf_counter() - started)
+        self.files_written.inc()
+
+    def _write_partition_file(self, data, path):
+        # Returns the path the data ended up in
+        self._write_file(data, path)
+        return path
+
+    def _write_partition(self, partition, path, data):
+        try:
+            path = self._write_partition_file(data, path)
+            return PartitionWriteResult(partition, path, len(data))
+        except Exception as e:
+            self._partition_failed(path)
+            return PartitionWriteResult(partition, path, len(data), e)
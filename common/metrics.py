@@ -0,0 +1,293 @@
+import bisect
+import math
+import threading
+
+# Seconds, from sub millisecond appends to slow uploads
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                   10, 30, 60)
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+# Only every n-th add_message call is timed, timing each of them costs more than the call itself
+ADD_MESSAGE_SAMPLE_EVERY = 16
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+               for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class CounterChild:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class GaugeChild:
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        # Read when the metrics are collected, for values the firehose already keeps
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+
+class HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        count = sum(counts)
+        return {"count": count, "sum": total, "p50": self._quantile(counts, count, 0.5),
+                "p99": self._quantile(counts, count, 0.99)}
+
+    def _quantile(self, counts, count, q):
+        # Interpolated within the bucket holding the quantile, like histogram_quantile() in PromQL
+        if count == 0:
+            return None
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count > 0:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index > 0 else 0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.children[()] = self._new_child()
+        (registry if registry is not None else default_registry).register(self)
+
+    def labels(self, *values):
+        # Children are created once and should be kept by the caller, the lookup is not free
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError("This method should be implemented by subclasses")
+
+    def items(self):
+        # Label values and child of every labelled series, a snapshot that is safe to iterate
+        with self.lock:
+            return list(self.children.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in self.items():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return GaugeChild()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def _render_child(self, values, child):
+        with child.lock:
+            counts, total = list(child.counts), child.sum
+        lines = []
+        cumulative = 0
+        for bucket, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, ("le", _format_value(float(bucket))))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} is already registered.")
+            self.metrics[metric.name] = metric
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+default_registry = Registry()
+
+# Per firehose, instrumented by MiniFirehose
+ADD_SECONDS = Histogram("minifirehose_add_seconds",
+                        f"Time spent in add_messages calls and every {ADD_MESSAGE_SAMPLE_EVERY}th add_message call.",
+                        ["firehose"])
+FLUSHES = Counter("minifirehose_flushes_total", "Batches handed to the sinks, by what triggered the flush.",
+                  ["firehose", "event"])
+BATCH_RECORDS = Histogram("minifirehose_batch_records", "Messages per flushed batch, its sum counts every flushed "
+                                                         "message.", ["firehose"],
+                          buckets=SIZE_BUCKETS)
+FLUSH_SECONDS = Histogram("minifirehose_flush_seconds",
+                          "Time from a flush until every sink delivered or dead lettered its batch.", ["firehose"])
+DELIVERY_SECONDS = Histogram("minifirehose_sink_delivery_seconds", "Time of each delivery attempt to a sink.",
+                             ["firehose", "sink"])
+DELIVERY_FAILURES = Counter("minifirehose_sink_failures_total", "Failed delivery attempts.", ["firehose", "sink"])
+DEAD_LETTERS = Counter("minifirehose_dead_letter_batches_total", "Batches that exhausted their retries.",
+                       ["firehose", "sink"])
+BUFFER_RECORDS = Gauge("minifirehose_buffer_records", "Messages in the active buffer.", ["firehose"])
+BUFFER_BYTES = Gauge("minifirehose_buffer_bytes", "Estimated size of the active buffer.", ["firehose"])
+IN_FLIGHT_BATCHES = Gauge("minifirehose_in_flight_batches", "Flushed batches not yet delivered by every sink.",
+                          ["firehose"])
+QUEUED_BYTES = Gauge("minifirehose_queued_bytes", "Estimated size of the in-flight batches.", ["firehose"])
+FLUSH_COUNT_LIMIT = Gauge("minifirehose_flush_count_limit",
+                          "Buffer count that triggers a flush, tuned by adaptive flushing.", ["firehose"])
+PENDING_RETRIES = Gauge("minifirehose_pending_retries", "Deliveries waiting out their retry backoff.", ["firehose"])
+
+# Process wide, instrumented by the batches and handlers
+FRAME_BUILD_SECONDS = Histogram("minifirehose_frame_build_seconds", "Time to build the DataFrame of a batch.")
+PARTITION_SPLIT_SECONDS = Histogram("minifirehose_partition_split_seconds",
+                                    "Time to split a flush into its partitions.", ["format"])
+SERIALIZE_SECONDS = Histogram("minifirehose_serialize_seconds",
+                              "Time to encode and compress a chunk of a file. Not measured separately for "
+                              "uncompressed DataFrames written to local files.", ["format"])
+FILE_WRITE_SECONDS = Histogram("minifirehose_file_write_seconds",
+                               "Time to encode and store one file, e.g. one partition of a flush.", ["format"])
+FILES_WRITTEN = Counter("minifirehose_files_written_total", "Files written, or appended to by streaming writers.",
+                        ["format"])
+BYTES_WRITTEN = Counter("minifirehose_bytes_written_total", "Bytes written to storage.", ["storage"])
+S3_PART_SECONDS = Histogram("minifirehose_s3_part_upload_seconds",
+                            "Time to upload one multipart part, or a whole object sent in one request.")
+
+
+class FirehoseMetrics:
+    # The children of one firehose, resolved once so the hot paths only pay for inc() and observe()
+    def __init__(self, firehose):
+        name = firehose.name
+        self.name = name
+        # Counts add_message calls to pick the sampled ones, not locked, an extra or missed sample does not matter
+        self.add_calls = 0
+        self.add_seconds = ADD_SECONDS.labels(name)
+        self.batch_records = BATCH_RECORDS.labels(name)
+        self.flush_seconds = FLUSH_SECONDS.labels(name)
+        self.flushes = {}
+        sinks = range(len(firehose.sinks))
+        self.delivery_seconds = [DELIVERY_SECONDS.labels(name, index) for index in sinks]
+        self.delivery_failures = [DELIVERY_FAILURES.labels(name, index) for index in sinks]
+        self.dead_letters = [DEAD_LETTERS.labels(name, index) for index in sinks]
+        self.gauges = [
+            (BUFFER_RECORDS, lambda: firehose.buffer_count),
+            (BUFFER_BYTES, lambda: int(firehose.buffer_size_in_mb * 1024 * 1024)),
+            (IN_FLIGHT_BATCHES, lambda: firehose.in_flight_batches),
+            (QUEUED_BYTES, lambda: firehose.queued_bytes),
+            (PENDING_RETRIES, lambda: len(firehose.retry_tasks)),
+            (FLUSH_COUNT_LIMIT, lambda: firehose.count_limit),
+        ]
+
+    def flushed(self, event, count):
+        counter = self.flushes.get(event)
+        if counter is None:
+            counter = self.flushes[event] = FLUSHES.labels(self.name, event)
+        counter.inc()
+        self.batch_records.observe(count)
+
+    def register_gauges(self):
+        for gauge, function in self.gauges:
+            gauge.labels(self.name).set_function(function)
+
+    def remove_gauges(self):
+        # Only when still ours, another firehose may have been started under the same name since
+        for gauge, function in self.gauges:
+            with gauge.lock:
+                child = gauge.children.get((self.name,))
+                if child is not None and child.function is function:
+                    del gauge.children[(self.name,)]
+
+    def stats(self):
+        return {
+            "flushed-messages": self.batch_records.sum,
+            "add-seconds": self.add_seconds.snapshot(),
+            "flushes": {event: counter.value for (name, event), counter in FLUSHES.items() if name == self.name},
+            "batch-records": self.batch_records.snapshot(),
+            "flush-seconds": self.flush_seconds.snapshot(),
+            "sinks": [{"delivery-seconds": seconds.snapshot(), "failures": failures.value,
+                       "dead-letter-batches": dead_letters.value}
+                      for seconds, failures, dead_letters in
+                      zip(self.delivery_seconds, self.delivery_failures, self.dead_letters)],
+        }
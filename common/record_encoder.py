@@ -0,0 +1,116 @@
+import csv
+import datetime
+import io
+import json
+from itertools import chain
+from operator import itemgetter
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Encodes flushes of dict records into NDJSON and CSV without building a DataFrame. orjson is used
+# when it is installed, it is several times faster than the json module.
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def is_records(data):
+    return isinstance(data, list) and all(type(record) is dict for record in data)
+
+
+def _default(value):
+    # Values neither backend encodes natively. Numpy scalars and datetimes are written the way orjson
+    # writes them, so the json module produces the same bytes.
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def _json_dumps(record) -> bytes:
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def _orjson_dumps(record) -> bytes:
+        return orjson.dumps(record, default=_default, option=_ORJSON_OPTIONS)
+
+    dumps = _orjson_dumps
+else:
+    dumps = _json_dumps
+
+
+def _without(record, exclude):
+    record = record.copy()
+    for key in exclude:
+        record.pop(key, None)
+    return record
+
+
+def encode_ndjson(records, exclude=None) -> bytes:
+    # exclude names keys left out of every line, e.g. the partition columns
+    if not records:
+        return b""
+    if exclude:
+        return b"\n".join([dumps(_without(record, exclude)) for record in records]) + b"\n"
+    return b"\n".join([dumps(record) for record in records]) + b"\n"
+
+
+def record_columns(records, exclude=None):
+    # Every key of every record in the order they first appear, like pandas.DataFrame(records)
+    columns = dict.fromkeys(chain.from_iterable(records))
+    for key in exclude or ():
+        columns.pop(key, None)
+    return list(columns)
+
+
+def encode_csv(records, columns, header=True) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(columns)
+    if len(columns) > 1:
+        try:
+            # Records usually all have every column, itemgetter builds their rows in C
+            rows = list(map(itemgetter(*columns), records))
+        except KeyError:
+            rows = [[record.get(column) for column in columns] for record in records]
+    else:
+        rows = [[record.get(column) for column in columns] for record in records]
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def group_records(records, partition_cols):
+    # One pass over the records. The grouped records are the original ones and still hold the partition
+    # columns, the encoders leave them out. Records missing a partition value are skipped, like the pandas
+    # path does.
+    groups = {}
+    if len(partition_cols) == 1:
+        col = partition_cols[0]
+        for record in records:
+            name = record.get(col)
+            if name is None:
+                continue
+            group = groups.get(name)
+            if group is None:
+                group = groups[name] = []
+            group.append(record)
+        return [((name,), group) for name, group in groups.items()]
+    for record in records:
+        name = tuple(map(record.get, partition_cols))
+        if None in name:
+            continue
+        group = groups.get(name)
+        if group is None:
+            group = groups[name] = []
+        group.append(record)
+    return list(groups.items())
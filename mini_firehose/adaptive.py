@@ -0,0 +1,128 @@
+import threading
+from collections import deque
+
+# Shortest time limit the controller sets, below it the scheduler would mostly flush empty buffers
+MIN_TIME_LIMIT = 0.05
+
+
+class AdaptiveFlushConfig:
+    def __init__(self, min_count=100, max_count=100_000, target_latency=5.0, target_file_mb=64, window=20,
+                 max_step=2.0):
+        if min_count < 1:
+            raise ValueError("Min count should not be less than 1.")
+        if max_count < min_count:
+            raise ValueError("Max count should not be less than min count.")
+        if target_latency <= MIN_TIME_LIMIT:
+            raise ValueError(f"Target latency should be greater than {MIN_TIME_LIMIT} seconds.")
+        if target_file_mb is not None and target_file_mb <= 0:
+            raise ValueError("Target file size should be greater than 0 MB.")
+        if window < 2:
+            raise ValueError("Window should not be less than 2 flushes.")
+        if max_step <= 1:
+            raise ValueError("Max step should be greater than 1.")
+        self.min_count = min_count
+        self.max_count = max_count
+        # Seconds from a message entering the buffer until every sink delivered it
+        self.target_latency = target_latency
+        # Size of a flush before it is split into partitions, None leaves it to the latency target
+        self.target_file_mb = target_file_mb
+        # Number of recent flushes the estimates are based on
+        self.window = window
+        # The count limit changes at most by this factor per flush, so one slow upload does not swing it
+        self.max_step = max_step
+
+
+# Tunes the count and time limits of a firehose from its recent flushes. A flush of n messages is
+# modelled as taking seconds_per_flush + n * seconds_per_record from the flush until every sink
+# delivered it, which covers encoding, compression and upload. With messages arriving at rate r, the
+# first message of a batch waits n / r for the batch to fill and then for its delivery. The count limit
+# is the largest batch that keeps this under target_latency and the batch at or below target_file_mb,
+# but never smaller than the batch a sink needs to keep up with the arrival rate.
+class AdaptiveFlushController:
+    def __init__(self, config: AdaptiveFlushConfig, buffer_time_limit=-1):
+        self.config = config
+        # The static time limit of the firehose stays an upper bound
+        self.buffer_time_limit = buffer_time_limit
+        self.samples = deque(maxlen=config.window)
+        self.lock = threading.Lock()
+        # Starts small, the limit grows by max_step per flush as long as the estimates allow it
+        self.count_limit = config.min_count
+        self.time_limit = self._cap_time(config.target_latency)
+        self.decisions = 0
+        self.reason = "initial"
+        self.estimates = {}
+
+    def _cap_time(self, time_limit):
+        if self.buffer_time_limit != -1:
+            time_limit = min(time_limit, self.buffer_time_limit)
+        return max(time_limit, MIN_TIME_LIMIT)
+
+    def observe(self, count, size_mb, fill_seconds, delivery_seconds):
+        # Called once every sink is done with a flush
+        if count <= 0:
+            return
+        with self.lock:
+            self.samples.append((count, size_mb, max(fill_seconds, 1e-6), delivery_seconds))
+            self._decide()
+
+    def _delivery_model(self):
+        # Least squares fit of delivery seconds against batch size. Without enough spread in the batch
+        # sizes the whole time is put on the records, which overestimates large batches but never small ones.
+        counts = [sample[0] for sample in self.samples]
+        seconds = [sample[3] for sample in self.samples]
+        mean_count = sum(counts) / len(counts)
+        mean_seconds = sum(seconds) / len(seconds)
+        variance = sum((count - mean_count) ** 2 for count in counts)
+        if variance > 0 and len(counts) >= 3:
+            per_record = sum((count - mean_count) * (second - mean_seconds)
+                             for count, second in zip(counts, seconds)) / variance
+            per_flush = mean_seconds - per_record * mean_count
+            if per_record >= 0 and per_flush >= 0:
+                return per_flush, per_record
+        return 0.0, sum(seconds) / sum(counts)
+
+    def _decide(self):
+        config = self.config
+        total_count = sum(sample[0] for sample in self.samples)
+        arrival_rate = total_count / sum(sample[2] for sample in self.samples)
+        record_mb = sum(sample[1] for sample in self.samples) / total_count
+        per_flush, per_record = self._delivery_model()
+
+        # n / r + a + b * n <= target_latency
+        room = config.target_latency - per_flush
+        latency_count = room * arrival_rate / (1 + per_record * arrival_rate) if room > 0 else 0
+        count, reason = latency_count, "latency"
+        if config.target_file_mb is not None and record_mb > 0:
+            file_count = config.target_file_mb / record_mb
+            if file_count < count:
+                count, reason = file_count, "file-size"
+        # Deliveries of a sink run one after another, a + b * n must fit in the n / r it takes to fill the next batch
+        if per_record * arrival_rate < 1:
+            keep_up_count = per_flush * arrival_rate / (1 - per_record * arrival_rate)
+        else:
+            keep_up_count = config.max_count
+        if keep_up_count > count:
+            count, reason = keep_up_count, "throughput"
+
+        count = min(max(count, self.count_limit / config.max_step), self.count_limit * config.max_step)
+        if count <= config.min_count:
+            count, reason = config.min_count, "min-count"
+        elif count >= config.max_count:
+            count, reason = config.max_count, "max-count"
+        self.count_limit = int(count)
+        # A quiet buffer is flushed in time for its oldest message to be delivered within the target
+        self.time_limit = self._cap_time(config.target_latency - per_flush -
+                                         per_record * min(self.count_limit, arrival_rate * config.target_latency))
+        self.decisions += 1
+        self.reason = reason
+        self.estimates = {
+            "arrival-rate": round(arrival_rate, 2),
+            "record-bytes": round(record_mb * 1024 * 1024, 1),
+            "seconds-per-flush": round(per_flush, 6),
+            "seconds-per-record": round(per_record, 9),
+        }
+
+    def stats(self):
+        with self.lock:
+            return {"count-limit": self.count_limit, "time-limit": round(self.time_limit, 3), "reason": self.reason,
+                    "decisions": self.decisions, **self.estimates}
@@ -1,10 +1,16 @@
 import asyncio
+import json
 import signal
-from typing import Optional, List, Union
-from fastapi import FastAPI, HTTPException
+from typing import Any, Optional, List, Union
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field, validator
 from uvicorn import Config, Server
-from mini_firehose.mini_firehose import MiniFirehose, FirehoseConfig
+from mini_firehose.adaptive import AdaptiveFlushConfig
+from mini_firehose.async_mini_firehose import AsyncMiniFirehose
+from common.metrics import default_registry
+from mini_firehose.mini_firehose import FirehoseConfig, BackpressureError
+from mini_firehose.retry import RetryPolicy
 from sinks.local.local_sink import LocalSink
 from sinks.s3.s3_sink import S3Sink
 
@@ -13,7 +19,10 @@ class CreateLocalSinkRequest(BaseModel):
     directory: str
     output_format: str = Field(alias="output-format", example="csv|json|parquet")
     partition_cols: Optional[List[str]] = Field(alias="partition-cols", default=None, example=["Country", "City"])
-    filename_based_on: Optional[str] = Field(alias="filename-strategy", default="datetime", example="datetime|epoch")
+    filename_based_on: Optional[str] = Field(alias="filename-strategy", default="unique", example="unique|datetime|epoch")
+    partition_workers: int = Field(alias="partition-workers", default=8)
+    compression: Optional[str] = Field(default=None, example="gzip|zstd|lz4 (csv, json), snappy|gzip|zstd|lz4|brotli|none (parquet)")
+    compression_level: Optional[int] = Field(alias="compression-level", default=None)
 
 
 class S3ConfigRequest(BaseModel):
@@ -27,8 +36,20 @@ class CreateS3SinkRequest(BaseModel):
     prefix: Optional[str] = None
     output_format: str = Field(alias="output-format", example="csv|json|parquet")
     partition_cols: Optional[List[str]] = Field(alias="partition-cols", default=None, example=["Country", "City"])
-    filename_based_on: Optional[str] = Field(alias="filename-strategy", default="datetime", example="datetime|epoch")
+    filename_based_on: Optional[str] = Field(alias="filename-strategy", default="unique", example="unique|datetime|epoch")
+    partition_workers: int = Field(alias="partition-workers", default=8)
+    compression: Optional[str] = Field(default=None, example="gzip|zstd|lz4 (csv, json), snappy|gzip|zstd|lz4|brotli|none (parquet)")
+    compression_level: Optional[int] = Field(alias="compression-level", default=None)
     s3_config: Optional[S3ConfigRequest] = Field(alias="s3-config", default=None)
+    part_size_mb: int = Field(alias="part-size-mb", default=8)
+    upload_concurrency: int = Field(alias="upload-concurrency", default=4)
+
+
+class AdaptiveFlushRequest(BaseModel):
+    min_count: int = Field(alias="min-count", default=100)
+    max_count: int = Field(alias="max-count", default=100000)
+    target_latency: float = Field(alias="target-latency", default=5.0)
+    target_file_mb: Optional[float] = Field(alias="target-file-mb", default=64)
 
 
 class CreateMiniFirehoseRequest(BaseModel):
@@ -36,6 +57,15 @@ class CreateMiniFirehoseRequest(BaseModel):
     buffer_time: int = Field(alias="buffer-time", default=60)
     buffer_size: int = Field(alias="buffer-size", default=1)
     buffer_count: int = Field(alias="buffer-count", default=10)
+    max_in_flight_batches: int = Field(alias="max-in-flight-batches", default=-1)
+    max_in_flight_mb: float = Field(alias="max-in-flight-mb", default=-1)
+    backpressure_policy: str = Field(alias="backpressure-policy", default="block", example="block|timeout|reject")
+    backpressure_timeout: Optional[float] = Field(alias="backpressure-timeout", default=None)
+    retry_attempts: int = Field(alias="retry-attempts", default=1)
+    retry_base_delay: float = Field(alias="retry-base-delay", default=0.5)
+    retry_max_delay: float = Field(alias="retry-max-delay", default=30)
+    dead_letter_directory: Optional[str] = Field(alias="dead-letter-directory", default=None)
+    adaptive_flush: Optional[AdaptiveFlushRequest] = Field(alias="adaptive-flush", default=None)
     sink_type: str = Field(alias="sink")
     sink_config: Union[CreateLocalSinkRequest, CreateS3SinkRequest] = Field(alias="sink-config")
 
@@ -53,6 +83,10 @@ class MessageModel(BaseModel):
     message: str
 
 
+# Number of NDJSON records handed to the firehose at once by the streaming route
+STREAM_CHUNK_SIZE = 1000
+
+
 class MiniFirehoseApi:
     def __init__(self, host="127.0.0.1", port=8000):
         self.host = host
@@ -76,6 +110,9 @@ class MiniFirehoseApi:
         except Exception as e:
             print(f"Error occurred: {e}")
         finally:
+            # Flushes what the firehoses still buffer
+            for firehose in self.mini_firehoses.values():
+                await firehose.stop()
             print("Server stopped.")
 
     async def stop(self):
@@ -86,9 +123,13 @@ class MiniFirehoseApi:
         sub_domain = "minifirehoses"
         self.app.add_api_route(f"/{sub_domain}", self.create_mini_firehose, methods=['POST'])
         self.app.add_api_route(f"/{sub_domain}", self.get_mini_firehoses, methods=['GET'], response_model=List[str])
-        self.app.add_api_route(f"/{sub_domain}" + "/{mini_firehose_name}", self.delete_mini_firehose, methods=['DELETE'])
-        self.app.add_api_route(f"/{sub_domain}" + "/{mini_firehose_name}/message", self.add_message, methods=['POST'])
-        self.app.add_api_route(f"/{sub_domain}" + "/{mini_firehose_name}/stats", self.get_stats, methods=['GET'])
+        self.app.add_api_route(f"/{sub_domain}" + "/{firehose_name}", self.delete_mini_firehose, methods=['DELETE'])
+        self.app.add_api_route(f"/{sub_domain}" + "/{firehose_name}/message", self.add_message, methods=['POST'])
+        self.app.add_api_route(f"/{sub_domain}" + "/{firehose_name}/messages", self.add_messages, methods=['POST'])
+        self.app.add_api_route(f"/{sub_domain}" + "/{firehose_name}/messages/stream", self.stream_messages, methods=['POST'])
+        self.app.add_api_route(f"/{sub_domain}" + "/{firehose_name}/stats", self.get_stats, methods=['GET'])
+        self.app.add_api_route(f"/{sub_domain}" + "/{firehose_name}/redrive", self.redrive, methods=['POST'])
+        self.app.add_api_route("/metrics", self.get_metrics, methods=['GET'], response_class=PlainTextResponse)
 
     async def create_mini_firehose(self, request: CreateMiniFirehoseRequest):
         if request.name in self.mini_firehoses:
@@ -98,18 +139,34 @@ class MiniFirehoseApi:
                 case "local":
                     sink = LocalSink(**request.sink_config.model_dump())
                 case "s3":
-                    sink = S3Sink(**request.sink_config.model_dump())
+                    sink_config = request.sink_config.model_dump()
+                    if request.sink_config.s3_config is not None:
+                        # Handlers read the credentials by their api names
+                        sink_config["s3_config"] = request.sink_config.s3_config.model_dump(by_alias=True)
+                    sink = S3Sink(**sink_config)
                 case _:
                     raise HTTPException(status_code=400, detail="Unknown sink")
 
+            retry_policy = None
+            if request.retry_attempts > 1:
+                retry_policy = RetryPolicy(max_attempts=request.retry_attempts,
+                                           base_delay=request.retry_base_delay,
+                                           max_delay=request.retry_max_delay)
             config = FirehoseConfig(
                 buffer_count_limit=request.buffer_count,
                 buffer_time_limit=request.buffer_time,
-                buffer_size_limit_mb=request.buffer_size
+                buffer_size_limit_mb=request.buffer_size,
+                max_in_flight_batches=request.max_in_flight_batches,
+                max_in_flight_mb=request.max_in_flight_mb,
+                backpressure_policy=request.backpressure_policy,
+                backpressure_timeout=request.backpressure_timeout,
+                retry_policy=retry_policy,
+                dead_letter_directory=request.dead_letter_directory,
+                adaptive=AdaptiveFlushConfig(**request.adaptive_flush.model_dump()) if request.adaptive_flush else None
             )
 
-            firehose = MiniFirehose(name=request.name, sinks=[sink], config=config)
-            firehose.start()
+            firehose = AsyncMiniFirehose(name=request.name, sinks=[sink], config=config)
+            await firehose.start()
             self.mini_firehoses[request.name] = firehose
             return {"message": f"MiniFirehose '{request.name}' created"}
 
@@ -123,25 +180,81 @@ class MiniFirehoseApi:
     async def delete_mini_firehose(self, firehose_name: str):
         if firehose_name not in self.mini_firehoses:
             raise HTTPException(status_code=400, detail="MiniFirehose not found")
-        self.mini_firehoses[firehose_name].stop()
+        await self.mini_firehoses[firehose_name].stop()
         del self.mini_firehoses[firehose_name]
         return {"message": f"MiniFirehose '{firehose_name}' deleted"}
 
     async def add_message(self, firehose_name: str, message: MessageModel):
         if firehose_name not in self.mini_firehoses:
             raise HTTPException(status_code=400, detail="MiniFirehose not found")
-        self.mini_firehoses[firehose_name].add_message(message.message)
+        try:
+            await self.mini_firehoses[firehose_name].add_message(message.message)
+        except BackpressureError as e:
+            raise HTTPException(status_code=429, detail=str(e))
         return {"message": "Message added"}
 
+    async def add_messages(self, firehose_name: str, messages: List[Any]):
+        # Takes any JSON values, the same records the NDJSON stream accepts one per line
+        if firehose_name not in self.mini_firehoses:
+            raise HTTPException(status_code=400, detail="MiniFirehose not found")
+        accepted = await self.mini_firehoses[firehose_name].add_messages(messages)
+        return {"message": "Messages added", "received": len(messages), "accepted": accepted}
+
+    async def stream_messages(self, firehose_name: str, request: Request):
+        # Accepts an NDJSON body and feeds it to the firehose chunk by chunk without reading the whole body
+        if firehose_name not in self.mini_firehoses:
+            raise HTTPException(status_code=400, detail="MiniFirehose not found")
+        firehose = self.mini_firehoses[firehose_name]
+        received = accepted = 0
+        records = []
+        remainder = b""
+        async for body_chunk in request.stream():
+            lines = (remainder + body_chunk).split(b"\n")
+            remainder = lines.pop()
+            records.extend(self._parse_ndjson(lines, received + len(records), accepted))
+            if len(records) >= STREAM_CHUNK_SIZE:
+                received += len(records)
+                accepted += await firehose.add_messages(records)
+                records = []
+                if accepted < received:
+                    # The backpressure policy or the schema rejected part of the chunk, stop reading the body
+                    return {"message": "Messages added", "received": received, "accepted": accepted}
+        records.extend(self._parse_ndjson([remainder], received + len(records), accepted))
+        if records:
+            received += len(records)
+            accepted += await firehose.add_messages(records)
+        return {"message": "Messages added", "received": received, "accepted": accepted}
+
+    @staticmethod
+    def _parse_ndjson(lines, received, accepted):
+        records = []
+        try:
+            for line in lines:
+                if line.strip():
+                    records.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid NDJSON record after {received + len(records)} "
+                                                        f"records ({accepted} accepted): {e}")
+        return records
+
     async def get_stats(self, firehose_name: str):
         if firehose_name not in self.mini_firehoses:
             raise HTTPException(status_code=404, detail="MiniFirehose not found")
-        # Implement your method to get stats from the firehose
-        stats = {
-            "buffer-count": self.mini_firehoses[firehose_name].buffer_count,
-            "buffer-size-in-mb": self.mini_firehoses[firehose_name].buffer_size_in_mb
-        }
-        return stats
+        return self.mini_firehoses[firehose_name].stats()
+
+    async def get_metrics(self):
+        # Prometheus text format, for every firehose of the process and the sinks they write with
+        return PlainTextResponse(default_registry.render(), media_type="text/plain; version=0.0.4")
+
+    async def redrive(self, firehose_name: str, sink_index: Optional[int] = None):
+        if firehose_name not in self.mini_firehoses:
+            raise HTTPException(status_code=404, detail="MiniFirehose not found")
+        try:
+            # Redrive delivers synchronously, it runs off the event loop
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.mini_firehoses[firehose_name].redrive, sink_index)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
 
 if __name__ == "__main__":
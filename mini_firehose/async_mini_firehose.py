@@ -0,0 +1,135 @@
+import asyncio
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from mini_firehose.mini_firehose import MiniFirehose, FirehoseConfig, BackpressureError
+from mini_firehose.scheduler import LoopScheduler
+from sinks.sink import Sink
+
+logger = logging.getLogger(__name__)
+
+# Threads appending to the write-ahead log, several of them so concurrent requests share group commits
+WAL_INGEST_WORKERS = 8
+
+
+# A MiniFirehose for asyncio code such as the API server. Nothing it does on the event loop blocks:
+# - messages are appended on the loop, which owns the buffer, or in ingest threads when a write-ahead
+#   log has to fsync them
+# - backpressure is awaited instead of blocking the caller's thread
+# - the time limit and retry backoff are loop.call_later timers
+# - sinks deliver, i.e. encode, compress and upload, in the delivery threads as before, and flush()
+#   awaits the delivery of its batch
+class AsyncMiniFirehose(MiniFirehose):
+    def __init__(self, name: str, sinks: List[Sink], config: FirehoseConfig = FirehoseConfig()):
+        super().__init__(name, sinks, config)
+        self.loop = None
+        self.capacity_waiters = []
+        self.delivery_waiters = {}
+        self.ingest_executor = None
+        if self.wal:
+            self.ingest_executor = ThreadPoolExecutor(max_workers=WAL_INGEST_WORKERS,
+                                                      thread_name_prefix="firehose-ingest")
+
+    async def _ingest(self, fn, *args):
+        if self.ingest_executor is None:
+            return fn(*args)
+        return await self.loop.run_in_executor(self.ingest_executor, fn, *args)
+
+    async def add_message(self, message):
+        await self._wait_for_capacity_async()
+        await self._ingest(super().add_message, message)
+
+    async def add_messages(self, messages, chunk_size=1000) -> int:
+        accepted = 0
+        iterator = iter(messages)
+        while chunk := list(itertools.islice(iterator, chunk_size)):
+            try:
+                await self._wait_for_capacity_async()
+            except BackpressureError as e:
+                logger.warning(f"{e}, accepted {accepted} messages")
+                break
+            # One chunk at a time, capacity was awaited above so the synchronous check passes right away
+            chunk_accepted = await self._ingest(super().add_messages, chunk, chunk_size)
+            accepted += chunk_accepted
+            if chunk_accepted < len(chunk):
+                break
+        return accepted
+
+    async def _wait_for_capacity_async(self):
+        if not self._in_flight_full():
+            return
+        match self.config.backpressure_policy:
+            case "reject":
+                raise BackpressureError(f"{self.name} has reached its in-flight flush limit")
+            case "timeout":
+                try:
+                    await asyncio.wait_for(self._capacity(), self.config.backpressure_timeout)
+                except asyncio.TimeoutError:
+                    raise BackpressureError(f"{self.name} timed out waiting for in-flight flushes")
+            case _:
+                await self._capacity()
+
+    async def _capacity(self):
+        # Releases happen on delivery threads, they wake the waiters through the loop
+        while self._in_flight_full():
+            waiter = self.loop.create_future()
+            self.capacity_waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self.capacity_waiters:
+                    self.capacity_waiters.remove(waiter)
+
+    def _wake_capacity_waiters(self):
+        waiters, self.capacity_waiters = self.capacity_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _release(self, batch):
+        super()._release(batch)
+        waiter = self.delivery_waiters.pop(id(batch), None)
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._wake_capacity_waiters)
+            if waiter is not None:
+                self.loop.call_soon_threadsafe(self._set_delivered, waiter)
+
+    @staticmethod
+    def _set_delivered(waiter):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    async def flush(self, event="manual-flush"):
+        # Flushes the buffer and returns once every sink delivered, retried or dead lettered the batch
+        batch = await self._ingest(self._take_buffer)
+        if not batch:
+            return
+        delivered = self.loop.create_future()
+        self.delivery_waiters[id(batch)] = delivered
+        self._dispatch(batch, event)
+        await delivered
+
+    def _take_buffer(self):
+        with self.buffer_lock:
+            return self._swap_buffer()
+
+    def _on_time_limit(self):
+        # Runs on the loop, a flush builds its batch under the buffer lock
+        if self.ingest_executor is None:
+            super()._on_time_limit()
+        else:
+            self.ingest_executor.submit(super()._on_time_limit)
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.scheduler = LoopScheduler(self.loop)
+        # Replaying the write-ahead log reads and delivers whole segments
+        await self.loop.run_in_executor(None, super().start)
+
+    async def stop(self):
+        # The final flush and waiting for the delivery threads happen off the loop
+        await self.loop.run_in_executor(None, super().stop)
+        if self.ingest_executor is not None:
+            self.ingest_executor.shutdown(wait=True)
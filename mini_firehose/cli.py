@@ -1,6 +1,12 @@
 import argparse
 import asyncio
+import json
+import sys
+import urllib.request
 from mini_firehose.api import MiniFirehoseApi  # Import the FastAPIServer from your api.py
+from sinks.compaction import CompactionConfig
+from sinks.local.local_sink import LocalSink
+from sinks.s3.s3_sink import S3Sink
 
 
 class MiniFirehoseCLI:
@@ -26,6 +32,38 @@ class MiniFirehoseCLI:
         stop_cmd = start_parser.add_parser('stop', help='Stop the Mini Firehose server')
         stop_cmd.set_defaults(func=self.stop_server)
 
+        # Subparser for 'dlq' command
+        dlq_parser = subparsers.add_parser("dlq", help="Manage dead letters of a running Mini Firehose")
+        dlq_subparsers = dlq_parser.add_subparsers(dest='dlq_command')
+        redrive_cmd = dlq_subparsers.add_parser('redrive', help='Deliver spooled dead letters again')
+        redrive_cmd.set_defaults(func=self.redrive)
+        redrive_cmd.add_argument('name', type=str, help='Name of the Mini Firehose')
+        redrive_cmd.add_argument('--sink', type=int, default=None, help='Only redrive this sink index')
+        redrive_cmd.add_argument('--host', type=str, default='127.0.0.1', help='Host of the server')
+        redrive_cmd.add_argument('--port', type=int, default=8000, help='Port of the server')
+
+        # Subparser for 'compact' command
+        compact_cmd = subparsers.add_parser("compact", help="Merge the small files written by a sink")
+        compact_cmd.set_defaults(func=self.compact)
+        compact_cmd.add_argument('sink', choices=['local', 's3'], help='Type of the sink')
+        compact_cmd.add_argument('--output-format', required=True, choices=['csv', 'json', 'parquet'])
+        compact_cmd.add_argument('--directory', type=str, help='Directory of a local sink')
+        compact_cmd.add_argument('--bucket', type=str, help='Bucket of an S3 sink')
+        compact_cmd.add_argument('--prefix', type=str, help='Prefix of an S3 sink')
+        compact_cmd.add_argument('--target-file-mb', type=float, default=128, help='Size of the merged files')
+        compact_cmd.add_argument('--min-file-age', type=float, default=300,
+                                 help='Only merge files older than this many seconds')
+        compact_cmd.add_argument('--max-mb-per-sec', type=float, default=-1, help='Limit the I/O of compaction')
+        compact_cmd.add_argument('--compression', type=str, default=None, help='Compression of the files, e.g. gzip')
+        compact_cmd.add_argument('--compression-level', type=int, default=None)
+
+        # Subparser for 'bench' command
+        bench_parser = subparsers.add_parser("bench", help="Benchmark Mini Firehose with synthetic workloads",
+                                             add_help=False)
+        bench_parser.add_argument('bench_args', nargs=argparse.REMAINDER,
+                                  help='run [--suite quick|full ...] or compare BASELINE CURRENT [--threshold PCT]')
+        bench_parser.set_defaults(func=self.bench)
+
     def start_server(self, args):
         if self.api is None:
             self.api = MiniFirehoseApi(args.host, args.port)
@@ -39,8 +77,41 @@ class MiniFirehoseCLI:
         else:
             print("Server is not running.")
 
-    def run(self):
-        args = self.parser.parse_args()
+    def redrive(self, args):
+        url = f"http://{args.host}:{args.port}/minifirehoses/{args.name}/redrive"
+        if args.sink is not None:
+            url += f"?sink_index={args.sink}"
+        with urllib.request.urlopen(urllib.request.Request(url, method='POST')) as response:
+            result = json.loads(response.read())
+        print(f"Redriven: {result['redriven']}, failed: {result['failed']}")
+
+    def compact(self, args):
+        compaction = CompactionConfig(target_file_mb=args.target_file_mb, min_file_age=args.min_file_age,
+                                      interval=-1, max_mb_per_sec=args.max_mb_per_sec)
+        if args.sink == 'local':
+            if not args.directory:
+                self.parser.error("compact local requires --directory")
+            sink = LocalSink(args.directory, args.output_format, compaction=compaction, compression=args.compression,
+                             compression_level=args.compression_level)
+        else:
+            if not args.bucket or not args.prefix:
+                self.parser.error("compact s3 requires --bucket and --prefix")
+            sink = S3Sink(args.bucket, args.prefix, args.output_format, compaction=compaction,
+                          compression=args.compression, compression_level=args.compression_level)
+        print(json.dumps(sink.compact()))
+
+    def bench(self, args):
+        # The harness ships with a checkout of the repository, it is not part of the installed package
+        try:
+            from benchmarks import suite
+        except ImportError:
+            self.parser.error("bench needs a checkout of the mini-firehose repository")
+        code = suite.main(args.bench_args, prog="mini-firehose bench")
+        if code:
+            sys.exit(code)
+
+    def run(self, argv=None):
+        args = self.parser.parse_args(argv)
         if hasattr(args, 'func'):
             args.func(args)
         else:
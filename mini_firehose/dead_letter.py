@@ -0,0 +1,58 @@
+import itertools
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+SPOOL_SUFFIX = ".ndjson"
+_encoder = json.JSONEncoder(separators=(",", ":"), default=str)
+
+
+# Local spool for batches a sink could not take after all retries. Each batch is one NDJSON file in
+# a directory per sink, so it can be redriven to the sink that failed it.
+class DeadLetterSpool:
+    def __init__(self, directory):
+        self.directory = directory
+        self.counter = itertools.count()
+        if not os.path.exists(self.directory): os.makedirs(self.directory)
+
+    def _sink_directory(self, sink_index):
+        return os.path.join(self.directory, f"sink-{sink_index}")
+
+    def spool(self, sink_index, records):
+        directory = self._sink_directory(sink_index)
+        if not os.path.exists(directory): os.makedirs(directory)
+        filename = f"{time.time_ns()}-{os.getpid()}-{next(self.counter)}{SPOOL_SUFFIX}"
+        path = os.path.join(directory, filename)
+        # Written under a temporary name first, so a redrive never picks up a partial file
+        with open(path + ".tmp", "w") as spool_file:
+            for record in records:
+                spool_file.write(_encoder.encode(record) + "\n")
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+        os.replace(path + ".tmp", path)
+        return path
+
+    def entries(self, sink_index=None):
+        # Returns (sink_index, path) for every spooled batch, oldest first
+        entries = []
+        sink_directories = [f"sink-{sink_index}"] if sink_index is not None else os.listdir(self.directory)
+        for sink_directory in sink_directories:
+            directory = os.path.join(self.directory, sink_directory)
+            if not sink_directory.startswith("sink-") or not os.path.isdir(directory):
+                continue
+            index = int(sink_directory[len("sink-"):])
+            entries.extend((index, os.path.join(directory, name)) for name in os.listdir(directory)
+                           if name.endswith(SPOOL_SUFFIX))
+        return sorted(entries, key=lambda entry: os.path.basename(entry[1]))
+
+    @staticmethod
+    def read(path):
+        with open(path) as spool_file:
+            return [json.loads(line) for line in spool_file if line.strip()]
+
+    @staticmethod
+    def remove(path):
+        os.remove(path)
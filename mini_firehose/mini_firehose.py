@@ -1,9 +1,21 @@
-import copy
+import bisect
+import itertools
 import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
 import logging
+import os
 from typing import List
+
+from common.batch import Batch
+from common.columnar_buffer import ColumnarBuffer
+from common.metrics import FirehoseMetrics, ADD_MESSAGE_SAMPLE_EVERY
+from mini_firehose.adaptive import AdaptiveFlushConfig, AdaptiveFlushController
+from mini_firehose.dead_letter import DeadLetterSpool
+from mini_firehose.retry import RetryPolicy, RetryBudget
+from mini_firehose.scheduler import FlushScheduler, default_scheduler
+from mini_firehose.size_estimator import SizeEstimator, SampledSizeEstimator
+from mini_firehose.wal import WriteAheadLog, FSYNC_POLICIES
 from sinks.local.local_sink import LocalSink
 from sinks.sink import Sink
 
@@ -11,10 +23,23 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
+BACKPRESSURE_POLICIES = ("block", "timeout", "reject")
+
+
+class BackpressureError(Exception):
+    pass
+
+
 class FirehoseConfig:
-    def __init__(self, buffer_count_limit=10, buffer_time_limit=60, buffer_size_limit_mb=1):
+    def __init__(self, buffer_count_limit=10, buffer_time_limit=60, buffer_size_limit_mb=1,
+                 max_in_flight_batches=-1, max_in_flight_mb=-1, backpressure_policy="block", backpressure_timeout=None,
+                 schema=None, size_estimator: SizeEstimator = None,
+                 wal_directory=None, wal_fsync_policy="group", wal_fsync_interval=1.0,
+                 retry_policy: RetryPolicy = None, dead_letter_directory=None, metrics=True,
+                 adaptive: AdaptiveFlushConfig = None):
         # Validation checks for buffer limits
-        if all(limit == -1 for limit in [buffer_count_limit, buffer_time_limit, buffer_size_limit_mb]):
+        if adaptive is None and all(limit == -1 for limit in [buffer_count_limit, buffer_time_limit,
+                                                               buffer_size_limit_mb]):
             raise ValueError("All buffer limits cannot be -1 at the same time.")
         if buffer_count_limit != -1 and buffer_count_limit < 10:
             raise ValueError("Buffer count limit should not be less than 10.")
@@ -22,90 +47,462 @@ class FirehoseConfig:
             raise ValueError("Buffer time limit should not be less than 60 seconds.")
         if buffer_size_limit_mb != -1 and buffer_size_limit_mb < 1:
             raise ValueError("Buffer size limit should not be less than 1 MB.")
+        if max_in_flight_batches != -1 and max_in_flight_batches < 1:
+            raise ValueError("Max in-flight batches should not be less than 1.")
+        if max_in_flight_mb != -1 and max_in_flight_mb <= 0:
+            raise ValueError("Max in-flight size should be greater than 0 MB.")
+        if backpressure_policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unsupported backpressure policy: {backpressure_policy}")
+        if backpressure_policy == "timeout" and (backpressure_timeout is None or backpressure_timeout <= 0):
+            raise ValueError("Backpressure timeout should be greater than 0 seconds for the timeout policy.")
+        if schema is not None and not schema:
+            raise ValueError("Schema should declare at least one column.")
+        if wal_fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unsupported fsync policy: {wal_fsync_policy}")
 
         self.buffer_count_limit = buffer_count_limit
         self.buffer_time_limit = buffer_time_limit
         self.buffer_size_limit_mb = buffer_size_limit_mb
+        self.max_in_flight_batches = max_in_flight_batches
+        self.max_in_flight_mb = max_in_flight_mb
+        self.backpressure_policy = backpressure_policy
+        self.backpressure_timeout = backpressure_timeout
+        # With a schema, messages are appended straight into typed column chunks instead of a list of dicts
+        self.schema = schema
+        # Defaults to a SampledSizeEstimator per firehose, the estimator keeps running averages
+        self.size_estimator = size_estimator
+        # With a WAL directory every accepted message is logged before add_message returns
+        self.wal_directory = wal_directory
+        self.wal_fsync_policy = wal_fsync_policy
+        self.wal_fsync_interval = wal_fsync_interval
+        # Used for sinks that do not define their own retry_policy, None disables retries
+        self.retry_policy = retry_policy
+        # Batches that exhaust their retries are spooled here instead of being dropped
+        self.dead_letter_directory = dead_letter_directory
+        # Counters and histograms exposed by the api under /metrics and in the stats of each firehose
+        self.metrics = metrics
+        # Tunes the count and time limits from recent flushes, buffer_count_limit is then not used while
+        # buffer_size_limit_mb and buffer_time_limit remain upper bounds
+        self.adaptive = adaptive
 
 class MiniFirehose:
-    def __init__(self, name: str, sinks: List[Sink], config: FirehoseConfig = FirehoseConfig()):
+    def __init__(self, name: str, sinks: List[Sink], config: FirehoseConfig = FirehoseConfig(),
+                 scheduler: FlushScheduler = default_scheduler):
         if not sinks:
             raise ValueError("Error! No sinks provided")
         self.name = name
         self.sinks = sinks
         self.config = config
-        self.buffer = []
+        self.buffer = self._new_buffer()
         self.buffer_count = 0
         self.buffer_size_in_mb = 0
+        self.size_estimator = config.size_estimator or SampledSizeEstimator()
         self.last_flush_time = 0
+        self.in_flight_batches = 0
+        self.in_flight_mb = 0
+        self.in_flight_condition = threading.Condition()
         self.buffer_lock = threading.Lock()
         self.running = False
         self.flushing = False
-        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.scheduler = scheduler
+        self.timer = None
+        self.timer_lock = threading.Lock()
         self.executor = ThreadPoolExecutor(max_workers=min(len(sinks), 10))  # Thread pool size limit
+        self.stopped = False
+        self.retry_policies = [sink.retry_policy or config.retry_policy for sink in sinks]
+        self.retry_budgets = [RetryBudget(policy) if policy else None for policy in self.retry_policies]
+        self.retry_tasks = {}
+        self.retry_lock = threading.Lock()
+        self.dead_letters = None
+        if config.dead_letter_directory:
+            self.dead_letters = DeadLetterSpool(os.path.join(config.dead_letter_directory, name))
+        self.wal = None
+        if config.wal_directory:
+            self.wal = WriteAheadLog(os.path.join(config.wal_directory, name), config.wal_fsync_policy,
+                                     config.wal_fsync_interval)
+        self.adaptive = None
+        self.count_limit = config.buffer_count_limit
+        self.time_limit = config.buffer_time_limit
+        if config.adaptive:
+            self.adaptive = AdaptiveFlushController(config.adaptive, config.buffer_time_limit)
+            self.count_limit = self.adaptive.count_limit
+            self.time_limit = self.adaptive.time_limit
+        self.metrics = FirehoseMetrics(self) if config.metrics else None
+
+    def _new_buffer(self):
+        if self.config.schema:
+            return ColumnarBuffer(self.config.schema)
+        return []
+
+    @property
+    def queued_bytes(self):
+        return int(self.in_flight_mb * 1024 * 1024)
+
+    def _in_flight_full(self):
+        return (
+            (self.config.max_in_flight_batches != -1 and self.in_flight_batches >= self.config.max_in_flight_batches) or
+            (self.config.max_in_flight_mb != -1 and self.in_flight_mb >= self.config.max_in_flight_mb)
+        )
+
+    def _wait_for_capacity(self):
+        if not self._in_flight_full():
+            return
+        with self.in_flight_condition:
+            match self.config.backpressure_policy:
+                case "reject":
+                    if self._in_flight_full():
+                        raise BackpressureError(f"{self.name} has reached its in-flight flush limit")
+                case "timeout":
+                    if not self.in_flight_condition.wait_for(lambda: not self._in_flight_full(),
+                                                             self.config.backpressure_timeout):
+                        raise BackpressureError(f"{self.name} timed out waiting for in-flight flushes")
+                case _:
+                    self.in_flight_condition.wait_for(lambda: not self._in_flight_full())
 
     def add_message(self, message: str):
+        metrics = self.metrics
+        timed = False
+        if metrics is not None:
+            metrics.add_calls += 1
+            timed = metrics.add_calls % ADD_MESSAGE_SAMPLE_EVERY == 0
+        started = time.perf_counter() if timed else 0
+        self._wait_for_capacity()
+        size_in_mb = self.size_estimator.estimate(message) / (1024 * 1024)
+        record = self.wal.encode(message) if self.wal else None
+        batch = None
         with self.buffer_lock:
             self.buffer.append(message)
+            if self.wal:
+                self.wal.append([record])
             self.buffer_count += 1
-            self.buffer_size_in_mb += len(str(message)) / (1024 * 1024)
-            should_flush = (
-                (self.config.buffer_count_limit != -1 and self.buffer_count >= self.config.buffer_count_limit) or
-                (self.config.buffer_size_limit_mb != -1 and self.buffer_size_in_mb >= self.config.buffer_size_limit_mb)
-            )
-            if should_flush:
-                self.flush_buffer("buffer-reached")
-                self.buffer_count = 0
-                self.buffer_size_in_mb = 0
-                self.last_flush_time = time.time()
+            self.buffer_size_in_mb += size_in_mb
+            if self._should_flush():
+                batch = self._swap_buffer()
+        if self.wal:
+            self.wal.commit()
+        # Hand the full buffer to the flush stage outside the lock so producers never wait on it
+        if batch is not None:
+            self._dispatch(batch, "buffer-reached")
+        if timed:
+            metrics.add_seconds.observe(time.perf_counter() - started)
+
+    def add_messages(self, messages, chunk_size=1000) -> int:
+        # Takes the lock once per chunk instead of once per message. Returns the number of accepted
+        # messages, which is short of the input when the backpressure policy rejects or times out, or
+        # when the schema of a columnar buffer rejects a message. Messages before it stay accepted.
+        started = time.perf_counter()
+        accepted = 0
+        iterator = iter(messages)
+        while chunk := list(itertools.islice(iterator, chunk_size)):
+            try:
+                self._wait_for_capacity()
+            except BackpressureError as e:
+                logger.warning(f"{e}, accepted {accepted} messages")
+                break
+            sizes = self.size_estimator.estimate_many(chunk)
+            records = [self.wal.encode(message) for message in chunk] if self.wal else None
+            batches = []
+            rejected = None
+            try:
+                with self.buffer_lock:
+                    start = 0
+                    while start < len(chunk):
+                        end, size_in_mb = self._next_boundary(sizes, start)
+                        buffered = self.buffer_count
+                        try:
+                            accepted += self._extend_buffer(chunk[start:end], size_in_mb,
+                                                            records[start:end] if self.wal else None)
+                        except ValueError as e:
+                            accepted += self.buffer_count - buffered
+                            rejected = e
+                        if self._should_flush():
+                            batches.append(self._swap_buffer())
+                        if rejected is not None:
+                            break
+                        start = end
+            finally:
+                if self.wal:
+                    self.wal.commit()
+                for batch in batches:
+                    self._dispatch(batch, "buffer-reached")
+            if rejected is not None:
+                logger.warning(f"{self.name} rejected a message: {rejected}, accepted {accepted} messages")
+                break
+        if self.metrics is not None:
+            self.metrics.add_seconds.observe(time.perf_counter() - started)
+        return accepted
+
+    def _should_flush(self):
+        return (
+            (self.count_limit != -1 and self.buffer_count >= self.count_limit) or
+            (self.config.buffer_size_limit_mb != -1 and self.buffer_size_in_mb >= self.config.buffer_size_limit_mb)
+        )
+
+    def _next_boundary(self, sizes, start):
+        # Returns the end of the slice that fills the active buffer up to the next count or size limit,
+        # together with the size of that slice in MB. sizes are in bytes.
+        end = len(sizes)
+        if self.count_limit != -1:
+            end = min(end, start + max(self.count_limit - self.buffer_count, 1))
+        cumulative = list(itertools.accumulate(sizes[start:end]))
+        if self.config.buffer_size_limit_mb != -1:
+            room = (self.config.buffer_size_limit_mb - self.buffer_size_in_mb) * 1024 * 1024
+            index = bisect.bisect_left(cumulative, room)
+            if index < len(cumulative):
+                return start + index + 1, cumulative[index] / (1024 * 1024)
+        return end, cumulative[-1] / (1024 * 1024)
+
+    def _extend_buffer(self, messages, size_in_mb, records=None):
+        # Must be called with buffer_lock held
+        if isinstance(self.buffer, list):
+            self.buffer.extend(messages)
+        else:
+            for count, message in enumerate(messages):
+                try:
+                    self.buffer.append(message)
+                except ValueError:
+                    # Keep the counters and the WAL in line with the messages that made it into the buffer
+                    if self.wal:
+                        self.wal.append(records[:count])
+                    self.buffer_count += count
+                    self.buffer_size_in_mb += size_in_mb * count / len(messages)
+                    raise
+        if self.wal:
+            self.wal.append(records)
+        self.buffer_count += len(messages)
+        self.buffer_size_in_mb += size_in_mb
+        return len(messages)
 
     def flush_buffer(self, event=""):
-        #with self.buffer_lock:
-        if not self.buffer:
-            return
-        buffer_to_flush = copy.deepcopy(self.buffer)
-        self.buffer.clear()
+        with self.buffer_lock:
+            batch = self._swap_buffer()
+        self._dispatch(batch, event)
+
+    def _swap_buffer(self):
+        # Must be called with buffer_lock held. Replaces the active buffer with an empty one in O(1).
+        now = time.time()
+        batch = Batch(self.buffer, self.buffer_size_in_mb)
+        batch.fill_seconds = now - self.last_flush_time
+        if self.wal:
+            batch.segment = self.wal.roll()
+        self.buffer = self._new_buffer()
         self.buffer_count = 0
         self.buffer_size_in_mb = 0
+        self.last_flush_time = now
+        return batch
+
+    def _dispatch(self, batch: Batch, event=""):
+        # The swapped out list is owned by the flush tasks from here on and is shared by every sink
+        # without copying. Messages must not be mutated by the caller once add_message has accepted them.
+        if not batch:
+            return
+        batch.event = event
+        batch.dispatched_at = time.perf_counter()
+        batch.expect(len(self.sinks))
+        if self.metrics is not None:
+            self.metrics.flushed(event, len(batch))
+        with self.in_flight_condition:
+            self.in_flight_batches += 1
+            self.in_flight_mb += batch.size_mb
 
         self.flushing = True
-        logger.info(f"Flushing messages: {event}, count: {len(buffer_to_flush)}")
-        for sink in self.sinks:
-            self.executor.submit(self._flush_buffer_task, buffer_to_flush, sink)
+        logger.info(f"Flushing messages: {event}, count: {len(batch)}")
+        for sink_index in range(len(self.sinks)):
+            self.executor.submit(self._flush_buffer_task, batch, sink_index)
         self.flushing = False
 
-    def _flush_buffer_task(self, buffer_to_flush, sink: Sink):
+    def _flush_buffer_task(self, batch: Batch, sink_index, attempt=1):
+        started = time.perf_counter()
+        if self.wal and batch.segment is not None:
+            # On the delivery thread, the fsync is kept off the buffer_lock and the scheduler thread
+            self.wal.seal(batch.segment)
         try:
-            if buffer_to_flush:
-                sink.deliver(buffer_to_flush)
+            result = self.sinks[sink_index].deliver(batch)
+            if self.wal and batch.segment is not None:
+                self.sinks[sink_index].when_committed(result, lambda: self._committed(batch))
+            if self.metrics is not None:
+                self.metrics.delivery_seconds[sink_index].observe(time.perf_counter() - started)
+            if self.retry_budgets[sink_index]:
+                self.retry_budgets[sink_index].record_success()
         except Exception as e:
+            if self.metrics is not None:
+                self.metrics.delivery_seconds[sink_index].observe(time.perf_counter() - started)
+                self.metrics.delivery_failures[sink_index].inc()
+            if self._schedule_retry(batch, sink_index, attempt, e):
+                return
             logger.error(f"Failed to flush buffer: {e}")
+            self._dead_letter(batch, sink_index)
+        if batch.task_done():
+            self._release(batch)
+
+    def _schedule_retry(self, batch: Batch, sink_index, attempt, error):
+        # Backoff waits on the shared scheduler, so a failing sink never holds an executor thread
+        # that other sinks or new flushes need
+        policy = self.retry_policies[sink_index]
+        if policy is None or attempt >= policy.max_attempts:
+            return False
+        with self.retry_lock:
+            if self.stopped or not self.retry_budgets[sink_index].try_acquire():
+                return False
+            delay = policy.delay(attempt)
+            key = (id(batch), sink_index)
+            self.retry_tasks[key] = (self.scheduler.schedule(delay, lambda: self._submit_retry(key)),
+                                     batch, sink_index, attempt + 1)
+        logger.warning(f"Delivery to sink {sink_index} failed on attempt {attempt}, retrying in {delay:.2f}s: {error}")
+        return True
+
+    def _submit_retry(self, key):
+        with self.retry_lock:
+            if key not in self.retry_tasks:
+                return
+            _, batch, sink_index, attempt = self.retry_tasks.pop(key)
+            self.executor.submit(self._flush_buffer_task, batch, sink_index, attempt)
+
+    def _dead_letter(self, batch: Batch, sink_index):
+        if self.metrics is not None:
+            self.metrics.dead_letters[sink_index].inc()
+        if self.dead_letters is None:
+            batch.failed = True
+            return
+        try:
+            path = self.dead_letters.spool(sink_index, batch.records)
+            logger.warning(f"Spooled {len(batch)} messages for sink {sink_index} to {path}")
+            self._committed(batch)
+        except Exception as e:
+            batch.failed = True
+            logger.error(f"Failed to spool dead letters for sink {sink_index}: {e}")
+
+    def redrive(self, sink_index=None):
+        # Delivers spooled batches again, synchronously, and removes the ones the sink accepted
+        if self.dead_letters is None:
+            raise ValueError("No dead letter directory configured.")
+        redriven = failed = 0
+        for index, path in self.dead_letters.entries(sink_index):
+            if index >= len(self.sinks):
+                logger.warning(f"Skipping dead letters for unknown sink {index}: {path}")
+                continue
+            try:
+                self.sinks[index].deliver(self.dead_letters.read(path))
+            except Exception as e:
+                failed += 1
+                logger.error(f"Redrive of {path} failed: {e}")
+                continue
+            self.dead_letters.remove(path)
+            redriven += 1
+        return {"redriven": redriven, "failed": failed}
+
+    def _release(self, batch: Batch):
+        with self.in_flight_condition:
+            self.in_flight_batches -= 1
+            self.in_flight_mb = max(self.in_flight_mb - batch.size_mb, 0)
+            self.in_flight_condition.notify_all()
+        if batch.dispatched_at is not None:
+            delivery_seconds = time.perf_counter() - batch.dispatched_at
+            if self.metrics is not None:
+                self.metrics.flush_seconds.observe(delivery_seconds)
+            if self.adaptive is not None and batch.fill_seconds is not None and not batch.failed:
+                self.adaptive.observe(len(batch), batch.size_mb, batch.fill_seconds, delivery_seconds)
+                self.count_limit = self.adaptive.count_limit
+                self.time_limit = self.adaptive.time_limit
+
+    def _committed(self, batch: Batch):
+        # Sinks with streaming writers may commit a batch long after delivering it, the in-flight limits do
+        # not wait for that but the write-ahead log keeps the segment until then
+        if batch.commit_done() and self.wal and batch.segment is not None:
+            self.wal.checkpoint(batch.segment)
 
-    def run(self):
-        self.running = True
-        self.last_flush_time = time.time()
-        while self.running:
-            time.sleep(1)
-            if (time.time() - self.last_flush_time) >= self.config.buffer_time_limit:
-                self.flush_buffer("time-limit")
-                self.last_flush_time = time.time()
+    def _replay(self):
+        # Re-delivers the segments a previous process logged but never got acknowledged by every sink
+        while self.wal.recovered:
+            segment_id = self.wal.recovered.pop(0)
+            records = self.wal.read_segment(segment_id)
+            if not records:
+                self.wal.checkpoint(segment_id)
+                continue
+            batch = Batch(records, sum(self.size_estimator.estimate_many(records)) / (1024 * 1024))
+            batch.segment = segment_id
+            logger.info(f"Replaying WAL segment {segment_id}, count: {len(records)}")
+            self._dispatch(batch, "wal-replay")
+
+    def stats(self):
+        stats = {
+            "buffer-count": self.buffer_count,
+            "buffer-size-in-mb": self.buffer_size_in_mb,
+            "in-flight-batches": self.in_flight_batches,
+            "queued-bytes": self.queued_bytes,
+            "pending-retries": len(self.retry_tasks)
+        }
+        if self.metrics is not None:
+            stats.update(self.metrics.stats())
+        if self.adaptive is not None:
+            stats["adaptive"] = self.adaptive.stats()
+        return stats
+
+    def _start_sinks(self):
+        for sink in self.sinks:
+            sink.start()
+
+    def _stop_sinks(self):
+        for sink in self.sinks:
+            sink.stop()
+
+    def _schedule_time_flush(self, delay):
+        self.timer = self.scheduler.schedule(delay, self._on_time_limit)
+
+    def _on_time_limit(self):
+        # Runs on the shared scheduler thread. Size or count flushes move last_flush_time forward,
+        # so the deadline is re-evaluated here instead of flushing on a stale one.
+        with self.timer_lock:
+            if not self.running:
+                return
+            remaining = self.last_flush_time + self.time_limit - time.time()
+            if remaining <= 0:
+                if self.buffer_count:
+                    self.flush_buffer("time-limit")
+                else:
+                    # Nothing to flush, an adaptive time limit may be short and would roll empty WAL segments
+                    self.last_flush_time = time.time()
+                remaining = self.time_limit
+            self._schedule_time_flush(remaining)
 
     def start(self):
-        if self.config.buffer_time_limit != -1 and not self.running:
-            self.thread.start()
+        with self.timer_lock:
+            if self.running:
+                return
+            self.running = True
+            self._start_sinks()
+            if self.metrics is not None:
+                self.metrics.register_gauges()
+            if self.wal:
+                self._replay()
+            self.last_flush_time = time.time()
+            if self.time_limit != -1:
+                self._schedule_time_flush(self.time_limit)
 
     def stop(self):
-        if self.running:
+        with self.timer_lock:
             self.running = False
-            self.thread.join(timeout=10)
-            if self.thread.is_alive():
-                logger.warning("Firehose thread did not terminate as expected.")
+            if self.timer is not None:
+                self.scheduler.cancel(self.timer)
+                self.timer = None
+
+        # Pending retries get one last attempt now instead of waiting out their backoff
+        with self.retry_lock:
+            self.stopped = True
+            for key, (task, batch, sink_index, attempt) in list(self.retry_tasks.items()):
+                self.scheduler.cancel(task)
+                del self.retry_tasks[key]
+                self.executor.submit(self._flush_buffer_task, batch, sink_index, attempt)
 
         self.flush_buffer("final-flush")  # Final flush before shutting down
         self.executor.shutdown(wait=True)
+        self._stop_sinks()
+        if self.wal:
+            self.wal.close()
+        if self.metrics is not None:
+            self.metrics.remove_gauges()
         logger.info(f"{self.name} MiniFirehose stopped.")
 
-
 if __name__ == "__main__":
     def my_callback(df):
         return df
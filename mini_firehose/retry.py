@@ -0,0 +1,41 @@
+import random
+import threading
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=30, budget_ratio=0.1, budget_reserve=10):
+        if max_attempts < 1:
+            raise ValueError("Max attempts should not be less than 1.")
+        if base_delay <= 0 or max_delay < base_delay:
+            raise ValueError("Retry delays should be positive and max delay should not be less than base delay.")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Each successful delivery earns budget_ratio retries, on top of a reserve of budget_reserve
+        self.budget_ratio = budget_ratio
+        self.budget_reserve = budget_reserve
+
+    def delay(self, attempt):
+        # Full jitter: a random delay up to the exponential backoff for this attempt
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+# Caps retries to a fraction of successful deliveries, so a sink that keeps failing does not turn
+# every flush into max_attempts deliveries. Kept per sink.
+class RetryBudget:
+    def __init__(self, policy: RetryPolicy):
+        self.ratio = policy.budget_ratio
+        self.capacity = policy.budget_reserve
+        self.tokens = float(policy.budget_reserve)
+        self.lock = threading.Lock()
+
+    def record_success(self):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def try_acquire(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledTask:
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+# Heap based timer shared by any number of firehoses. A single daemon thread sleeps until the
+# earliest deadline and runs its callback there, so callbacks must be short and must not block.
+class FlushScheduler:
+    def __init__(self, name="mini-firehose-scheduler"):
+        self.name = name
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, delay, callback) -> ScheduledTask:
+        return self.schedule_at(time.monotonic() + max(delay, 0), callback)
+
+    def schedule_at(self, deadline, callback) -> ScheduledTask:
+        task = ScheduledTask(deadline, callback)
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._counter), task))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            # Only wake the thread if the new task is now the earliest one
+            if self._heap[0][2] is task:
+                self._condition.notify()
+        return task
+
+    def cancel(self, task: ScheduledTask):
+        task.cancel()
+        with self._condition:
+            if self._heap and self._heap[0][2] is task:
+                self._condition.notify()
+
+    def pending(self):
+        with self._condition:
+            return sum(1 for _, _, task in self._heap if not task.cancelled)
+
+    def _next_due_task(self):
+        with self._condition:
+            while True:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                deadline, _, task = self._heap[0]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    heapq.heappop(self._heap)
+                    return task
+                self._condition.wait(remaining)
+
+    def _run(self):
+        while True:
+            task = self._next_due_task()
+            if task.cancelled:
+                continue
+            try:
+                task.callback()
+            except Exception as e:
+                logger.error(f"Scheduled task failed: {e}")
+
+
+# The FlushScheduler interface on top of an asyncio event loop, callbacks run on the loop thread through
+# loop.call_later instead of on a scheduler thread. schedule and cancel may be called from any thread.
+class LoopScheduler:
+    def __init__(self, loop):
+        self.loop = loop
+        self._tasks = set()
+
+    def schedule(self, delay, callback) -> ScheduledTask:
+        task = ScheduledTask(self.loop.time() + max(delay, 0), callback)
+        task.handle = None
+        self._tasks.add(task)
+        self.loop.call_soon_threadsafe(self._arm, task)
+        return task
+
+    def _arm(self, task):
+        if not task.cancelled:
+            task.handle = self.loop.call_at(task.deadline, self._run, task)
+
+    def _run(self, task):
+        self._tasks.discard(task)
+        if task.cancelled:
+            return
+        try:
+            task.callback()
+        except Exception as e:
+            logger.error(f"Scheduled task failed: {e}")
+
+    def cancel(self, task: ScheduledTask):
+        task.cancel()
+        self._tasks.discard(task)
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._disarm, task)
+
+    @staticmethod
+    def _disarm(task):
+        if task.handle is not None:
+            task.handle.cancel()
+
+    def pending(self):
+        return sum(1 for task in list(self._tasks) if not task.cancelled)
+
+
+default_scheduler = FlushScheduler()
@@ -0,0 +1,173 @@
+import itertools
+import logging
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from common.frame_encoder import warm_up
+from mini_firehose.mini_firehose import MiniFirehose, FirehoseConfig
+from mini_firehose.scheduler import FlushScheduler, default_scheduler
+from sinks.sink import Sink
+
+logger = logging.getLogger(__name__)
+
+SHARD_STRATEGIES = ("round-robin", "hash")
+
+
+class Shard(MiniFirehose):
+    # The sinks are shared by every shard, the sharded firehose starts and stops them once
+    def _start_sinks(self):
+        pass
+
+    def _stop_sinks(self):
+        pass
+
+
+# Spreads messages over several MiniFirehoses, each with its own buffer, lock, flush triggers and delivery
+# threads, so producers on different threads do not serialize on one buffer lock. Buffer limits, backpressure
+# limits, the write-ahead log and dead letters apply per shard. With encode_processes, files are encoded and
+# compressed in a process pool, so flushes use more than the one core the GIL allows.
+class ShardedMiniFirehose:
+    def __init__(self, name: str, sinks: List[Sink], config: FirehoseConfig = FirehoseConfig(), shards=4,
+                 shard_strategy="round-robin", shard_key=None, encode_processes=0,
+                 scheduler: FlushScheduler = default_scheduler):
+        if shards < 1:
+            raise ValueError("Shards should not be less than 1.")
+        if shard_strategy not in SHARD_STRATEGIES:
+            raise ValueError(f"Unsupported shard strategy: {shard_strategy}")
+        if shard_strategy == "hash" and shard_key is None:
+            raise ValueError("Hash sharding requires a shard key.")
+        if encode_processes < 0:
+            raise ValueError("Encode processes should not be less than 0.")
+        if not sinks:
+            raise ValueError("Error! No sinks provided")
+        self.name = name
+        self.sinks = sinks
+        self.config = config
+        self.shards = [Shard(f"{name}-shard-{index}", sinks, config, scheduler) for index in range(shards)]
+        self.shard_strategy = shard_strategy
+        # A field name of dict messages, or a callable returning the key of a message
+        self.shard_key = shard_key
+        self.round_robin = itertools.count()
+        self.encode_processes = encode_processes
+        self.encode_pool = None
+        self.running = False
+
+    def _key(self, message):
+        if callable(self.shard_key):
+            return self.shard_key(message)
+        return message.get(self.shard_key) if isinstance(message, dict) else message
+
+    def shard_index(self, message):
+        if self.shard_strategy == "round-robin":
+            return next(self.round_robin) % len(self.shards)
+        # crc32 instead of hash(), the same key maps to the same shard in every process
+        return zlib.crc32(str(self._key(message)).encode("utf-8")) % len(self.shards)
+
+    def add_message(self, message):
+        self.shards[self.shard_index(message)].add_message(message)
+
+    def add_messages(self, messages, chunk_size=1000) -> int:
+        # Round robin hands whole chunks to a shard. Returns the number of messages accepted before the
+        # first rejected one in input order, like MiniFirehose.add_messages.
+        accepted = 0
+        iterator = iter(messages)
+        while chunk := list(itertools.islice(iterator, chunk_size)):
+            if self.shard_strategy == "round-robin":
+                shard = self.shards[next(self.round_robin) % len(self.shards)]
+                shard_accepted = shard.add_messages(chunk, chunk_size)
+                accepted += shard_accepted
+                if shard_accepted < len(chunk):
+                    break
+                continue
+            groups = {}
+            for position, message in enumerate(chunk):
+                groups.setdefault(self.shard_index(message), []).append(position)
+            # A shard accepts a prefix of its group, so the first rejected message of the chunk is the earliest
+            # of the shards' first rejected ones. Later shards only get the messages before it, shards that
+            # were handed their group earlier may have buffered messages after it.
+            rejected = len(chunk)
+            for index, positions in groups.items():
+                positions = [position for position in positions if position < rejected]
+                if not positions:
+                    continue
+                shard_accepted = self.shards[index].add_messages([chunk[position] for position in positions],
+                                                                 chunk_size)
+                if shard_accepted < len(positions):
+                    rejected = positions[shard_accepted]
+            accepted += rejected
+            if rejected < len(chunk):
+                break
+        return accepted
+
+    def flush_buffer(self, event=""):
+        for shard in self.shards:
+            shard.flush_buffer(event)
+
+    def redrive(self, sink_index=None):
+        totals = {"redriven": 0, "failed": 0}
+        for shard in self.shards:
+            for key, count in shard.redrive(sink_index).items():
+                totals[key] += count
+        return totals
+
+    @property
+    def buffer_count(self):
+        return sum(shard.buffer_count for shard in self.shards)
+
+    @property
+    def buffer_size_in_mb(self):
+        return sum(shard.buffer_size_in_mb for shard in self.shards)
+
+    @property
+    def in_flight_batches(self):
+        return sum(shard.in_flight_batches for shard in self.shards)
+
+    @property
+    def queued_bytes(self):
+        return sum(shard.queued_bytes for shard in self.shards)
+
+    @property
+    def retry_tasks(self):
+        return {key: task for shard in self.shards for key, task in shard.retry_tasks.items()}
+
+    def stats(self):
+        return {
+            "buffer-count": self.buffer_count,
+            "buffer-size-in-mb": self.buffer_size_in_mb,
+            "in-flight-batches": self.in_flight_batches,
+            "queued-bytes": self.queued_bytes,
+            "pending-retries": len(self.retry_tasks),
+            "shards": [shard.stats() for shard in self.shards]
+        }
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        if self.encode_processes > 0:
+            # spawn, forking a process that runs the scheduler and delivery threads can deadlock the child
+            self.encode_pool = ProcessPoolExecutor(max_workers=self.encode_processes,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+            for future in [self.encode_pool.submit(warm_up) for _ in range(self.encode_processes)]:
+                future.result()
+            for sink in self.sinks:
+                sink.set_encode_pool(self.encode_pool)
+        for sink in self.sinks:
+            sink.start()
+        for shard in self.shards:
+            shard.start()
+
+    def stop(self):
+        self.running = False
+        for shard in self.shards:
+            shard.stop()
+        for sink in self.sinks:
+            sink.stop()
+        if self.encode_pool is not None:
+            for sink in self.sinks:
+                sink.set_encode_pool(None)
+            self.encode_pool.shutdown(wait=True)
+            self.encode_pool = None
+        logger.info(f"{self.name} ShardedMiniFirehose stopped.")
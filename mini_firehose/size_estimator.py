@@ -0,0 +1,77 @@
+import json
+import random
+
+
+def encode_json(message):
+    return json.dumps(message, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class SizeEstimator:
+    # Returns the number of bytes a message is expected to take in the output file
+    def estimate(self, message) -> int:
+        raise NotImplementedError("This method should be implemented by subclasses")
+
+    def estimate_many(self, messages) -> list:
+        return [self.estimate(message) for message in messages]
+
+
+class EncodedSizeEstimator(SizeEstimator):
+    # Exact size for messages that arrive already serialized as bytes or str
+    def estimate(self, message) -> int:
+        if isinstance(message, (bytes, bytearray)):
+            return len(message)
+        if isinstance(message, memoryview):
+            return message.nbytes
+        if isinstance(message, str):
+            # isascii() is O(1) in CPython, so only non-ASCII text pays for an encode
+            return len(message) if message.isascii() else len(message.encode("utf-8"))
+        return len(encode_json(message))
+
+
+class SampledSizeEstimator(EncodedSizeEstimator):
+    # Serialized messages are measured exactly. Other messages are encoded on average once per
+    # sample_every calls, and in between their size is extrapolated from the average bytes per field.
+    def __init__(self, sample_every=100, smoothing=0.1, scale=1.0, encoder=encode_json):
+        if sample_every < 1:
+            raise ValueError("Sample rate should not be less than 1.")
+        self.sample_every = sample_every
+        self.smoothing = smoothing
+        # Ratio between the output format and compact JSON, e.g. below 1 for CSV or parquet
+        self.scale = scale
+        self.encoder = encoder
+        self.bytes_per_field = None
+        self.calls = 0
+        self.next_sample = 1
+
+    def _sample(self, message, fields):
+        # One extra byte for the record delimiter
+        size = len(self.encoder(message)) + 1
+        observed = size / fields
+        if self.bytes_per_field is None:
+            self.bytes_per_field = observed
+        else:
+            self.bytes_per_field += (observed - self.bytes_per_field) * self.smoothing
+        # Randomised gaps keep the samples from aliasing with periodic patterns in the stream
+        self.next_sample += random.randint(1, 2 * self.sample_every - 1)
+        return int(size * self.scale)
+
+    def estimate(self, message) -> int:
+        if isinstance(message, (bytes, bytearray, memoryview, str)):
+            return super().estimate(message)
+        fields = len(message) if isinstance(message, (dict, list, tuple)) else 1
+        fields = fields or 1
+        self.calls += 1
+        if self.calls >= self.next_sample:
+            return self._sample(message, fields)
+        return int(self.bytes_per_field * fields * self.scale)
+
+    def estimate_many(self, messages) -> list:
+        if not all(type(message) is dict for message in messages):
+            return super().estimate_many(messages)
+        self.calls += len(messages)
+        # Take as many random samples from the batch as would have been taken message by message
+        while self.bytes_per_field is None or self.calls >= self.next_sample:
+            message = random.choice(messages)
+            self._sample(message, len(message) or 1)
+        bytes_per_field = self.bytes_per_field * self.scale
+        return [bytes_per_field * fields for fields in map(len, messages)]
@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "group", "interval")
+SEGMENT_SUFFIX = ".wal"
+# json.dumps builds a new encoder whenever it is given options, this one is reused for every record
+_encoder = json.JSONEncoder(separators=(",", ":"), default=str)
+
+
+# Append-only log of accepted messages, one segment file per buffer. A segment is rolled when its
+# buffer is swapped out, sealed before its batch is delivered and deleted once every sink has
+# acknowledged the batch, so the segments left on disk after a crash are exactly the messages that
+# still have to be delivered.
+class WriteAheadLog:
+    def __init__(self, directory, fsync_policy="group", fsync_interval=1.0):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unsupported fsync policy: {fsync_policy}")
+        if fsync_policy == "interval" and fsync_interval <= 0:
+            raise ValueError("Fsync interval should be greater than 0 seconds.")
+        self.directory = directory
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.sync_condition = threading.Condition()
+        self.syncing = False
+        self.written = 0
+        self.synced = 0
+        self.thread = None
+        self.stopped = threading.Event()
+        if not os.path.exists(self.directory): os.makedirs(self.directory)
+
+        # Segments left behind by a previous process are kept aside for replay
+        self.recovered = [segment_id for segment_id in self._segment_ids() if self._has_records(segment_id)]
+        for segment_id in set(self._segment_ids()) - set(self.recovered):
+            os.remove(self._segment_path(segment_id))
+        self.segment_id = max(self.recovered, default=0) + 1
+        self.file = open(self._segment_path(self.segment_id), "ab")
+        self.segment_records = 0
+        # Rolled segments whose files are not yet synced and closed, by segment id
+        self.sealing = {}
+        if self.fsync_policy == "interval":
+            # A slow disk must not hold up the shared flush scheduler, the interval sync has its own thread
+            self.thread = threading.Thread(target=self._run_interval, name="wal-fsync", daemon=True)
+            self.thread.start()
+
+    def _segment_path(self, segment_id):
+        return os.path.join(self.directory, f"{segment_id:020d}{SEGMENT_SUFFIX}")
+
+    def _segment_ids(self):
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+                      if name.endswith(SEGMENT_SUFFIX))
+
+    def _has_records(self, segment_id):
+        return os.path.getsize(self._segment_path(segment_id)) > 0
+
+    def read_segment(self, segment_id):
+        records = []
+        with open(self._segment_path(segment_id), "rb") as segment:
+            for line in segment:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn write at the tail of the segment, everything before it is intact
+                    logger.warning(f"Ignoring truncated record in WAL segment {segment_id}")
+                    break
+        return records
+
+    @staticmethod
+    def encode(message):
+        # Encoding is done by producers before they take the firehose buffer_lock
+        return _encoder.encode(message).encode("utf-8") + b"\n"
+
+    def append(self, records):
+        # Takes encoded records. Called with the firehose buffer_lock held, so segment contents
+        # follow buffer boundaries.
+        with self.lock:
+            self.file.write(b"".join(records))
+            self.written += len(records)
+            self.segment_records += len(records)
+
+    def commit(self):
+        # Blocks until everything appended before the call is on disk, called by producers after they
+        # released the firehose buffer_lock. With "group" concurrent producers share a single fsync: one
+        # of them syncs on behalf of every record written up to that point. With "always" every call
+        # runs its own fsync.
+        if self.fsync_policy == "interval":
+            return
+        target = self.written
+        with self.sync_condition:
+            if self.fsync_policy == "always":
+                self.sync_condition.wait_for(lambda: not self.syncing)
+                self._sync_locked()
+                return
+            while self.synced < target:
+                if self.syncing:
+                    self.sync_condition.wait()
+                    continue
+                self._sync_locked()
+
+    def _sync_locked(self):
+        # Must be called with sync_condition held, releases it for the duration of the fsync
+        self.syncing = True
+        self.sync_condition.release()
+        try:
+            with self.lock:
+                # Records appended before a roll may still sit in a segment that is not sealed yet
+                files = list(self.sealing.values()) + [self.file]
+                for file in files:
+                    file.flush()
+                target = self.written
+                descriptors = [file.fileno() for file in files]
+            for descriptor in descriptors:
+                os.fsync(descriptor)
+        finally:
+            self.sync_condition.acquire()
+            self.syncing = False
+            self.sync_condition.notify_all()
+        self.synced = max(self.synced, target)
+
+    def _run_interval(self):
+        while not self.stopped.wait(self.fsync_interval):
+            with self.sync_condition:
+                if not self.syncing and self.synced < self.written:
+                    self._sync_locked()
+
+    def roll(self):
+        # Starts a new segment and returns the id of the previous one, or None if it was empty.
+        # Called with the firehose buffer_lock held, so it only swaps the file, seal() syncs it.
+        with self.lock:
+            if self.segment_records == 0:
+                return None
+            rolled = self.segment_id
+            self.sealing[rolled] = self.file
+            self.segment_id += 1
+            self.file = open(self._segment_path(self.segment_id), "ab")
+            self.segment_records = 0
+        return rolled
+
+    def seal(self, segment_id):
+        # Syncs and closes a rolled segment, a no-op for segments that are already sealed. Commits
+        # wait for it like for any other fsync, their records may be in this segment.
+        with self.sync_condition:
+            self.sync_condition.wait_for(lambda: not self.syncing)
+            with self.lock:
+                file = self.sealing.pop(segment_id, None)
+            if file is None:
+                return
+            self.syncing = True
+            self.sync_condition.release()
+            try:
+                file.flush()
+                os.fsync(file.fileno())
+                file.close()
+            finally:
+                self.sync_condition.acquire()
+                self.syncing = False
+                self.sync_condition.notify_all()
+
+    def checkpoint(self, segment_id):
+        # Every sink acknowledged the segment's batch, it no longer needs to be replayed
+        with self.lock:
+            file = self.sealing.pop(segment_id, None)
+        if file is not None:
+            file.close()
+        try:
+            os.remove(self._segment_path(segment_id))
+        except FileNotFoundError:
+            pass
+        if segment_id in self.recovered:
+            self.recovered.remove(segment_id)
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.sync_condition:
+            self.sync_condition.wait_for(lambda: not self.syncing)
+            with self.lock:
+                if self.file.closed:
+                    return
+                for file in self.sealing.values():
+                    file.flush()
+                    os.fsync(file.fileno())
+                    file.close()
+                self.sealing.clear()
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+                self.synced = self.written
+                if self.segment_records == 0:
+                    os.remove(self._segment_path(self.segment_id))
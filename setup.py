@@ -8,6 +8,7 @@
 ######################################
 # pip install .         # Install dependencies mentioned in install_requires
 # pip install .[test]   # Install dependencies mentioned in extras_require[test]
+# pip install .[fast]   # Faster JSON encoding with orjson
 
 from setuptools import setup, find_packages
 
@@ -24,7 +25,7 @@ setup(
     long_description=open('README.md').read(),
     long_description_content_type='text/markdown',
     url="https://github.com/waqar-ahmed/mini-firehose",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*", "tests", "tests.*"]),
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -33,7 +34,8 @@ setup(
     python_requires='>=3.10',
     install_requires=install_requires,
     extras_require={
-        'test': test_requires
+        'test': test_requires,
+        'fast': ['orjson']
     },
     entry_points={
          "console_scripts": [
@@ -0,0 +1,197 @@
+import io
+import itertools
+import json
+import logging
+import threading
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PREFIX = "_compaction-"
+MANIFEST_SUFFIX = ".json"
+
+
+class CompactionConfig:
+    def __init__(self, target_file_mb=128, min_file_age=300, interval=600, max_mb_per_sec=-1):
+        if target_file_mb <= 0:
+            raise ValueError("Target file size should be greater than 0.")
+        if min_file_age < 0:
+            raise ValueError("Min file age should not be less than 0.")
+        if interval != -1 and interval <= 0:
+            raise ValueError("Compaction interval should be greater than 0, or -1 for manual compaction only.")
+        if max_mb_per_sec != -1 and max_mb_per_sec <= 0:
+            raise ValueError("Max MB per second should be greater than 0, or -1 for no limit.")
+        # Files are merged until the output reaches this size, files already this large are left alone
+        self.target_file_mb = target_file_mb
+        # Younger files may still be written to, they are only compacted once they are this old (seconds)
+        self.min_file_age = min_file_age
+        # Seconds between background runs, -1 only compacts when asked to
+        self.interval = interval
+        # Caps the bytes read plus written by compaction, -1 is unbounded
+        self.max_mb_per_sec = max_mb_per_sec
+
+
+class RateLimiter:
+    def __init__(self, bytes_per_sec):
+        self.bytes_per_sec = bytes_per_sec
+        self.started = time.monotonic()
+        self.consumed = 0
+
+    def consume(self, size):
+        if self.bytes_per_sec is None:
+            return
+        self.consumed += size
+        ahead = self.consumed / self.bytes_per_sec - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+# Merges the small files of every partition of a handler into files of about target_file_mb. CSV and JSON
+# files are merged as bytes, so values come out exactly as they were written. Parquet files are merged
+# through a DataFrame, their column types are kept by the file. A merge is made safe against crashes with
+# a manifest next to the files: it names the output and its inputs and is written before the output. A
+# manifest that is found later means the inputs of a finished output still have to be removed, or, when
+# the output is missing, that the merge never happened.
+class Compactor:
+    def __init__(self, handler, config: CompactionConfig):
+        self.handler = handler
+        self.config = config
+        self.thread = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.config.interval == -1 or self.thread is not None:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="compactor", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while not self.stopped.wait(self.config.interval):
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Compaction failed: {e}")
+
+    def compact(self):
+        with self.lock:
+            limit = self.config.max_mb_per_sec
+            limiter = RateLimiter(limit * 1024 * 1024 if limit != -1 else None)
+            stats = {"partitions": 0, "files-compacted": 0, "files-written": 0, "bytes-compacted": 0}
+            for directory, files in self._partitions().items():
+                manifests = [path for path, _, _ in files if self.handler._basename(path).startswith(MANIFEST_PREFIX)]
+                if manifests:
+                    # The listing is stale once an interrupted merge is finished, the partition waits for the next run
+                    for manifest in manifests:
+                        self._recover(manifest)
+                    continue
+                groups = self._plan([f for f in files if not self.handler._basename(f[0]).startswith(("_", "."))])
+                if groups:
+                    stats["partitions"] += 1
+                for group in groups:
+                    if self.stopped.is_set():
+                        return stats
+                    for merged in self._merge(directory, group, limiter):
+                        stats["files-compacted"] += len(merged)
+                        stats["files-written"] += 1
+                        stats["bytes-compacted"] += sum(size for _, size, _ in merged)
+            return stats
+
+    def _partitions(self):
+        partitions = {}
+        suffix = "." + self.handler.file_extension
+        for path, size, modified in self.handler._list_files():
+            name = self.handler._basename(path)
+            if name.endswith(suffix) or (name.startswith(MANIFEST_PREFIX) and name.endswith(MANIFEST_SUFFIX)):
+                partitions.setdefault(self.handler._dirname(path), []).append((path, size, modified))
+        return partitions
+
+    def _plan(self, files):
+        # Oldest first, so the rows keep their order, greedily packed up to the target size
+        target = self.config.target_file_mb * 1024 * 1024
+        newest = time.time() - self.config.min_file_age
+        candidates = sorted((f for f in files if f[1] < target and f[2] <= newest),
+                            key=lambda f: self.handler._basename(f[0]))
+        groups, group, group_size = [], [], 0
+        for f in candidates:
+            if group and group_size + f[1] > target:
+                groups.append(group)
+                group, group_size = [], 0
+            group.append(f)
+            group_size += f[1]
+        groups.append(group)
+        return [group for group in groups if len(group) > 1]
+
+    def _merge(self, directory, group, limiter):
+        # Yields the files of each merged output
+        contents = []
+        for path, size, _ in group:
+            contents.append(self._read_input(path))
+            limiter.consume(size)
+        if self.handler.file_type == "csv":
+            # Files with different columns cannot share a header, each run of equal headers gets its own output
+            runs = [list(run) for _, run in itertools.groupby(zip(group, contents), key=lambda item: item[1][0])]
+        else:
+            runs = [list(zip(group, contents))]
+        for run in runs:
+            if len(run) < 2:
+                continue
+            files = [f for f, _ in run]
+            self._commit(directory, files, [content for _, content in run])
+            limiter.consume(sum(size for _, size, _ in files))
+            yield files
+
+    def _read_input(self, path):
+        if self.handler.file_type == "parquet":
+            return self.handler._read_data(path)
+        data = self.handler._read_bytes(path)
+        if self.handler.compression.compresses_text:
+            data = self.handler.compression.open_input(io.BytesIO(data)).read()
+        if data and not data.endswith(b"\n"):
+            data += b"\n"
+        if self.handler.file_type == "csv":
+            header, _, rows = data.partition(b"\n")
+            return header, rows
+        return data
+
+    def _chunks(self, contents):
+        if self.handler.file_type == "csv":
+            yield contents[0][0] + b"\n"
+            for _, rows in contents:
+                yield rows
+        else:
+            yield from contents
+
+    def _commit(self, directory, group, contents):
+        inputs = [path for path, _, _ in group]
+        output = self.handler._join(directory, self.handler.filename_generator.generate("unique"))
+        manifest = self.handler._join(directory, f"{MANIFEST_PREFIX}{time.time_ns()}{MANIFEST_SUFFIX}")
+        self.handler._write_bytes(manifest, json.dumps({"output": output, "inputs": inputs}).encode())
+        if self.handler.file_type == "parquet":
+            self.handler._write_committed(pd.concat(contents, ignore_index=True), output)
+        else:
+            self.handler._write_committed_encoded(self._chunks(contents), output)
+        self.handler._remove_files(inputs)
+        self.handler._remove_files([manifest])
+        logger.info(f"Compacted {len(inputs)} files into {output}")
+
+    def _recover(self, manifest):
+        try:
+            entry = json.loads(self.handler._read_bytes(manifest))
+        except ValueError:
+            # A torn manifest was written before its output, so nothing was merged yet
+            self.handler._remove_files([manifest])
+            return
+        if self.handler._exists(entry["output"]):
+            self.handler._remove_files([path for path in entry["inputs"] if self.handler._exists(path)])
+            logger.info(f"Finished interrupted compaction into {entry['output']}")
+        self.handler._remove_files([manifest])
@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from common.record_encoder import encode_csv, encode_ndjson, record_columns
+
+logger = logging.getLogger(__name__)
+
+IN_PROGRESS_SUFFIX = ".inprogress"
+
+
+class StreamingWriterConfig:
+    def __init__(self, roll_size_mb=128, roll_interval=300, max_open_files=256):
+        if roll_size_mb <= 0:
+            raise ValueError("Roll size should be greater than 0.")
+        if roll_interval <= 0:
+            raise ValueError("Roll interval should be greater than 0.")
+        if max_open_files < 1:
+            raise ValueError("Max open files should not be less than 1.")
+        # A file is committed and a new one started once it is this large, or this many seconds old
+        self.roll_size_mb = roll_size_mb
+        self.roll_interval = roll_interval
+        # Least recently written partitions have their file committed first when more are open
+        self.max_open_files = max_open_files
+
+
+class SchemaChanged(Exception):
+    pass
+
+
+# A file that stays open across flushes and gets every flush of its partition appended. It is written
+# under a hidden name and only synced and renamed to its final name by close(), so readers and
+# compaction never see a file that is still growing. Flushes appended to it are only durable from then on.
+class Appender:
+    def __init__(self, path, compression=None, exclude=None):
+        self.path = path
+        # A compressed csv or json file gets one compressed frame per flush
+        self.compression = compression
+        # Keys of appended records that are not written, the partition columns
+        self.exclude = exclude
+        self.temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}{IN_PROGRESS_SUFFIX}")
+        self.opened_at = time.monotonic()
+        self.rows = 0
+        self.size = 0
+        self.closed = False
+        self.committed = False
+        # Called with self.lock held once the file is committed
+        self.commit_callbacks = []
+        self.lock = threading.Lock()
+        self.file = open(self.temp_path, "wb")
+
+    def append(self, df):
+        # df is a DataFrame, or a list of dict records for csv and json
+        self._append(df)
+        self.rows += len(df)
+        self.file.flush()
+        self.size = self.file.tell()
+
+    def _append(self, df):
+        raise NotImplementedError("This method should be implemented by subclasses")
+
+    def _write_encoded(self, data):
+        self.file.write(self.compression.compress(data) if self.compression is not None else data)
+
+    def age(self):
+        return time.monotonic() - self.opened_at
+
+    def when_committed(self, callback):
+        # A file that failed to commit never calls back, the data it held is not durable
+        with self.lock:
+            if not self.committed:
+                if not self.closed:
+                    self.commit_callbacks.append(callback)
+                return
+        callback()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._close()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        if self.rows > 0:
+            os.replace(self.temp_path, self.path)
+        else:
+            os.remove(self.temp_path)
+        self.committed = True
+        for callback in self.commit_callbacks:
+            callback()
+        self.commit_callbacks = []
+
+    def _close(self):
+        pass
+
+
+class CSVAppender(Appender):
+    def __init__(self, path, compression=None, exclude=None):
+        super().__init__(path, compression, exclude)
+        self.columns = None
+
+    def _append(self, df):
+        # The header is written once per file, later flushes must have the same columns
+        columns = record_columns(df, self.exclude) if isinstance(df, list) else list(df.columns)
+        if self.columns is None:
+            self.columns = columns
+        elif columns != self.columns:
+            raise SchemaChanged(f"Columns changed from {self.columns} to {columns}")
+        if isinstance(df, list):
+            self._write_encoded(encode_csv(df, columns, header=self.rows == 0))
+        else:
+            self._write_encoded(df.to_csv(index=False, header=self.rows == 0).encode("utf-8"))
+
+
+class NDJSONAppender(Appender):
+    def _append(self, df):
+        if isinstance(df, list):
+            self._write_encoded(encode_ndjson(df, self.exclude))
+        else:
+            self._write_encoded(df.to_json(index=False, orient='records', lines=True).encode("utf-8"))
+
+
+class ParquetAppender(Appender):
+    def __init__(self, path, compression=None):
+        super().__init__(path, compression)
+        self.writer = None
+
+    def _append(self, df):
+        # Each flush becomes a row group of the same file
+        if self.writer is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            options = self.compression.parquet_options() if self.compression is not None else {}
+            self.writer = pq.ParquetWriter(self.file, table.schema, **options)
+        else:
+            if set(df.columns) != set(self.writer.schema.names):
+                raise SchemaChanged(f"Columns changed from {self.writer.schema.names} to {list(df.columns)}")
+            try:
+                table = pa.Table.from_pandas(df, schema=self.writer.schema, preserve_index=False)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                raise SchemaChanged(str(e))
+        self.writer.write_table(table)
+
+    def _close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def recover(temp_path, path, file_type, compression):
+    # Commits a file a crashed process left open, returns True if it was committed. CSV and JSON files
+    # hold every flush appended up to the crash and a torn line at their end is cut off. A Parquet file
+    # has no footer before close(), it is removed like a compressed file with a torn frame.
+    if file_type == "parquet":
+        logger.warning(f"Removing {temp_path}, a Parquet file left open is not readable")
+        os.remove(temp_path)
+        return False
+    if compression.compresses_text:
+        try:
+            readable = len(compression.open_input(temp_path).getvalue()) > 0
+        except (OSError, ValueError) as e:
+            logger.warning(f"Removing {temp_path}, it cannot be decompressed: {e}")
+            readable = False
+    else:
+        with open(temp_path, "r+b") as f:
+            data = f.read()
+            data = data[:data.rfind(b"\n") + 1]
+            f.truncate(len(data))
+        # A CSV file needs a row after its header
+        readable = data.count(b"\n") > (1 if file_type == "csv" else 0)
+    if not readable:
+        os.remove(temp_path)
+        return False
+    os.replace(temp_path, path)
+    return True
@@ -1,12 +1,36 @@
+import pandas as pd
+
+from common.handler import DEFAULT_PARTITION_WORKERS
+from common.record_encoder import encode_csv, record_columns
+from sinks.local.appenders import CSVAppender, StreamingWriterConfig
 from sinks.local.handlers.local_handler import LocalHandler
 
 
 class LocalCSVHandler(LocalHandler):
-    def __init__(self, directory, partition_cols=None, filename_based_on='datetime'):
-        super().__init__(directory, 'csv', partition_cols, filename_based_on)
+    encodes_records = True
+
+    def __init__(self, directory, partition_cols=None, filename_based_on='unique',
+                 partition_workers=DEFAULT_PARTITION_WORKERS, streaming_writers: StreamingWriterConfig = None,
+                 compression=None, compression_level=None):
+        super().__init__(directory, 'csv', partition_cols, filename_based_on, partition_workers,
+                         streaming_writers, compression, compression_level)
 
     def _write_data(self, df, file_path):
-        df.to_csv(file_path, index=False)
+        if isinstance(df, list):
+            columns = record_columns(df, self.partition_cols)
+            self._write_encoded((encode_csv(chunk, columns, header=start == 0) for start, chunk in self._chunks(df)),
+                                file_path)
+        elif not self.compression.compresses_text:
+            df.to_csv(file_path, index=False)
+        else:
+            self._write_encoded((chunk.to_csv(index=False, header=start == 0).encode("utf-8")
+                                 for start, chunk in self._chunks(df)), file_path)
+
+    def _read_data(self, file_path):
+        return pd.read_csv(self._open_data(file_path))
+
+    def _new_appender(self, path):
+        return CSVAppender(path, self.compression, self.partition_cols)
 
 
 if __name__ == "__main__":
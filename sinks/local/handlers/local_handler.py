@@ -1,14 +1,40 @@
+import logging
 import os
-from common.handler import Handler
+import threading
+import time
+from collections import OrderedDict
+
+from common.handler import Handler, PartitionWriteResult, DEFAULT_PARTITION_WORKERS
+from common.metrics import BYTES_WRITTEN
+from mini_firehose.scheduler import default_scheduler
+from sinks.local.appenders import StreamingWriterConfig, SchemaChanged, IN_PROGRESS_SUFFIX, recover
+
+logger = logging.getLogger(__name__)
+
+LOCAL_BYTES_WRITTEN = BYTES_WRITTEN.labels("local")
 
 
 class LocalHandler(Handler):
-    def __init__(self, directory, file_type, partition_cols=None, filename_based_on='datetime'):
-        super().__init__(file_type, filename_based_on)
+    # Number of partition directories remembered as created, least recently used ones are forgotten first
+    directory_cache_size = 10000
+
+    def __init__(self, directory, file_type, partition_cols=None, filename_based_on='unique',
+                 partition_workers=DEFAULT_PARTITION_WORKERS, streaming_writers: StreamingWriterConfig = None,
+                 compression=None, compression_level=None):
+        super().__init__(file_type, filename_based_on, partition_workers, compression, compression_level)
         self.directory = directory
         self.partition_cols = partition_cols
         self.has_partitions = partition_cols is not None and len(partition_cols) > 0
         if not os.path.exists(self.directory): os.makedirs(self.directory)
+        self.known_directories = OrderedDict()
+        self.directory_lock = threading.Lock()
+        # With streaming writers every partition directory keeps one open file that flushes are appended to
+        self.streaming_writers = streaming_writers
+        self.appenders = OrderedDict()
+        # Every open file by its final path, including rolled files whose commit failed
+        self.uncommitted = {}
+        self.appender_lock = threading.Lock()
+        self.roll_task = None
 
     def _get_directory(self):
         return self.directory
@@ -18,24 +44,275 @@ class LocalHandler(Handler):
             filename = self._generate_filename()
         return os.path.join(self.directory, filename)
 
-    def get_partition_path(self, group_name):
+    def _partition_directory(self, group_name):
         if not isinstance(group_name, tuple):
             group_name = (group_name,)
         folder_parts = [self.directory] + [f"{col}={val}" for col, val in zip(self.partition_cols, group_name)]
-        partition_path = os.path.join(*folder_parts)
-        if not os.path.exists(partition_path): os.makedirs(partition_path)
+        return os.path.join(*folder_parts)
+
+    def _is_known_directory(self, directory):
+        with self.directory_lock:
+            if directory not in self.known_directories:
+                return False
+            self.known_directories.move_to_end(directory)
+            return True
+
+    def _create_directory(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        with self.directory_lock:
+            self.known_directories[directory] = True
+            if len(self.known_directories) > self.directory_cache_size:
+                self.known_directories.popitem(last=False)
+
+    def get_partition_path(self, group_name):
+        partition_path = self._partition_directory(group_name)
+        if not self._is_known_directory(partition_path): self._create_directory(partition_path)
         return os.path.join(partition_path, self._generate_filename())
 
-    # It is abstract method
-    def _write_data(self, df, file_path):
-        raise NotImplementedError("This method should be implemented by subclasses")
+    def get_partition_paths(self, group_names):
+        # Directories that are not known yet are created together before any partition is written,
+        # known ones cost no syscall at all. The files of one flush share a filename.
+        directories = [self._partition_directory(group_name) for group_name in group_names]
+        missing = []
+        with self.directory_lock:
+            for directory in dict.fromkeys(directories):
+                if directory in self.known_directories:
+                    self.known_directories.move_to_end(directory)
+                else:
+                    missing.append(directory)
+        for directory in missing:
+            self._create_directory(directory)
+        filename = self._generate_filename()
+        return [os.path.join(directory, filename) for directory in directories]
+
+    def _partition_failed(self, path):
+        # The directory may have been removed underneath us, check it again on the next write
+        with self.directory_lock:
+            self.known_directories.pop(os.path.dirname(path), None)
 
     def write(self, df, filename=None):
-        if self.has_partitions:
-            for group_name, group_data in df.groupby(self.partition_cols):
-                group_data = group_data.drop(columns=self.partition_cols)
-                partition_file_path = self.get_partition_path(group_name)
-                self._write_data(group_data, partition_file_path)
-        else:
-            file_path = self.get_file_path(filename)
-            self._write_data(df, file_path)
\ No newline at end of file
+        if self.streaming_writers is not None and not self.has_partitions and not filename:
+            return [PartitionWriteResult(None, self._append(self.directory, df), len(df))]
+        return super().write(df, filename)
+
+    def _write_file(self, data, path):
+        super()._write_file(data, path)
+        try:
+            LOCAL_BYTES_WRITTEN.inc(os.path.getsize(path))
+        except OSError:
+            # Already moved away, e.g. by a compaction that picked it up
+            pass
+
+    def _write_partition_file(self, data, path):
+        if self.streaming_writers is None:
+            return super()._write_partition_file(data, path)
+        return self._append(os.path.dirname(path), data)
+
+    def _new_appender(self, path):
+        raise NotImplementedError("This method should be implemented by subclasses")
+
+    def _append(self, directory, df):
+        started = time.perf_counter()
+        while True:
+            appender = self._get_appender(directory)
+            with appender.lock:
+                # Closed in the meantime because it rolled or too many files were open, take the next one
+                if appender.closed:
+                    continue
+                size = appender.size
+                try:
+                    appender.append(df)
+                except SchemaChanged as e:
+                    if appender.rows == 0:
+                        raise
+                    logger.info(f"Rolling {appender.path}: {e}")
+                    self._roll(directory, appender)
+                    continue
+                LOCAL_BYTES_WRITTEN.inc(appender.size - size)
+                self.file_write_seconds.observe(time.perf_counter() - started)
+                self.files_written.inc()
+                if appender.size >= self.streaming_writers.roll_size_mb * 1024 * 1024 or \
+                        appender.age() >= self.streaming_writers.roll_interval:
+                    self._roll(directory, appender)
+                return appender.path
+
+    def _get_appender(self, directory):
+        evicted = []
+        with self.appender_lock:
+            appender = self.appenders.get(directory)
+            if appender is not None:
+                self.appenders.move_to_end(directory)
+                return appender
+            if directory != self.directory and not self._is_known_directory(directory):
+                self._create_directory(directory)
+            # Files roll several times a second at high rates, only unique names cannot collide
+            appender = self._new_appender(os.path.join(directory, self.filename_generator.generate("unique")))
+            appender.commit_callbacks.append(lambda: self._forget(appender.path))
+            self.appenders[directory] = appender
+            self.uncommitted[appender.path] = appender
+            while len(self.appenders) > self.streaming_writers.max_open_files:
+                evicted.append(self.appenders.popitem(last=False)[1])
+            self._schedule_roll()
+        for old in evicted:
+            with old.lock:
+                old.close()
+        return appender
+
+    def _forget(self, path):
+        with self.appender_lock:
+            self.uncommitted.pop(path, None)
+
+    def when_committed(self, paths, callback):
+        # Calls callback once every file in paths is committed, right away if none of them is still open
+        with self.appender_lock:
+            appenders = [self.uncommitted[path] for path in set(paths) if path in self.uncommitted]
+        if not appenders:
+            callback()
+            return
+        remaining = [len(appenders)]
+        lock = threading.Lock()
+
+        def committed():
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            callback()
+
+        for appender in appenders:
+            appender.when_committed(committed)
+
+    def recover_in_progress(self):
+        # Files a crashed process still had open are committed, or removed when they hold nothing readable
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not (name.startswith(".") and name.endswith(IN_PROGRESS_SUFFIX)):
+                    continue
+                temp_path = os.path.join(root, name)
+                path = os.path.join(root, name[1:-len(IN_PROGRESS_SUFFIX)])
+                try:
+                    if recover(temp_path, path, self.file_type, self.compression):
+                        logger.info(f"Committed {path} left open by a previous process")
+                except OSError as e:
+                    logger.error(f"Failed to recover {temp_path}: {e}")
+
+    def _roll(self, directory, appender):
+        # Called with appender.lock held
+        with self.appender_lock:
+            if self.appenders.get(directory) is appender:
+                del self.appenders[directory]
+        appender.close()
+
+    def _schedule_roll(self):
+        # Called with appender_lock held
+        if self.appenders and self.roll_task is None:
+            self.roll_task = default_scheduler.schedule(self.streaming_writers.roll_interval / 2, self._roll_expired)
+
+    def _roll_expired(self):
+        # Files of partitions that stopped receiving data are committed once they reach the roll interval.
+        # Runs on the shared scheduler thread, which only finds them: rolling waits for appends in progress
+        # and syncs the file, so it runs on the partition executor.
+        with self.appender_lock:
+            self.roll_task = None
+            expired = [(directory, appender) for directory, appender in self.appenders.items()
+                       if appender.age() >= self.streaming_writers.roll_interval]
+            if not expired:
+                self._schedule_roll()
+                return
+        self._partition_pool().submit(self._roll_all, expired)
+
+    def _roll_all(self, expired):
+        for directory, appender in expired:
+            try:
+                with appender.lock:
+                    if not appender.closed:
+                        self._roll(directory, appender)
+            except Exception as e:
+                logger.error(f"Failed to roll {appender.path}: {e}")
+        with self.appender_lock:
+            self._schedule_roll()
+
+    def close_appenders(self):
+        with self.appender_lock:
+            appenders, self.appenders = list(self.appenders.values()), OrderedDict()
+            if self.roll_task is not None:
+                default_scheduler.cancel(self.roll_task)
+                self.roll_task = None
+        for appender in appenders:
+            with appender.lock:
+                appender.close()
+
+    def _write_encoded(self, chunks, file_path):
+        # chunks yields the encoded file piece by piece, each piece is compressed on its own
+        with open(file_path, "wb") as f:
+            for data in self._serialize(chunks):
+                f.write(data)
+
+    def _open_data(self, path):
+        return self.compression.open_input(path)
+
+    def _store(self, file_path, data):
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+    # Storage primitives used by compaction
+    def _list_files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    @staticmethod
+    def _basename(path):
+        return os.path.basename(path)
+
+    @staticmethod
+    def _dirname(path):
+        return os.path.dirname(path)
+
+    @staticmethod
+    def _join(directory, name):
+        return os.path.join(directory, name)
+
+    @staticmethod
+    def _exists(path):
+        return os.path.exists(path)
+
+    @staticmethod
+    def _read_bytes(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _write_bytes(self, path, data):
+        temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def _write_committed(self, df, path):
+        self._write_renamed(path, lambda temp_path: self._write_data(df, temp_path))
+
+    def _write_committed_encoded(self, chunks, path):
+        self._write_renamed(path, lambda temp_path: self._write_encoded(chunks, temp_path))
+
+    @staticmethod
+    def _write_renamed(path, write):
+        # Readers never see a partially written file, it only appears under its name once complete
+        temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path): os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            if os.path.exists(path): os.remove(path)
@@ -1,12 +1,35 @@
+import pandas as pd
+
+from common.handler import DEFAULT_PARTITION_WORKERS
+from common.record_encoder import encode_ndjson
+from sinks.local.appenders import NDJSONAppender, StreamingWriterConfig
 from sinks.local.handlers.local_handler import LocalHandler
 
 
 class LocalJsonHandler(LocalHandler):
-    def __init__(self, directory, partition_cols=None, filename_based_on='datetime'):
-        super().__init__(directory, 'json', partition_cols, filename_based_on)
+    encodes_records = True
+
+    def __init__(self, directory, partition_cols=None, filename_based_on='unique',
+                 partition_workers=DEFAULT_PARTITION_WORKERS, streaming_writers: StreamingWriterConfig = None,
+                 compression=None, compression_level=None):
+        super().__init__(directory, 'json', partition_cols, filename_based_on, partition_workers,
+                         streaming_writers, compression, compression_level)
 
     def _write_data(self, df, file_path):
-        df.to_json(file_path, index=False, orient='records', lines=True)
+        if isinstance(df, list):
+            self._write_encoded((encode_ndjson(chunk, self.partition_cols) for _, chunk in self._chunks(df)),
+                                file_path)
+        elif not self.compression.compresses_text:
+            df.to_json(file_path, index=False, orient='records', lines=True)
+        else:
+            self._write_encoded((chunk.to_json(index=False, orient='records', lines=True).encode("utf-8")
+                                 for _, chunk in self._chunks(df)), file_path)
+
+    def _read_data(self, file_path):
+        return pd.read_json(self._open_data(file_path), orient='records', lines=True)
+
+    def _new_appender(self, path):
+        return NDJSONAppender(path, self.compression, self.partition_cols)
 
 
 if __name__ == "__main__":
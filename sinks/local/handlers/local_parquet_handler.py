@@ -1,12 +1,25 @@
+import pandas as pd
+
+from common.handler import DEFAULT_PARTITION_WORKERS
+from sinks.local.appenders import ParquetAppender, StreamingWriterConfig
 from sinks.local.handlers.local_handler import LocalHandler
 
 
 class LocalParquetHandler(LocalHandler):
-    def __init__(self, directory, partition_cols=None, filename_based_on='datetime'):
-        super().__init__(directory, 'parquet', partition_cols, filename_based_on)
+    def __init__(self, directory, partition_cols=None, filename_based_on='unique',
+                 partition_workers=DEFAULT_PARTITION_WORKERS, streaming_writers: StreamingWriterConfig = None,
+                 compression=None, compression_level=None):
+        super().__init__(directory, 'parquet', partition_cols, filename_based_on, partition_workers,
+                         streaming_writers, compression, compression_level)
 
     def _write_data(self, df, file_path):
-        df.to_parquet(file_path, index=False)
+        df.to_parquet(file_path, index=False, **self.compression.parquet_options())
+
+    def _read_data(self, file_path):
+        return pd.read_parquet(file_path)
+
+    def _new_appender(self, path):
+        return ParquetAppender(path, self.compression)
 
 
 if __name__ == "__main__":
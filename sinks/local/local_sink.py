@@ -1,5 +1,6 @@
-import pandas as pd
-
+from common.handler import DEFAULT_PARTITION_WORKERS
+from sinks.compaction import Compactor, CompactionConfig
+from sinks.local.appenders import StreamingWriterConfig
 from sinks.local.handlers.local_csv_handler import LocalCSVHandler
 from sinks.local.handlers.local_json_handler import LocalJsonHandler
 from sinks.local.handlers.local_parquet_handler import LocalParquetHandler
@@ -7,9 +8,12 @@ from sinks.sink import Sink
 
 
 class LocalSink(Sink):
-    def __init__(self, directory, output_format, partition_cols=None, filename_based_on='datetime', transformation_callback=None):
+    def __init__(self, directory, output_format, partition_cols=None, filename_based_on='unique', transformation_callback=None, retry_policy=None,
+                 partition_workers=DEFAULT_PARTITION_WORKERS, compaction: CompactionConfig = None,
+                 streaming_writers: StreamingWriterConfig = None, compression=None, compression_level=None):
         self.directory = directory
         self.transformation_callback = transformation_callback
+        self.retry_policy = retry_policy
         self.handlers = {
             'csv': LocalCSVHandler,
             'parquet': LocalParquetHandler,
@@ -19,11 +23,24 @@ class LocalSink(Sink):
             raise ValueError(f"Unsupported output format: {output_format}")
 
         handler_class = self.handlers[output_format]
-        self.handler = handler_class(directory, partition_cols, filename_based_on)
+        self.handler = handler_class(directory, partition_cols, filename_based_on, partition_workers, streaming_writers,
+                                     compression, compression_level)
+        if compaction is not None:
+            self.compactor = Compactor(self.handler, compaction)
+
+    def start(self):
+        if self.handler.streaming_writers is not None:
+            self.handler.recover_in_progress()
+        super().start()
+
+    def stop(self):
+        super().stop()
+        # Commits the files streaming writers still have open
+        self.handler.close_appenders()
 
     def deliver(self, data, filename=None):
-        df = pd.DataFrame(data)
-        # If any transformation callback is available, apply it
-        if self.transformation_callback is not None:
-            df = self.transformation_callback(df)
-        self.handler.write(df, filename)
+        return self.handler.write(self._prepare_data(data), filename)
+
+    def when_committed(self, results, callback):
+        # Streaming writers keep appended data in open files until they roll
+        self.handler.when_committed([result.path for result in results], callback)
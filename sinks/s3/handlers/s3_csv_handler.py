@@ -1,9 +1,24 @@
 import pandas as pd
+from common.handler import DEFAULT_PARTITION_WORKERS
+from common.record_encoder import encode_csv, record_columns
 from sinks.s3.handlers.s3_handler import S3Handler
 
 class S3CSVHandler(S3Handler):
-    def __init__(self, bucket, prefix, partition_cols=None, filename_based_on='datetime', s3_config=None):
-        super().__init__(bucket, prefix, 'csv', partition_cols, filename_based_on, s3_config)
+    encodes_records = True
+
+    def __init__(self, bucket, prefix, partition_cols=None, filename_based_on='unique', s3_config=None, part_size_mb=8,
+                 upload_concurrency=4, partition_workers=DEFAULT_PARTITION_WORKERS, compression=None,
+                 compression_level=None):
+        super().__init__(bucket, prefix, 'csv', partition_cols, filename_based_on, s3_config, part_size_mb,
+                         upload_concurrency, partition_workers, compression, compression_level)
 
     def _write_data(self, df, file_path):
-        df.to_csv(self.s3_fs.open(file_path, mode="w"), index=False)
\ No newline at end of file
+        if isinstance(df, list):
+            columns = record_columns(df, self.partition_cols)
+            chunks = (encode_csv(chunk, columns, header=start == 0) for start, chunk in self._chunks(df))
+        else:
+            chunks = (chunk.to_csv(index=False, header=start == 0).encode("utf-8") for start, chunk in self._chunks(df))
+        self._write_encoded(chunks, file_path)
+
+    def _read_data(self, file_path):
+        return pd.read_csv(self._open_data(file_path))
@@ -1,9 +1,7 @@
-import boto3
-import pandas as pd
-import s3fs
-from botocore.exceptions import ClientError
-
-from common.handler import Handler
+from common.handler import Handler, DEFAULT_PARTITION_WORKERS
+from sinks.s3.multipart_writer import MultipartWriter, split_s3_path
+from sinks.s3.s3_client_registry import default_registry
+import io
 import logging
 
 
@@ -11,28 +9,22 @@ logger = logging.getLogger(__name__)
 
 
 class S3Handler(Handler):
-    def __init__(self, bucket, prefix, file_type, partition_cols=None, filename_based_on='datetime', s3_config=None):
-        super().__init__(file_type, filename_based_on)
+    registry = default_registry
+
+    def __init__(self, bucket, prefix, file_type, partition_cols=None, filename_based_on='unique', s3_config=None,
+                 part_size_mb=8, upload_concurrency=4, partition_workers=DEFAULT_PARTITION_WORKERS, compression=None,
+                 compression_level=None):
+        super().__init__(file_type, filename_based_on, partition_workers, compression, compression_level)
         self.bucket = "s3://" + bucket
         self.prefix = prefix
         self.partition_cols = partition_cols
         self.has_partitions = partition_cols is not None and len(partition_cols) > 0
 
-        if s3_config is not None:
-            self.s3_fs = s3fs.S3FileSystem(
-                key=s3_config["access-key"],
-                secret=s3_config["secret-key"],
-                client_kwargs={'endpoint_url': s3_config["endpoint-url"]}
-            )
-        else:
-            self.s3_fs = s3fs.S3FileSystem()
-
-        sts = boto3.client('sts')
-        try:
-            sts.get_caller_identity()
-            logger.info("Credentials are available and valid.")
-        except ClientError:
-            logger.info("Credentials are not available or valid. Initializing using config.")
+        self.s3_config = s3_config
+        self.client = self.registry.get(s3_config)
+        self.s3_fs = self.client.s3_fs
+        self.part_size_mb = part_size_mb
+        self.upload_concurrency = upload_concurrency
 
     def _get_bucket(self):
         return self.bucket
@@ -53,16 +45,67 @@ class S3Handler(Handler):
         partition_path = "/".join(folder_parts + [self._generate_filename()])
         return partition_path
 
-    # It is abstract method
-    def _write_data(self, df, file_path):
-        raise NotImplementedError("This method should be implemented by subclasses")
-
-    def write(self, df, filename=None):
-        if self.has_partitions:
-            for group_name, group_data in df.groupby(self.partition_cols):
-                group_data = group_data.drop(columns=self.partition_cols)
-                partition_file_path = self.get_partition_path(group_name)
-                self._write_data(group_data, partition_file_path)
-        else:
-            file_path = self.get_file_path(filename)
-            self._write_data(df, file_path)
\ No newline at end of file
+    def _open(self, file_path):
+        self.registry.check_credentials(self.s3_config)
+        return MultipartWriter(self.s3_fs.s3, file_path, self.part_size_mb, self.upload_concurrency,
+                               self.client.executor)
+
+    def _write_encoded(self, chunks, file_path):
+        with self._open(file_path) as writer:
+            for data in self._serialize(chunks):
+                writer.write(data)
+
+    def _store(self, file_path, data):
+        with self._open(file_path) as writer:
+            writer.write(data)
+
+    # Storage primitives used by compaction, S3 objects only become visible once completely written
+    def _list_files(self):
+        bucket, key = split_s3_path("/".join([self.bucket, self.prefix]))
+        paginator = self.s3_fs.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=key + "/"):
+            for obj in page.get("Contents", []):
+                yield f"s3://{bucket}/{obj['Key']}", obj["Size"], obj["LastModified"].timestamp()
+
+    @staticmethod
+    def _basename(path):
+        return path.rsplit("/", 1)[-1]
+
+    @staticmethod
+    def _dirname(path):
+        return path.rsplit("/", 1)[0]
+
+    @staticmethod
+    def _join(directory, name):
+        return directory + "/" + name
+
+    def _exists(self, path):
+        bucket, key = split_s3_path(path)
+        response = self.s3_fs.s3.list_objects_v2(Bucket=bucket, Prefix=key, MaxKeys=1)
+        return any(obj["Key"] == key for obj in response.get("Contents", []))
+
+    def _read_bytes(self, path):
+        bucket, key = split_s3_path(path)
+        return self.s3_fs.s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+    def _open_data(self, path):
+        return self.compression.open_input(io.BytesIO(self._read_bytes(path)))
+
+    def _write_bytes(self, path, data):
+        bucket, key = split_s3_path(path)
+        self.s3_fs.s3.put_object(Bucket=bucket, Key=key, Body=data)
+
+    def _write_committed(self, df, path):
+        self._write_data(df, path)
+
+    def _write_committed_encoded(self, chunks, path):
+        self._write_encoded(chunks, path)
+
+    def _remove_files(self, paths):
+        by_bucket = {}
+        for path in paths:
+            bucket, key = split_s3_path(path)
+            by_bucket.setdefault(bucket, []).append({"Key": key})
+        for bucket, keys in by_bucket.items():
+            for start in range(0, len(keys), 1000):
+                self.s3_fs.s3.delete_objects(Bucket=bucket, Delete={"Objects": keys[start:start + 1000]})
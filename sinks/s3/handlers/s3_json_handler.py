@@ -1,9 +1,24 @@
 import pandas as pd
+from common.handler import DEFAULT_PARTITION_WORKERS
+from common.record_encoder import encode_ndjson
 from sinks.s3.handlers.s3_handler import S3Handler
 
 class S3JsonHandler(S3Handler):
-    def __init__(self, bucket, prefix, partition_cols=None, filename_based_on='datetime', s3_config=None):
-        super().__init__(bucket, prefix, 'json', partition_cols, filename_based_on, s3_config)
+    encodes_records = True
+
+    def __init__(self, bucket, prefix, partition_cols=None, filename_based_on='unique', s3_config=None, part_size_mb=8,
+                 upload_concurrency=4, partition_workers=DEFAULT_PARTITION_WORKERS, compression=None,
+                 compression_level=None):
+        super().__init__(bucket, prefix, 'json', partition_cols, filename_based_on, s3_config, part_size_mb,
+                         upload_concurrency, partition_workers, compression, compression_level)
 
     def _write_data(self, df, file_path):
-        df.to_json(self.s3_fs.open(file_path, mode="w"), index=False, orient='records', lines=True)
\ No newline at end of file
+        if isinstance(df, list):
+            chunks = (encode_ndjson(chunk, self.partition_cols) for _, chunk in self._chunks(df))
+        else:
+            chunks = (chunk.to_json(index=False, orient='records', lines=True).encode("utf-8")
+                      for _, chunk in self._chunks(df))
+        self._write_encoded(chunks, file_path)
+
+    def _read_data(self, file_path):
+        return pd.read_json(self._open_data(file_path), orient='records', lines=True)
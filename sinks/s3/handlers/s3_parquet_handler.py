@@ -1,9 +1,30 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from common.handler import DEFAULT_PARTITION_WORKERS
 from sinks.s3.handlers.s3_handler import S3Handler
 
 class S3ParquetHandler(S3Handler):
-    def __init__(self, bucket, prefix, partition_cols=None, filename_based_on='datetime', s3_config=None):
-        super().__init__(bucket, prefix, 'parquet', partition_cols, filename_based_on, s3_config)
+    def __init__(self, bucket, prefix, partition_cols=None, filename_based_on='unique', s3_config=None, part_size_mb=8,
+                 upload_concurrency=4, partition_workers=DEFAULT_PARTITION_WORKERS, compression=None,
+                 compression_level=None):
+        super().__init__(bucket, prefix, 'parquet', partition_cols, filename_based_on, s3_config, part_size_mb,
+                         upload_concurrency, partition_workers, compression, compression_level)
 
     def _write_data(self, df, file_path):
-        df.to_parquet(self.s3_fs.open(file_path, mode="w"), index=False)
\ No newline at end of file
+        # Each chunk becomes a row group, all of them share the schema of the first one
+        with self._open(file_path) as writer:
+            parquet_writer = None
+            try:
+                for _, chunk in self._chunks(df):
+                    table = pa.Table.from_pandas(chunk, schema=parquet_writer.schema if parquet_writer else None,
+                                                 preserve_index=False)
+                    if parquet_writer is None:
+                        parquet_writer = pq.ParquetWriter(writer, table.schema, **self.compression.parquet_options())
+                    parquet_writer.write_table(table)
+            finally:
+                if parquet_writer is not None:
+                    parquet_writer.close()
+
+    def _read_data(self, file_path):
+        return pd.read_parquet(self._open_data(file_path))
@@ -0,0 +1,137 @@
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from common.metrics import BYTES_WRITTEN, S3_PART_SECONDS
+
+logger = logging.getLogger(__name__)
+
+S3_BYTES_WRITTEN = BYTES_WRITTEN.labels("s3")
+S3_PART_UPLOADS = S3_PART_SECONDS.labels()
+
+MIN_PART_SIZE_MB = 5
+
+
+def split_s3_path(path):
+    bucket, _, key = path.removeprefix("s3://").partition("/")
+    return bucket, key
+
+
+# Writable file object that uploads an S3 object in parts while it is being written. At most
+# max_concurrency parts are uploading at a time and writers block once they are all busy, so memory
+# stays around (max_concurrency + 1) * part_size no matter how large the object gets.
+# Objects smaller than one part are uploaded with a single put_object on close.
+class MultipartWriter(io.RawIOBase):
+    def __init__(self, client, path, part_size_mb=8, max_concurrency=4, executor=None):
+        if part_size_mb < MIN_PART_SIZE_MB:
+            raise ValueError(f"Part size should not be less than {MIN_PART_SIZE_MB} MB.")
+        if max_concurrency < 1:
+            raise ValueError("Max concurrency should not be less than 1.")
+        self.client = client
+        self.bucket, self.key = split_s3_path(path)
+        self.part_size = int(part_size_mb * 1024 * 1024)
+        self.buffer = io.BytesIO()
+        self.position = 0
+        self.upload_id = None
+        self.parts = []
+        self.futures = []
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_concurrency)
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.buffer.write(data)
+        self.position += len(data)
+        if self.buffer.tell() >= self.part_size:
+            self._upload_buffer()
+        return len(data)
+
+    def _upload_buffer(self):
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key)["UploadId"]
+        # Fail the write as soon as a part has failed instead of uploading the rest of the object
+        for future in self.futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+        body = self.buffer.getvalue()
+        self.buffer = io.BytesIO()
+        part_number = len(self.futures) + 1
+        self.slots.acquire()
+        try:
+            self.futures.append(self.executor.submit(self._upload_part, part_number, body))
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def _upload_part(self, part_number, body):
+        try:
+            started = time.perf_counter()
+            response = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                               PartNumber=part_number, Body=body)
+            S3_PART_UPLOADS.observe(time.perf_counter() - started)
+            S3_BYTES_WRITTEN.inc(len(body))
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+        finally:
+            self.slots.release()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.upload_id is None:
+                body = self.buffer.getvalue()
+                started = time.perf_counter()
+                self.client.put_object(Bucket=self.bucket, Key=self.key, Body=body)
+                S3_PART_UPLOADS.observe(time.perf_counter() - started)
+                S3_BYTES_WRITTEN.inc(len(body))
+            else:
+                if self.buffer.tell() > 0:
+                    self._upload_buffer()
+                self.parts = [future.result() for future in self.futures]
+                self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                                      MultipartUpload={"Parts": self.parts})
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self.buffer = None
+            if self.own_executor:
+                self.executor.shutdown(wait=True)
+            super().close()
+
+    def abort(self):
+        # Drops the parts uploaded so far, S3 keeps (and bills) them until the upload is aborted
+        if self.upload_id is None:
+            return
+        for future in self.futures:
+            future.cancel()
+        # Parts still uploading would otherwise land after the abort
+        wait(self.futures)
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception as e:
+            logger.error(f"Failed to abort multipart upload of s3://{self.bucket}/{self.key}: {e}")
+        self.upload_id = None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+            self.buffer = None
+            if self.own_executor:
+                self.executor.shutdown(wait=True)
+            super().close()
+            return False
+        self.close()
+        return False
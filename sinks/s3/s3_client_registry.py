@@ -0,0 +1,86 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import s3fs
+from botocore.config import Config
+from botocore.exceptions import ClientError, BotoCoreError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_POOL_CONNECTIONS = 32
+
+
+class S3Client:
+    def __init__(self, s3_fs, executor):
+        self.s3_fs = s3_fs
+        # Uploads of every handler using this client run here, so they never need more connections than the pool has
+        self.executor = executor
+        self.credentials_valid = None
+
+
+# Process wide S3 clients, one per set of credentials and endpoint. Handlers for the same account share
+# the connection pool and the upload threads instead of each opening their own.
+class S3ClientRegistry:
+    def __init__(self, max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS):
+        if max_pool_connections < 1:
+            raise ValueError("Max pool connections should not be less than 1.")
+        self.max_pool_connections = max_pool_connections
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(s3_config):
+        if s3_config is None:
+            return None
+        return s3_config["access-key"], s3_config["secret-key"], s3_config.get("endpoint-url")
+
+    def get(self, s3_config=None) -> S3Client:
+        key = self._key(s3_config)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is None:
+                client = S3Client(self._create_fs(s3_config),
+                                  ThreadPoolExecutor(max_workers=self.max_pool_connections,
+                                                     thread_name_prefix="s3-upload"))
+                self.clients[key] = client
+            return client
+
+    def _create_fs(self, s3_config):
+        config_kwargs = {"max_pool_connections": self.max_pool_connections}
+        if s3_config is None:
+            return s3fs.S3FileSystem(config_kwargs=config_kwargs)
+        return s3fs.S3FileSystem(
+            key=s3_config["access-key"],
+            secret=s3_config["secret-key"],
+            client_kwargs={'endpoint_url': s3_config.get("endpoint-url")},
+            config_kwargs=config_kwargs
+        )
+
+    def check_credentials(self, s3_config=None):
+        # Runs the STS round trip once per client, on first use instead of when a sink is created
+        client = self.get(s3_config)
+        if client.credentials_valid is None:
+            kwargs = {}
+            if s3_config is not None:
+                kwargs = {"aws_access_key_id": s3_config["access-key"],
+                          "aws_secret_access_key": s3_config["secret-key"]}
+            sts = boto3.client('sts', config=Config(connect_timeout=2, retries={"max_attempts": 1}), **kwargs)
+            try:
+                sts.get_caller_identity()
+                client.credentials_valid = True
+                logger.info("Credentials are available and valid.")
+            except (ClientError, BotoCoreError) as e:
+                client.credentials_valid = False
+                logger.info(f"Credentials are not available or valid: {e}")
+        return client.credentials_valid
+
+    def clear(self):
+        with self.lock:
+            clients, self.clients = self.clients, {}
+        for client in clients.values():
+            client.executor.shutdown(wait=True)
+
+
+default_registry = S3ClientRegistry()
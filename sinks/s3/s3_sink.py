@@ -1,7 +1,7 @@
 import logging
 
-import pandas as pd
-
+from common.handler import DEFAULT_PARTITION_WORKERS
+from sinks.compaction import Compactor, CompactionConfig
 from sinks.s3.handlers.s3_csv_handler import S3CSVHandler
 from sinks.s3.handlers.s3_json_handler import S3JsonHandler
 from sinks.s3.handlers.s3_parquet_handler import S3ParquetHandler
@@ -10,10 +10,13 @@ from sinks.sink import Sink
 logger = logging.getLogger(__name__)
 
 class S3Sink(Sink):
-    def __init__(self, bucket, prefix, output_format, partition_cols=None, filename_based_on='datetime', s3_config=None, transformation_callback=None):
+    def __init__(self, bucket, prefix, output_format, partition_cols=None, filename_based_on='unique', s3_config=None, transformation_callback=None, retry_policy=None,
+                 part_size_mb=8, upload_concurrency=4, partition_workers=DEFAULT_PARTITION_WORKERS,
+                 compaction: CompactionConfig = None, compression=None, compression_level=None):
         self.bucket = bucket
         self.prefix = prefix
         self.transformation_callback = transformation_callback
+        self.retry_policy = retry_policy
         self.handlers = {
             'csv': S3CSVHandler,
             'parquet': S3ParquetHandler,
@@ -24,11 +27,10 @@ class S3Sink(Sink):
 
         handler_class = self.handlers[output_format]
 
-        self.handler = handler_class(bucket, prefix, partition_cols, filename_based_on, s3_config)
+        self.handler = handler_class(bucket, prefix, partition_cols, filename_based_on, s3_config, part_size_mb,
+                                     upload_concurrency, partition_workers, compression, compression_level)
+        if compaction is not None:
+            self.compactor = Compactor(self.handler, compaction)
 
     def deliver(self, data, filename=None):
-        df = pd.DataFrame(data)
-        # If any transformation callback is available, apply it
-        if self.transformation_callback is not None:
-            df = self.transformation_callback(df)
-        self.handler.write(df, filename)
+        return self.handler.write(self._prepare_data(data), filename)
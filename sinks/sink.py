@@ -1,3 +1,70 @@
+import pandas as pd
+
+from common.batch import Batch
+from common.record_encoder import is_records
+
+
 class Sink:
+    transformation_callback = None
+    # Overrides the firehose wide RetryPolicy for this sink
+    retry_policy = None
+    compactor = None
+
+    # Called by MiniFirehose.start and MiniFirehose.stop, after the final flush was delivered
+    def start(self):
+        if self.compactor is not None:
+            self.compactor.start()
+
+    def stop(self):
+        if self.compactor is not None:
+            self.compactor.stop()
+
     def deliver(self, data, filename=None):
         pass
+
+    def when_committed(self, result, callback):
+        # Calls callback once the data of a deliver() call that returned result is durably stored.
+        # Sinks that only return from deliver() after storing it call back right away.
+        callback()
+
+    def set_encode_pool(self, pool):
+        # Files are encoded and compressed in this process pool, None encodes them in the delivery thread
+        handler = getattr(self, "handler", None)
+        if handler is not None:
+            handler.encode_pool = pool
+
+    def compact(self):
+        if self.compactor is None:
+            raise ValueError("Compaction is not configured for this sink.")
+        return self.compactor.compact()
+
+    def _prepare_data(self, data):
+        # Dict records are handed to handlers that encode them directly, a DataFrame is only built when
+        # the format needs one or a transformation callback expects one
+        if self.transformation_callback is None and self.handler.encodes_records:
+            records = data.data if isinstance(data, Batch) and not data.columnar else data
+            if is_records(records):
+                return records
+        return self._prepare_frame(data)
+
+    def _prepare_frame(self, data):
+        # data is either a Batch shared with the other sinks of a flush, a DataFrame or a list of records
+        if isinstance(data, Batch):
+            # The frame of a batch is cached, other sinks, retries and the dead-letter spool read it again
+            df, cached = data.frame(), True
+        elif isinstance(data, pd.DataFrame):
+            df, cached = data, False
+        else:
+            df, cached = pd.DataFrame(data), False
+        # If any transformation callback is available, apply it
+        if self.transformation_callback is not None:
+            if cached:
+                df = self._private_copy(df)
+            df = self.transformation_callback(df)
+        return df
+
+    @staticmethod
+    def _private_copy(df):
+        # Transformations must not leak into the cached frame of a batch. With pandas
+        # copy-on-write enabled a shallow copy is already isolated, otherwise the blocks are copied.
+        return df.copy(deep=pd.get_option("mode.copy_on_write") is not True)
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from benchmarks import suite
+from benchmarks.suite import Workload
+from mini_firehose.cli import MiniFirehoseCLI
+
+
+def report(**records_per_sec):
+    return {"results": [{"workload": {"name": name}, "records_per_sec": value}
+                        for name, value in records_per_sec.items()]}
+
+
+def test_make_records_is_reproducible():
+    records = suite.make_records(100, 500, 10)
+    assert records == suite.make_records(100, 500, 10)
+    assert {record["partition"] for record in records} <= {f"p{i}" for i in range(10)}
+    size = sum(len(json.dumps(record, separators=(",", ":"))) for record in records) / len(records)
+    assert 400 < size < 600
+
+
+def test_workload_validation():
+    with pytest.raises(ValueError):
+        Workload(output_format="xml")
+    with pytest.raises(ValueError):
+        Workload(sink="gcs")
+    with pytest.raises(ValueError):
+        Workload(producers=0)
+
+
+def test_suites():
+    workloads = suite.suite("quick", 1000, ["csv"], ["local"])
+    assert len({workload.name for workload in workloads}) == len(workloads) == 4
+    with pytest.raises(ValueError):
+        suite.suite("nightly")
+
+
+@pytest.mark.parametrize("sink", ["local", "s3"])
+def test_run(sink):
+    workloads = [Workload("json", sink, records=2000, partition_cardinality=5, producers=2, chunk_size=500,
+                          buffer_count=1000)]
+    result = suite.run(workloads, repeats=2)
+    assert result["environment"]["cpu_count"] > 0
+    [workload] = result["results"]
+    assert workload["workload"]["name"] == f"{sink}-json-200b-5p-2w"
+    assert len(workload["runs_records_per_sec"]) == 2
+    assert workload["records_per_sec"] > 0
+    assert workload["flushes"] >= 2
+    assert workload["files_written"] >= 5
+    assert workload["bytes_written"] > 0
+    assert workload["delivery_failures"] == 0
+
+
+def test_compare():
+    rows = suite.compare(report(a=100, b=100, c=100), report(a=95, b=80, d=10), threshold_pct=10)
+    assert rows == [
+        {"workload": "a", "baseline_records_per_sec": 100, "records_per_sec": 95, "change_pct": -5.0,
+         "regression": False},
+        {"workload": "b", "baseline_records_per_sec": 100, "records_per_sec": 80, "change_pct": -20.0,
+         "regression": True},
+    ]
+
+
+def test_cli_compare_fails_on_regression(tmp_path, capsys):
+    baseline, current = tmp_path / "baseline.json", tmp_path / "current.json"
+    baseline.write_text(json.dumps(report(a=100)))
+    current.write_text(json.dumps(report(a=50)))
+    with pytest.raises(SystemExit) as e:
+        MiniFirehoseCLI().run(["bench", "compare", str(baseline), str(current)])
+    assert e.value.code == 1
+    assert json.loads(capsys.readouterr().out)["regression"]
+
+
+def test_cli_run(tmp_path):
+    output = tmp_path / "report.json"
+    MiniFirehoseCLI().run(["bench", "run", "--records", "500", "--repeats", "1", "--formats", "csv",
+                           "--sinks", "local", "--output", str(output)])
+    assert len(json.loads(output.read_text())["results"]) == 4
@@ -0,0 +1,28 @@
+from unittest.mock import patch
+
+import pandas as pd
+
+from common.batch import Batch
+
+
+def test_frame_is_built_once():
+    batch = Batch([{"data": 1}, {"data": 2}])
+    with patch("common.batch.pd.DataFrame", wraps=pd.DataFrame) as mock_dataframe:
+        first = batch.frame()
+        second = batch.frame()
+    assert first is second
+    assert mock_dataframe.call_count == 1
+
+
+def test_task_done_reports_last_consumer():
+    batch = Batch([{"data": 1}])
+    batch.expect(3)
+    assert batch.shared
+    assert [batch.task_done() for _ in range(3)] == [False, False, True]
+
+
+def test_batch_iterates_over_records():
+    records = [{"data": 1}, {"data": 2}]
+    batch = Batch(records)
+    assert list(batch) == records
+    assert len(batch) == 2
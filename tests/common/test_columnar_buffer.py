@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.batch import Batch
+from common.columnar_buffer import ColumnarBuffer
+
+schema = {"Salesperson": "str", "Region": "str", "SalesAmount": "int64", "Discount": "float64"}
+
+
+@pytest.fixture
+def sample_data():
+    return [
+        {'Salesperson': 'Alice', 'Region': 'East', 'SalesAmount': 310, 'Discount': 0.1},
+        {'Salesperson': 'Charlie', 'Region': 'East', 'SalesAmount': 320, 'Discount': 0.2},
+        {'Salesperson': 'Alice', 'Region': 'North', 'SalesAmount': 230, 'Discount': 0.0},
+        {'Salesperson': 'Bob', 'Region': 'North', 'SalesAmount': 180, 'Discount': 0.5}
+    ]
+
+
+def test_frame_matches_list_of_dicts(sample_data):
+    buffer = ColumnarBuffer(schema, chunk_size=3)
+    for record in sample_data:
+        buffer.append(record)
+    assert len(buffer) == 4
+    pd.testing.assert_frame_equal(buffer.to_frame(), pd.DataFrame(sample_data), check_dtype=False)
+    assert buffer.to_frame()["SalesAmount"].dtype == np.int64
+
+
+def test_missing_values_become_nulls():
+    buffer = ColumnarBuffer({"count": "int64", "ratio": "float64", "name": "str", "at": "datetime64[ns]"})
+    buffer.append({"count": 1, "ratio": 0.5, "name": "a", "at": datetime(2023, 1, 1)})
+    buffer.append({})
+    df = buffer.to_frame()
+    assert str(df["count"].dtype) == "Int64"
+    assert df.isna().iloc[1].all()
+    assert not df.isna().iloc[0].any()
+
+
+def test_unknown_column_is_rejected():
+    buffer = ColumnarBuffer(schema)
+    with pytest.raises(ValueError) as ex:
+        buffer.append({"Salesperson": "Alice", "Country": "UK"})
+    assert "['Country']" in str(ex.value)
+    assert len(buffer) == 0
+
+
+def test_failed_append_does_not_add_a_row():
+    buffer = ColumnarBuffer(schema)
+    with pytest.raises(ValueError):
+        buffer.append({"Salesperson": "Alice", "SalesAmount": "not-a-number"})
+    buffer.append({"Salesperson": "Bob", "SalesAmount": 1})
+    assert buffer.to_frame()["Salesperson"].tolist() == ["Bob"]
+
+
+def test_batch_from_columnar_buffer(sample_data):
+    buffer = ColumnarBuffer(schema)
+    for record in sample_data:
+        buffer.append(record)
+    batch = Batch(buffer)
+    assert batch.columnar
+    assert len(batch) == 4
+    assert batch.records == sample_data
+
+
+@pytest.mark.parametrize("column", ["SalesAmount", "Discount"])
+def test_bools_are_rejected_by_numeric_columns(column):
+    buffer = ColumnarBuffer(schema)
+    with pytest.raises(ValueError) as ex:
+        buffer.append({"Salesperson": "Alice", column: True})
+    assert "got bool" in str(ex.value)
+    assert len(buffer) == 0
+
+
+def test_string_columns_only_accept_strings():
+    buffer = ColumnarBuffer(schema)
+    with pytest.raises(ValueError) as ex:
+        buffer.append({"Salesperson": 42})
+    assert "got int" in str(ex.value)
+    buffer.append({"Salesperson": np.str_("Alice")})
+    assert buffer.to_frame()["Salesperson"].tolist() == ["Alice"]
+
+
+@pytest.mark.parametrize("dtype, value", [("uint32", -1), ("uint32", 2 ** 32), ("int64", 2 ** 70),
+                                          ("int8", np.int64(300))])
+def test_out_of_range_integers_are_rejected(dtype, value):
+    buffer = ColumnarBuffer({"count": dtype}, chunk_size=2)
+    with pytest.raises(ValueError) as ex:
+        buffer.append({"count": value})
+    assert "out of range" in str(ex.value)
+    # The rejected value never reaches a chunk, later seals still work
+    buffer.append({"count": 1})
+    buffer.append({"count": 2})
+    assert buffer.to_frame()["count"].tolist() == [1, 2]
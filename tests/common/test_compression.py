@@ -0,0 +1,55 @@
+import gzip
+
+import pytest
+
+from common.compression import Compression
+
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd", "lz4"])
+def test_concatenated_frames_decompress_as_one_file(tmp_path, codec):
+    compression = Compression("csv", codec)
+    path = tmp_path / "data"
+    path.write_bytes(compression.compress(b"a,b\n1,2\n") + compression.compress(b"3,4\n"))
+
+    assert compression.open_input(str(path)).read() == b"a,b\n1,2\n3,4\n"
+    with open(path, "rb") as f:
+        assert compression.open_input(f).read() == b"a,b\n1,2\n3,4\n"
+
+
+def test_gzip_output_is_readable_by_gzip():
+    compression = Compression("json", "gzip", 9)
+    assert gzip.decompress(compression.compress(b'{"a": 1}\n') * 2) == b'{"a": 1}\n{"a": 1}\n'
+
+
+def test_extension():
+    assert Compression("csv").extension == "csv"
+    assert Compression("csv", "gzip").extension == "csv.gz"
+    assert Compression("json", "zstd").extension == "json.zst"
+    assert Compression("json", "lz4").extension == "json.lz4"
+    assert Compression("parquet", "zstd").extension == "parquet"
+
+
+def test_uncompressed_passes_through():
+    compression = Compression("csv")
+    assert compression.compress(b"data") == b"data"
+    assert compression.open_input("path") == "path"
+    assert compression.parquet_options() == {}
+
+
+def test_parquet_options():
+    assert Compression("parquet", "zstd", 9).parquet_options() == {"compression": "zstd", "compression_level": 9}
+    assert Compression("parquet", "none").parquet_options() == {"compression": "none", "compression_level": None}
+
+
+@pytest.mark.parametrize("file_type, codec, level", [
+    ("csv", "snappy", None),
+    ("json", "brotli", None),
+    ("parquet", "bz2", None),
+    ("csv", None, 3),
+    ("parquet", "snappy", 3),
+    ("csv", "gzip", 10),
+    ("parquet", "zstd", 23),
+])
+def test_invalid_compression(file_type, codec, level):
+    with pytest.raises(ValueError):
+        Compression(file_type, codec, level)
@@ -0,0 +1,51 @@
+import os
+import threading
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from common.FileNameGenerator import FileNameGenerator
+
+
+def test_unique_names_under_concurrency():
+    generators = [FileNameGenerator("csv") for _ in range(4)]
+    names = []
+    lock = threading.Lock()
+
+    def generate(generator):
+        generated = [generator.generate() for _ in range(2000)]
+        with lock:
+            names.extend(generated)
+
+    threads = [threading.Thread(target=generate, args=(generator,)) for generator in generators for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(names)) == len(names) == 16000
+
+
+@patch('common.FileNameGenerator.time.time_ns', return_value=1_700_000_000_000_000_000)
+def test_unique_names_sort_in_creation_order_when_the_clock_stalls(_):
+    generator = FileNameGenerator("json", worker_id="w1")
+    names = [generator.generate() for _ in range(3)]
+    assert names == sorted(names)
+    assert len(set(names)) == 3
+    timestamp, host, pid, worker, sequence = names[0].removesuffix(".json").split("-")
+    assert int(timestamp) >= 1_700_000_000_000_000_000
+    assert pid == str(os.getpid())
+    assert worker == "w1"
+
+
+@patch('common.FileNameGenerator.datetime')
+def test_datetime_and_epoch_strategies(mock_datetime):
+    mock_datetime.now.return_value = datetime(2023, 1, 1, 12, 0, 0)
+    assert FileNameGenerator("csv", "datetime").generate() == "20230101120000.csv"
+    with patch('time.time', return_value=1609459200):
+        assert FileNameGenerator("csv", "epoch").generate() == "1609459200.csv"
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        FileNameGenerator("csv", "random")
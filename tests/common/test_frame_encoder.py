@@ -0,0 +1,27 @@
+import io
+
+import pandas as pd
+import pytest
+
+from common.compression import Compression
+from common.frame_encoder import encode_frame
+
+records = [{"Region": "East", "id": i, "name": f"name-{i}"} for i in range(25)]
+
+
+@pytest.mark.parametrize("file_type, read", [
+    ("csv", pd.read_csv),
+    ("json", lambda f: pd.read_json(f, lines=True)),
+    ("parquet", pd.read_parquet),
+])
+@pytest.mark.parametrize("as_frame", [False, True])
+def test_encode_frame(file_type, read, as_frame):
+    data = pd.DataFrame(records) if as_frame else records
+    encoded = encode_frame(file_type, data, chunk_rows=10)
+    pd.testing.assert_frame_equal(read(io.BytesIO(encoded)), pd.DataFrame(records))
+
+
+def test_compressed_records_without_excluded_keys():
+    encoded = encode_frame("csv", records, "zstd", 5, exclude=["Region"], chunk_rows=10)
+    actual = pd.read_csv(Compression("csv", "zstd").open_input(io.BytesIO(encoded)))
+    pd.testing.assert_frame_equal(actual, pd.DataFrame(records).drop(columns=["Region"]))
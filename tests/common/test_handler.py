@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from common.handler import Handler, PartitionWriteError
+
+
+class RecordingHandler(Handler):
+    def __init__(self, partition_cols, partition_workers=4, delay=0, fail_on=None):
+        super().__init__('csv', partition_workers=partition_workers)
+        self.partition_cols = partition_cols
+        self.has_partitions = True
+        self.delay = delay
+        self.fail_on = fail_on
+        self.written = {}
+        self.lock = threading.Lock()
+
+    def get_partition_path(self, group_name):
+        return os.path.join(*[f"{col}={val}" for col, val in zip(self.partition_cols, group_name)])
+
+    def _write_data(self, df, file_path):
+        time.sleep(self.delay)
+        if file_path == self.fail_on:
+            raise IOError("Disk full")
+        with self.lock:
+            self.written[file_path] = df
+
+
+@pytest.fixture
+def sample_data():
+    return pd.DataFrame({
+        'Region': ['East', 'North', 'East', None, 'North', 'West'],
+        'City': ['A', 'B', 'A', 'C', 'D', 'E'],
+        'SalesAmount': [1, 2, 3, 4, 5, 6]
+    })
+
+
+def test_partitions_are_sliced_without_partition_columns(sample_data):
+    handler = RecordingHandler(['Region'])
+    results = handler.write(sample_data)
+
+    expected = {
+        f"Region={name}": group.drop(columns=['Region']) for name, group in sample_data.groupby('Region')
+    }
+    assert sorted(handler.written) == sorted(expected)
+    for path, df in handler.written.items():
+        pd.testing.assert_frame_equal(df.reset_index(drop=True), expected[path].reset_index(drop=True))
+    assert {result.path: result.records for result in results} == {'Region=East': 2, 'Region=North': 2,
+                                                                   'Region=West': 1}
+    assert all(result.ok for result in results)
+    assert {result.partition['Region'] for result in results} == {'East', 'North', 'West'}
+
+
+def test_multi_level_partitions(sample_data):
+    handler = RecordingHandler(['Region', 'City'])
+    handler.write(sample_data)
+    assert sorted(handler.written) == sorted(os.path.join(f"Region={region}", f"City={city}") for region, city in
+                                             [('East', 'A'), ('North', 'B'), ('North', 'D'), ('West', 'E')])
+    assert list(handler.written[os.path.join('Region=East', 'City=A')].columns) == ['SalesAmount']
+
+
+def test_failed_partition_does_not_stop_the_others(sample_data):
+    handler = RecordingHandler(['Region'], fail_on='Region=North')
+    with pytest.raises(PartitionWriteError) as error:
+        handler.write(sample_data)
+    assert sorted(handler.written) == ['Region=East', 'Region=West']
+    failed = [result for result in error.value.results if not result.ok]
+    assert [result.path for result in failed] == ['Region=North']
+
+
+def test_partitions_are_written_in_parallel():
+    df = pd.DataFrame({'Region': [f"region-{i}" for i in range(16)], 'SalesAmount': range(16)})
+    handler = RecordingHandler(['Region'], partition_workers=8, delay=0.1)
+    started = time.perf_counter()
+    handler.write(df)
+    assert len(handler.written) == 16
+    assert time.perf_counter() - started < 0.8
+
+
+def test_partition_workers_validation():
+    with pytest.raises(ValueError):
+        RecordingHandler(['Region'], partition_workers=0)
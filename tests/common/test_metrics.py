@@ -0,0 +1,154 @@
+import threading
+
+import pytest
+
+from common.metrics import Counter, Gauge, Histogram, Registry, default_registry, ADD_MESSAGE_SAMPLE_EVERY
+from mini_firehose.mini_firehose import MiniFirehose, FirehoseConfig
+from sinks.local.local_sink import LocalSink
+from sinks.sink import Sink
+
+
+class FailingSink(Sink):
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def deliver(self, data, filename=None):
+        raise IOError("disk full")
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def count_config(**kwargs):
+    return FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1, **kwargs)
+
+
+def sample(text, line_start):
+    return next(line for line in text.splitlines() if line.startswith(line_start)).rsplit(" ", 1)[1]
+
+
+def test_counter_exposition(registry):
+    counter = Counter("test_events_total", "Events.", ["kind"], registry=registry)
+    counter.labels("a").inc()
+    counter.labels("a").inc(2)
+    counter.labels('say "hi"').inc()
+    text = registry.render()
+    assert "# TYPE test_events_total counter" in text
+    assert 'test_events_total{kind="a"} 3' in text
+    assert 'test_events_total{kind="say \\"hi\\""} 1' in text
+    assert [(values, child.value) for values, child in counter.items()] == [(("a",), 3), (('say "hi"',), 1)]
+
+
+def test_labels_are_checked(registry):
+    counter = Counter("test_events_total", "Events.", ["kind"], registry=registry)
+    with pytest.raises(ValueError):
+        counter.labels("a", "b")
+    with pytest.raises(ValueError):
+        Counter("test_events_total", "Events.", registry=registry)
+
+
+def test_histogram_exposition(registry):
+    histogram = Histogram("test_seconds", "Durations.", buckets=(0.1, 1), registry=registry)
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.labels().observe(value)
+    text = registry.render()
+    assert 'test_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_seconds_bucket{le="1"} 3' in text
+    assert 'test_seconds_bucket{le="+Inf"} 4' in text
+    assert "test_seconds_count 4" in text
+    assert float(sample(text, "test_seconds_sum")) == pytest.approx(6.05)
+
+
+def test_histogram_snapshot(registry):
+    histogram = Histogram("test_seconds", "Durations.", buckets=(1, 2, 3, 4), registry=registry)
+    child = histogram.labels()
+    assert child.snapshot()["p50"] is None
+    for value in (0.5, 1.5, 2.5, 3.5):
+        child.observe(value)
+    snapshot = child.snapshot()
+    assert snapshot["count"] == 4
+    assert snapshot["p50"] == pytest.approx(2)
+    assert 3 < snapshot["p99"] <= 4
+
+
+def test_counter_is_thread_safe(registry):
+    child = Counter("test_events_total", "Events.", registry=registry).labels()
+    threads = [threading.Thread(target=lambda: [child.inc() for _ in range(10000)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert child.value == 40000
+
+
+def test_gauge_function(registry):
+    values = [1]
+    Gauge("test_depth", "Depth.", ["queue"], registry=registry).labels("q").set_function(lambda: values[-1])
+    values.append(7)
+    assert 'test_depth{queue="q"} 7' in registry.render()
+
+
+def test_firehose_metrics(tmp_path):
+    firehose = MiniFirehose("test_metrics_firehose", [LocalSink(str(tmp_path), "json")], count_config())
+    firehose.start()
+    for i in range(15):
+        firehose.add_message({"id": i})
+    assert firehose.add_messages([{"id": i} for i in range(10)]) == 10
+    text = default_registry.render()
+    assert 'minifirehose_buffer_records{firehose="test_metrics_firehose"} 5' in text
+    firehose.stop()
+
+    stats = firehose.stats()
+    assert stats["buffer-count"] == 0
+    assert stats["flushed-messages"] == 25
+    assert stats["flushes"] == {"buffer-reached": 2, "final-flush": 1}
+    assert stats["batch-records"]["count"] == 3
+    assert stats["flush-seconds"]["count"] == 3
+    # add_message calls are sampled, add_messages calls are all timed
+    assert stats["add-seconds"]["count"] == 1
+    assert stats["sinks"][0]["delivery-seconds"]["count"] == 3
+    assert stats["sinks"][0]["failures"] == 0
+
+    text = default_registry.render()
+    assert 'minifirehose_batch_records_sum{firehose="test_metrics_firehose"} 25' in text
+    assert 'minifirehose_flushes_total{firehose="test_metrics_firehose",event="buffer-reached"} 2' in text
+    assert int(sample(text, 'minifirehose_files_written_total{format="json"}')) >= 3
+    assert int(sample(text, 'minifirehose_bytes_written_total{storage="local"}')) > 0
+    # The gauges of a stopped firehose are dropped
+    assert 'minifirehose_buffer_records{firehose="test_metrics_firehose"}' not in text
+
+
+def test_firehose_failure_metrics():
+    firehose = MiniFirehose("test_metrics_failing", [FailingSink()], count_config())
+    firehose.start()
+    for i in range(10):
+        firehose.add_message({"id": i})
+    firehose.stop()
+
+    sink_stats = firehose.stats()["sinks"][0]
+    assert sink_stats["failures"] == 1
+    assert sink_stats["dead-letter-batches"] == 1
+
+
+def test_firehose_without_metrics(tmp_path):
+    firehose = MiniFirehose("test_metrics_disabled", [LocalSink(str(tmp_path), "json")], count_config(metrics=False))
+    firehose.start()
+    firehose.add_message({"id": 1})
+    firehose.stop()
+
+    assert firehose.metrics is None
+    assert "flushes" not in firehose.stats()
+    assert 'firehose="test_metrics_disabled"' not in default_registry.render()
+
+
+def test_add_message_is_sampled():
+    firehose = MiniFirehose("test_metrics_sampled", [FailingSink()],
+                            FirehoseConfig(buffer_count_limit=1000, buffer_time_limit=-1, buffer_size_limit_mb=-1))
+    for i in range(ADD_MESSAGE_SAMPLE_EVERY * 3):
+        firehose.add_message({"id": i})
+    assert firehose.metrics.add_seconds.snapshot()["count"] == 3
@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common import record_encoder
+from common.record_encoder import encode_csv, encode_ndjson, group_records, is_records, record_columns
+
+
+def test_is_records():
+    assert is_records([{"a": 1}, {"b": 2}])
+    assert is_records([])
+    assert not is_records(["message"])
+    assert not is_records([{"a": 1}, "message"])
+    assert not is_records(None)
+
+
+def test_encode_ndjson():
+    records = [{"a": 1, "b": "x"}, {"a": np.int64(2), "b": None, "c": datetime(2024, 1, 2)}]
+    lines = encode_ndjson(records).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [{"a": 1, "b": "x"}, {"a": 2, "b": None, "c": "2024-01-02T00:00:00"}]
+    assert encode_ndjson([]) == b""
+
+
+def test_json_backends_write_the_same_bytes():
+    pytest.importorskip("orjson")
+    records = [
+        {"int": np.int64(1), "float": np.float64(1.5), "float32": np.float32(0.25), "bool": np.bool_(True),
+         "array": np.array([1, 2])},
+        {"datetime": datetime(2024, 1, 1), "micros": datetime(2024, 1, 1, 12, 30, 5, 120),
+         "aware": datetime(2024, 1, 1, tzinfo=timezone.utc), "date": date(2024, 1, 1),
+         "timestamp": pd.Timestamp("2024-01-01 08:00")},
+        {"text": "zürich \"quoted\"", "decimal": Decimal("1.10"), "none": None, "nested": {1: [1.0, "a"]},
+         "tuple": (1, 2)},
+    ]
+    for record in records:
+        assert record_encoder._json_dumps(record) == record_encoder._orjson_dumps(record)
+
+
+def test_encode_csv():
+    records = [{"a": 1, "b": "x,y"}, {"b": "z", "c": True}]
+    columns = record_columns(records)
+    assert columns == ["a", "b", "c"]
+    assert list(csv.reader(io.StringIO(encode_csv(records, columns).decode()))) == \
+        [["a", "b", "c"], ["1", "x,y", ""], ["", "z", "True"]]
+    assert encode_csv(records[:1], columns, header=False) == b'1,"x,y",\n'
+
+
+def test_group_records():
+    records = [{"r": "East", "c": 1, "v": 1}, {"r": "West", "c": 1, "v": 2}, {"r": "East", "c": 1, "v": 3},
+               {"r": None, "c": 1, "v": 4}, {"c": 1, "v": 5}]
+    assert group_records(records, ["r", "c"]) == [(("East", 1), [records[0], records[2]]), (("West", 1), [records[1]])]
+    assert group_records(records, ["r"]) == [(("East",), [records[0], records[2]]), (("West",), [records[1]])]
+
+
+def test_excluded_keys_are_not_encoded():
+    records = [{"r": "East", "v": 1}, {"r": "East", "v": 2}]
+    assert encode_ndjson(records, ["r"]) == b'{"v":1}\n{"v":2}\n'
+    assert record_columns(records, ["r"]) == ["v"]
+    # The records may be shared with other sinks, they are left as they are
+    assert records[0] == {"r": "East", "v": 1}
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+
+from mini_firehose.adaptive import AdaptiveFlushConfig, AdaptiveFlushController
+from mini_firehose.mini_firehose import MiniFirehose, FirehoseConfig
+from sinks.sink import Sink
+
+
+class SlowSink(Sink):
+    def __init__(self, seconds_per_record=0.0):
+        self.seconds_per_record = seconds_per_record
+        self.batches = []
+        self.delivered = threading.Event()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def deliver(self, data, filename=None):
+        time.sleep(self.seconds_per_record * len(data))
+        self.batches.append(len(data))
+        self.delivered.set()
+
+
+def feed(controller, flushes, arrival_rate, seconds_per_record, record_bytes=100):
+    # Flushes of whatever the controller currently asks for, with a sink taking seconds_per_record
+    for _ in range(flushes):
+        count = controller.count_limit
+        controller.observe(count, count * record_bytes / 1024 / 1024, count / arrival_rate,
+                           count * seconds_per_record)
+
+
+def test_config_validation():
+    with pytest.raises(ValueError):
+        AdaptiveFlushConfig(min_count=0)
+    with pytest.raises(ValueError):
+        AdaptiveFlushConfig(min_count=100, max_count=10)
+    with pytest.raises(ValueError):
+        AdaptiveFlushConfig(target_latency=0)
+    with pytest.raises(ValueError):
+        AdaptiveFlushConfig(target_file_mb=0)
+    with pytest.raises(ValueError):
+        AdaptiveFlushConfig(max_step=1)
+
+
+def test_firehose_config_accepts_adaptive_without_static_limits():
+    FirehoseConfig(buffer_count_limit=-1, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                   adaptive=AdaptiveFlushConfig())
+    with pytest.raises(ValueError):
+        FirehoseConfig(buffer_count_limit=-1, buffer_time_limit=-1, buffer_size_limit_mb=-1)
+
+
+def test_grows_to_the_latency_target():
+    controller = AdaptiveFlushController(AdaptiveFlushConfig(min_count=10, target_latency=1.0, target_file_mb=None))
+    feed(controller, 1, 10_000, 0.00005)
+    # Grows by max_step per flush
+    assert controller.count_limit == 20
+    feed(controller, 20, 10_000, 0.00005)
+    # n / 10000 + 0.00005 * n <= 1
+    assert controller.count_limit == pytest.approx(6666, abs=2)
+    assert controller.reason == "latency"
+    assert controller.time_limit == pytest.approx(1 - 0.00005 * 6666, abs=0.01)
+
+
+def test_shrinks_when_the_sink_slows_down():
+    controller = AdaptiveFlushController(AdaptiveFlushConfig(min_count=10, target_latency=1.0, target_file_mb=None))
+    feed(controller, 20, 10_000, 0.00005)
+    grown = controller.count_limit
+    feed(controller, 40, 1_000, 0.0001)
+    # n / 1000 + 0.0001 * n <= 1
+    assert controller.count_limit < grown
+    assert controller.count_limit == pytest.approx(909, abs=2)
+
+
+def test_file_size_target():
+    controller = AdaptiveFlushController(AdaptiveFlushConfig(min_count=10, target_latency=10, target_file_mb=1))
+    feed(controller, 20, 100_000, 0.000001, record_bytes=1024)
+    assert controller.count_limit == 1024
+    assert controller.reason == "file-size"
+
+
+def test_batches_up_to_keep_up_with_arrivals():
+    # Every flush costs 40 ms on top of its records, small batches cannot keep up with 10k messages a second.
+    # The latency target allows at most 181 messages, the sink needs 444 to keep up and that wins.
+    controller = AdaptiveFlushController(AdaptiveFlushConfig(min_count=10, target_latency=0.06, target_file_mb=None))
+    for _ in range(30):
+        count = controller.count_limit
+        controller.observe(count, 0, count / 10_000, 0.04 + count * 0.00001)
+    # 0.04 + 0.00001 * n <= n / 10000
+    assert controller.count_limit == pytest.approx(444, abs=2)
+    assert controller.reason == "throughput"
+    assert controller.time_limit == pytest.approx(0.05)
+
+
+def test_bounds():
+    controller = AdaptiveFlushController(AdaptiveFlushConfig(min_count=10, max_count=500, target_latency=1.0,
+                                                             target_file_mb=None))
+    feed(controller, 20, 100_000, 0.000001)
+    assert controller.count_limit == 500
+    assert controller.reason == "max-count"
+    feed(controller, 20, 5, 0.001)
+    assert controller.count_limit == 10
+    assert controller.reason == "min-count"
+
+
+def test_time_limit_is_capped_by_the_static_limit():
+    controller = AdaptiveFlushController(AdaptiveFlushConfig(target_latency=120), buffer_time_limit=60)
+    assert controller.time_limit == 60
+
+
+def test_firehose_adapts_and_reports_its_decisions():
+    sink = SlowSink(0.00001)
+    config = FirehoseConfig(buffer_size_limit_mb=-1, adaptive=AdaptiveFlushConfig(min_count=10, target_latency=2.0))
+    firehose = MiniFirehose("test_adaptive_firehose", [sink], config)
+    firehose.start()
+    for i in range(3000):
+        firehose.add_message({"id": i})
+        if i % 100 == 0:
+            # Let deliveries finish so the controller sees them
+            time.sleep(0.01)
+    firehose.stop()
+
+    assert sum(sink.batches) == 3000
+    stats = firehose.stats()["adaptive"]
+    assert stats["decisions"] > 0
+    assert stats["count-limit"] > 10
+    assert stats["reason"] in ("latency", "file-size", "throughput", "max-count")
+    assert stats["arrival-rate"] > 0
+
+
+def test_quiet_firehose_flushes_within_the_target_latency():
+    sink = SlowSink()
+    config = FirehoseConfig(adaptive=AdaptiveFlushConfig(min_count=1000, target_latency=0.5))
+    firehose = MiniFirehose("test_adaptive_quiet", [sink], config)
+    firehose.start()
+    started = time.time()
+    for i in range(5):
+        firehose.add_message({"id": i})
+    assert sink.delivered.wait(2)
+    elapsed = time.time() - started
+    firehose.stop()
+
+    assert sink.batches[0] == 5
+    assert elapsed < 1.5
@@ -0,0 +1,131 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from mini_firehose.api import MiniFirehoseApi
+
+
+@pytest.fixture
+def api():
+    with patch("mini_firehose.api.signal.signal"):
+        api = MiniFirehoseApi()
+    yield api
+
+
+@pytest.fixture
+def client(api, tmp_path):
+    # Entered, so every request runs on the same event loop like under uvicorn
+    with TestClient(api.app) as client:
+        response = client.post("/minifirehoses", json={
+            "name": "test_firehose",
+            "buffer-count": 10,
+            "buffer-size": 1,
+            "sink": "local",
+            "sink-config": {"directory": str(tmp_path), "output-format": "json"}
+        })
+        assert response.status_code == 200
+        yield client
+        for name in list(api.mini_firehoses):
+            client.delete(f"/minifirehoses/{name}")
+
+
+def test_add_messages(client, api):
+    response = client.post("/minifirehoses/test_firehose/messages", json=["message-" + str(i) for i in range(25)])
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 25
+    assert response.json()["received"] == 25
+    assert api.mini_firehoses["test_firehose"].buffer_count == 5
+
+
+def test_stream_messages(client, api):
+    body = "\n".join(json.dumps({"data": "message-" + str(i)}) for i in range(2500))
+
+    def chunks():
+        # Split records across request chunks to exercise line reassembly
+        for start in range(0, len(body), 4096):
+            yield body[start:start + 4096].encode()
+
+    response = client.post("/minifirehoses/test_firehose/messages/stream", content=chunks(),
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 2500
+    assert api.mini_firehoses["test_firehose"].buffer_count == 0
+
+
+def test_batch_and_stream_routes_take_the_same_messages(client, api):
+    messages = [{"data": 1, "tags": ["a"]}, "message", 3, {"nested": {"data": 2}}]
+    response = client.post("/minifirehoses/test_firehose/messages", json=messages)
+    assert response.json()["accepted"] == 4
+    body = "\n".join(json.dumps(message) for message in messages)
+    response = client.post("/minifirehoses/test_firehose/messages/stream", content=body.encode())
+    assert response.json()["accepted"] == 4
+    assert list(api.mini_firehoses["test_firehose"].buffer) == messages + messages
+
+
+def test_stream_messages_invalid_record(client):
+    response = client.post("/minifirehoses/test_firehose/messages/stream", content=b'{"data": 1}\n{"data": \n')
+    assert response.status_code == 400
+    assert "after 1 records" in response.json()["detail"]
+
+
+def test_add_messages_unknown_firehose(client):
+    response = client.post("/minifirehoses/unknown/messages", json=["message"])
+    assert response.status_code == 400
+
+
+def test_redrive_without_dead_letter_directory(client):
+    response = client.post("/minifirehoses/test_firehose/redrive")
+    assert response.status_code == 400
+
+
+def test_create_with_compression(client, api, tmp_path):
+    sink_config = {"directory": str(tmp_path), "output-format": "csv", "compression": "zstd", "compression-level": 3}
+    response = client.post("/minifirehoses", json={"name": "compressed", "sink": "local", "sink-config": sink_config})
+    assert response.status_code == 200
+    assert api.mini_firehoses["compressed"].sinks[0].handler.file_extension == "csv.zst"
+
+    sink_config["compression"] = "brotli"
+    response = client.post("/minifirehoses", json={"name": "invalid", "sink": "local", "sink-config": sink_config})
+    assert response.status_code == 400
+
+
+def test_stats_and_metrics(client):
+    # Counters are kept per firehose name for the whole process, other tests used this name too
+    before = client.get("/minifirehoses/test_firehose/stats").json()
+    client.post("/minifirehoses/test_firehose/messages", json=["message-" + str(i) for i in range(15)])
+    stats = client.get("/minifirehoses/test_firehose/stats").json()
+    assert stats["buffer-count"] == 5
+    assert stats["flushed-messages"] - before["flushed-messages"] == 10
+    assert stats["flushes"]["buffer-reached"] - before["flushes"].get("buffer-reached", 0) == 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'minifirehose_buffer_records{firehose="test_firehose"} 5' in response.text
+    assert "# TYPE minifirehose_sink_delivery_seconds histogram" in response.text
+
+
+def test_create_with_adaptive_flush(client, tmp_path):
+    response = client.post("/minifirehoses", json={
+        "name": "adaptive_firehose",
+        "adaptive-flush": {"min-count": 20, "target-latency": 1},
+        "sink": "local",
+        "sink-config": {"directory": str(tmp_path / "adaptive"), "output-format": "json"}
+    })
+    assert response.status_code == 200
+    client.post("/minifirehoses/adaptive_firehose/messages", json=["message-" + str(i) for i in range(5)])
+    stats = client.get("/minifirehoses/adaptive_firehose/stats").json()
+    assert stats["adaptive"]["count-limit"] == 20
+    assert stats["adaptive"]["reason"] == "initial"
+
+
+def test_create_with_invalid_adaptive_flush(client, tmp_path):
+    response = client.post("/minifirehoses", json={
+        "name": "adaptive_firehose",
+        "adaptive-flush": {"min-count": 0},
+        "sink": "local",
+        "sink-config": {"directory": str(tmp_path / "adaptive"), "output-format": "json"}
+    })
+    assert response.status_code == 400
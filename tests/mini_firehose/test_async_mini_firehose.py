@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from mini_firehose.async_mini_firehose import AsyncMiniFirehose
+from mini_firehose.mini_firehose import FirehoseConfig, BackpressureError
+from mini_firehose.retry import RetryPolicy
+from sinks.sink import Sink
+
+
+class SlowSink(Sink):
+    def __init__(self, delay=0.0, failures=0, retry_policy=None):
+        self.delay = delay
+        self.failures = failures
+        self.retry_policy = retry_policy
+        self.attempts = 0
+        self.records = []
+        self.threads = set()
+
+    def deliver(self, data, filename=None):
+        self.threads.add(threading.current_thread().name)
+        self.attempts += 1
+        time.sleep(self.delay)
+        if self.attempts <= self.failures:
+            raise IOError("Sink unavailable")
+        self.records.extend(data)
+
+
+def count_config(**kwargs):
+    return FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1, **kwargs)
+
+
+async def measure_lag(stop, interval=0.005):
+    # Largest delay of a periodic timer, i.e. the longest time the loop was busy with something else
+    loop = asyncio.get_running_loop()
+    lag = 0
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(lag, loop.time() - started - interval)
+    return lag
+
+
+def test_messages_are_delivered_off_the_loop():
+    sink = SlowSink()
+
+    async def main():
+        firehose = AsyncMiniFirehose("test", [sink], count_config())
+        await firehose.start()
+        for i in range(5):
+            await firehose.add_message({"id": i})
+        assert await firehose.add_messages([{"id": i} for i in range(5, 25)]) == 20
+        await firehose.flush()
+        assert firehose.buffer_count == 0
+        await firehose.stop()
+
+    asyncio.run(main())
+    assert sorted(record["id"] for record in sink.records) == list(range(25))
+    assert threading.main_thread().name not in sink.threads
+
+
+def test_time_limit_runs_on_the_loop():
+    sink = SlowSink()
+
+    async def main():
+        config = FirehoseConfig(buffer_count_limit=10, buffer_time_limit=60, buffer_size_limit_mb=-1)
+        firehose = AsyncMiniFirehose("test", [sink], config)
+        # The effective limit, the way adaptive flushing sets it, so the test does not wait a minute
+        firehose.time_limit = 0.05
+        await firehose.start()
+        await firehose.add_message({"id": 1})
+        await asyncio.sleep(0.3)
+        assert sink.records == [{"id": 1}]
+        await firehose.stop()
+
+    asyncio.run(main())
+
+
+def test_backpressure_is_awaited_without_blocking_the_loop():
+    sink = SlowSink(delay=0.2)
+
+    async def main():
+        firehose = AsyncMiniFirehose("test", [sink], count_config(max_in_flight_batches=1))
+        await firehose.start()
+        stop = asyncio.Event()
+        lag = asyncio.create_task(measure_lag(stop))
+        # The second and third batch wait for the slow delivery of the first one
+        assert await firehose.add_messages([{"id": i} for i in range(30)]) == 30
+        stop.set()
+        assert await lag < 0.1
+        await firehose.stop()
+
+    asyncio.run(main())
+    assert len(sink.records) == 30
+
+
+def test_reject_policy():
+    sink = SlowSink(delay=0.2)
+
+    async def main():
+        firehose = AsyncMiniFirehose("test", [sink], count_config(max_in_flight_batches=1,
+                                                                   backpressure_policy="reject"))
+        await firehose.start()
+        assert await firehose.add_messages([{"id": i} for i in range(30)], chunk_size=10) == 10
+        with pytest.raises(BackpressureError):
+            await firehose.add_message({"id": 30})
+        await firehose.stop()
+
+    asyncio.run(main())
+
+
+def test_retries_use_loop_timers():
+    sink = SlowSink(failures=2, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.02))
+
+    async def main():
+        firehose = AsyncMiniFirehose("test", [sink], count_config())
+        await firehose.start()
+        await firehose.add_messages([{"id": i} for i in range(5)])
+        await firehose.flush()
+        assert sink.attempts == 3
+        await firehose.stop()
+
+    asyncio.run(main())
+    assert len(sink.records) == 5
+
+
+def test_write_ahead_log(tmp_path):
+    sink = SlowSink()
+
+    async def main():
+        firehose = AsyncMiniFirehose("test", [sink], count_config(wal_directory=str(tmp_path),
+                                                                   wal_fsync_policy="always"))
+        await firehose.start()
+        await asyncio.gather(*[firehose.add_message({"id": i}) for i in range(25)])
+        await firehose.stop()
+
+    asyncio.run(main())
+    assert sorted(record["id"] for record in sink.records) == list(range(25))
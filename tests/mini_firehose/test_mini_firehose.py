@@ -1,11 +1,14 @@
+import threading
 import time
 
 import pytest
 import pandas as pd
 from pathlib import Path
 
-from mini_firehose.mini_firehose import FirehoseConfig, MiniFirehose
+from mini_firehose.mini_firehose import FirehoseConfig, MiniFirehose, BackpressureError
+from mini_firehose.scheduler import ScheduledTask
 from sinks.local.local_sink import LocalSink
+from sinks.sink import Sink
 
 
 # Your MiniFirehose, LocalSink, and LocalCSVHandler classes go here
@@ -73,4 +76,234 @@ def test_buffer_time_limit(tmp_path):
 def test_buffer_size_mb_limit(tmp_path):
     with pytest.raises(ValueError) as ex:
         FirehoseConfig(buffer_count_limit=10, buffer_time_limit=60, buffer_size_limit_mb=0.5)
-    assert "Buffer size limit should not be less than 1 MB." in str(ex.value)
\ No newline at end of file
+    assert "Buffer size limit should not be less than 1 MB." in str(ex.value)
+
+class CollectingSink(Sink):
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def deliver(self, data, filename=None):
+        with self.lock:
+            self.batches.append(list(data))
+
+
+def test_concurrent_producers_deliver_every_message():
+    sink = CollectingSink()
+    config = FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1)
+    firehose = MiniFirehose(name="test_firehose", sinks=[sink], config=config)
+
+    def produce(producer_id):
+        for i in range(100):
+            firehose.add_message({"producer": producer_id, "seq": i})
+
+    producers = [threading.Thread(target=produce, args=(p,)) for p in range(16)]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    firehose.stop()
+
+    delivered = [message for batch in sink.batches for message in batch]
+    assert len(delivered) == 1600
+    assert all(len(batch) == 10 for batch in sink.batches)
+
+
+class ManualScheduler:
+    # Runs scheduled callbacks only when the test asks for it, deadline holds the requested delay
+    def __init__(self):
+        self.tasks = []
+
+    def schedule(self, delay, callback):
+        task = ScheduledTask(delay, callback)
+        self.tasks.append(task)
+        return task
+
+    def cancel(self, task):
+        task.cancel()
+
+    def run_pending(self):
+        tasks, self.tasks = self.tasks, []
+        for task in tasks:
+            if not task.cancelled:
+                task.callback()
+
+
+def test_time_limit_flush_uses_shared_scheduler():
+    sink = CollectingSink()
+    scheduler = ManualScheduler()
+    config = FirehoseConfig(buffer_count_limit=-1, buffer_time_limit=60, buffer_size_limit_mb=-1)
+    firehose = MiniFirehose(name="test_firehose", sinks=[sink], config=config, scheduler=scheduler)
+    firehose.start()
+    assert [task.deadline for task in scheduler.tasks] == [60]
+    firehose.add_message({"data": "test1"})
+    # The scheduler fires once the time limit has passed since the last flush
+    firehose.last_flush_time -= 60
+    scheduler.run_pending()
+    deadline = time.monotonic() + 2
+    while not sink.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sink.batches == [[{"data": "test1"}]]
+    assert [task.deadline for task in scheduler.tasks] == [60]
+    firehose.stop()
+    assert scheduler.tasks[0].cancelled
+
+
+def test_stop_does_not_wait_for_time_limit():
+    sink = CollectingSink()
+    config = FirehoseConfig(buffer_count_limit=-1, buffer_time_limit=60, buffer_size_limit_mb=-1)
+    firehose = MiniFirehose(name="test_firehose", sinks=[sink], config=config)
+    firehose.start()
+    firehose.add_message({"data": "test1"})
+    started = time.monotonic()
+    firehose.stop()
+    assert time.monotonic() - started < 0.5
+    assert sink.batches == [[{"data": "test1"}]]
+
+
+class SlowSink(Sink):
+    def __init__(self):
+        self.release = threading.Event()
+        self.delivered = []
+
+    def deliver(self, data, filename=None):
+        self.release.wait(5)
+        self.delivered.extend(data)
+
+
+@pytest.fixture
+def slow_sink():
+    sink = SlowSink()
+    yield sink
+    sink.release.set()
+
+
+def backpressure_firehose(sink, **kwargs):
+    config = FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                            max_in_flight_batches=1, **kwargs)
+    firehose = MiniFirehose(name="test_firehose", sinks=[sink], config=config)
+    for i in range(10):
+        firehose.add_message({"data": i})
+    return firehose
+
+
+def test_backpressure_blocks_until_flush_completes(slow_sink):
+    firehose = backpressure_firehose(slow_sink)
+    assert firehose.in_flight_batches == 1
+    assert firehose.queued_bytes > 0
+
+    producer = threading.Thread(target=firehose.add_message, args=({"data": 10},))
+    producer.start()
+    producer.join(0.2)
+    assert producer.is_alive()
+
+    slow_sink.release.set()
+    producer.join(2)
+    assert not producer.is_alive()
+    assert firehose.in_flight_batches == 0
+    assert firehose.queued_bytes == 0
+    firehose.stop()
+    assert len(slow_sink.delivered) == 11
+
+
+def test_backpressure_reject(slow_sink):
+    firehose = backpressure_firehose(slow_sink, backpressure_policy="reject")
+    with pytest.raises(BackpressureError):
+        firehose.add_message({"data": 10})
+    slow_sink.release.set()
+    firehose.stop()
+    assert len(slow_sink.delivered) == 10
+
+
+def test_backpressure_timeout(slow_sink):
+    firehose = backpressure_firehose(slow_sink, backpressure_policy="timeout", backpressure_timeout=0.1)
+    started = time.monotonic()
+    with pytest.raises(BackpressureError):
+        firehose.add_message({"data": 10})
+    assert time.monotonic() - started >= 0.1
+    slow_sink.release.set()
+    firehose.stop()
+
+
+def test_backpressure_in_flight_size_limit(slow_sink):
+    config = FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                            max_in_flight_mb=0.0001, backpressure_policy="reject")
+    firehose = MiniFirehose(name="test_firehose", sinks=[slow_sink], config=config)
+    for i in range(10):
+        firehose.add_message({"data": "x" * 100})
+    with pytest.raises(BackpressureError):
+        firehose.add_message({"data": "x"})
+    slow_sink.release.set()
+    firehose.stop()
+
+
+def test_backpressure_timeout_requires_timeout():
+    with pytest.raises(ValueError) as ex:
+        FirehoseConfig(backpressure_policy="timeout")
+    assert "Backpressure timeout should be greater than 0 seconds" in str(ex.value)
+
+
+def test_schema_buffer_flushes_columnar_batch(tmp_path):
+    config = FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                            schema={"data": "str", "seq": "int64"})
+    firehose = MiniFirehose(name="test_firehose", sinks=[LocalSink(tmp_path, 'parquet')], config=config)
+    for i in range(10):
+        firehose.add_message({"data": "test" + str(i), "seq": i})
+    firehose.stop()
+
+    files = list(tmp_path.glob('*.parquet'))
+    assert len(files) == 1
+    df = pd.read_parquet(files[0])
+    assert df["seq"].tolist() == list(range(10))
+
+
+def test_add_messages_splits_at_count_limit():
+    sink = CollectingSink()
+    config = FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1)
+    firehose = MiniFirehose(name="test_firehose", sinks=[sink], config=config)
+    assert firehose.add_messages(({"data": i} for i in range(25)), chunk_size=7) == 25
+    assert firehose.buffer_count == 5
+    firehose.stop()
+    assert [len(batch) for batch in sink.batches] == [10, 10, 5]
+    assert [message["data"] for batch in sink.batches for message in batch] == list(range(25))
+
+
+def test_add_messages_splits_at_size_limit():
+    sink = CollectingSink()
+    config = FirehoseConfig(buffer_count_limit=-1, buffer_time_limit=-1, buffer_size_limit_mb=1)
+    firehose = MiniFirehose(name="test_firehose", sinks=[sink], config=config)
+    half_mb = "x" * (512 * 1024)
+    assert firehose.add_messages([half_mb] * 5) == 5
+    firehose.stop()
+    assert [len(batch) for batch in sink.batches] == [2, 2, 1]
+
+
+def test_add_messages_returns_accepted_count_on_reject(slow_sink):
+    config = FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                            max_in_flight_batches=1, backpressure_policy="reject")
+    firehose = MiniFirehose(name="test_firehose", sinks=[slow_sink], config=config)
+    assert firehose.add_messages(({"data": i} for i in range(30)), chunk_size=10) == 10
+    slow_sink.release.set()
+    firehose.stop()
+
+
+def test_add_messages_with_schema_rejects_bad_message():
+    sink = CollectingSink()
+    config = FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                            schema={"seq": "int64"})
+    firehose = MiniFirehose(name="test_firehose", sinks=[sink], config=config)
+    assert firehose.add_messages([{"seq": 1}, {"seq": 2}, {"seq": "three"}, {"seq": 4}]) == 2
+    assert firehose.buffer_count == 2
+    firehose.stop()
+    assert sink.batches == [[{"seq": 1}, {"seq": 2}]]
+
+
+def test_add_messages_with_schema_counts_earlier_chunks():
+    sink = CollectingSink()
+    config = FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                            schema={"seq": "int64"})
+    firehose = MiniFirehose(name="test_firehose", sinks=[sink], config=config)
+    messages = [{"seq": i} for i in range(12)] + [{"seq": "twelve"}, {"seq": 13}]
+    assert firehose.add_messages(messages, chunk_size=5) == 12
+    firehose.stop()
+    assert [len(batch) for batch in sink.batches] == [10, 2]
@@ -0,0 +1,164 @@
+import threading
+import time
+
+import pytest
+
+from mini_firehose.dead_letter import DeadLetterSpool
+from mini_firehose.mini_firehose import FirehoseConfig, MiniFirehose
+from mini_firehose.retry import RetryPolicy, RetryBudget
+from sinks.sink import Sink
+
+
+class FlakySink(Sink):
+    def __init__(self, failures=0, retry_policy=None):
+        self.failures = failures
+        self.retry_policy = retry_policy
+        self.attempts = 0
+        self.records = []
+        self.delivered = threading.Event()
+
+    def deliver(self, data, filename=None):
+        self.attempts += 1
+        if self.failures < 0 or self.attempts <= self.failures:
+            raise IOError("Sink unavailable")
+        self.records.extend(data)
+        self.delivered.set()
+
+
+def retry_config(tmp_path=None, **kwargs):
+    return FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                          dead_letter_directory=str(tmp_path) if tmp_path else None, **kwargs)
+
+
+def fast_policy(max_attempts=3, **kwargs):
+    return RetryPolicy(max_attempts=max_attempts, base_delay=0.01, max_delay=0.02, **kwargs)
+
+
+def test_policy_delay_is_bounded():
+    policy = RetryPolicy(base_delay=1, max_delay=4)
+    for attempt in range(1, 10):
+        assert 0 <= policy.delay(attempt) <= min(4, 2 ** (attempt - 1))
+
+
+def test_policy_validation():
+    with pytest.raises(ValueError):
+        RetryPolicy(max_attempts=0)
+    with pytest.raises(ValueError):
+        RetryPolicy(base_delay=2, max_delay=1)
+
+
+def test_budget_is_replenished_by_successes():
+    budget = RetryBudget(RetryPolicy(budget_ratio=0.5, budget_reserve=1))
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+    budget.record_success()
+    budget.record_success()
+    assert budget.try_acquire()
+
+
+def test_flaky_sink_succeeds_after_retries():
+    sink = FlakySink(failures=2)
+    firehose = MiniFirehose("retry", [sink], retry_config(retry_policy=fast_policy()))
+    for i in range(10):
+        firehose.add_message({"data": i})
+    assert sink.delivered.wait(2)
+    firehose.stop()
+    assert sink.attempts == 3
+    assert sink.records == [{"data": i} for i in range(10)]
+
+
+class TransformingSink(FlakySink):
+    def deliver(self, data, filename=None):
+        super().deliver(self._prepare_frame(data).to_dict("records"), filename)
+
+
+def drop_value(df):
+    # Changes the frame it gets in place
+    df.pop("v")
+    df["doubled"] = df["data"] * 2
+    return df
+
+
+@pytest.mark.parametrize("schema", [None, {"data": "int64", "v": "str"}])
+def test_retry_does_not_see_a_transformed_frame(tmp_path, schema):
+    sink = TransformingSink(failures=1)
+    sink.transformation_callback = drop_value
+    firehose = MiniFirehose("transform", [sink], retry_config(retry_policy=fast_policy(), schema=schema))
+    for i in range(10):
+        firehose.add_message({"data": i, "v": "x"})
+    assert sink.delivered.wait(2)
+    firehose.stop()
+    assert sink.attempts == 2
+    assert sink.records == [{"data": i, "doubled": i * 2} for i in range(10)]
+
+
+def test_dead_letters_of_a_columnar_batch_are_not_transformed(tmp_path):
+    sink = TransformingSink(failures=-1, retry_policy=fast_policy(max_attempts=1))
+    sink.transformation_callback = drop_value
+    firehose = MiniFirehose("transform", [sink], retry_config(tmp_path, schema={"data": "int64", "v": "str"}))
+    for i in range(10):
+        firehose.add_message({"data": i, "v": "x"})
+    deadline = time.time() + 2
+    while not firehose.dead_letters.entries() and time.time() < deadline:
+        time.sleep(0.01)
+    [(_, path)] = firehose.dead_letters.entries(0)
+    assert firehose.dead_letters.read(path) == [{"data": i, "v": "x"} for i in range(10)]
+    firehose.stop()
+
+
+def test_exhausted_batch_is_spooled_and_redriven(tmp_path):
+    sink = FlakySink(failures=-1, retry_policy=fast_policy())
+    firehose = MiniFirehose("dlq", [sink], retry_config(tmp_path))
+    for i in range(10):
+        firehose.add_message({"data": i})
+    deadline = time.time() + 2
+    while not firehose.dead_letters.entries() and time.time() < deadline:
+        time.sleep(0.01)
+    assert sink.attempts == 3
+    assert len(firehose.dead_letters.entries(0)) == 1
+
+    sink.failures = 0
+    assert firehose.redrive() == {"redriven": 1, "failed": 0}
+    assert sink.records == [{"data": i} for i in range(10)]
+    assert firehose.dead_letters.entries() == []
+    firehose.stop()
+
+
+def test_failing_sink_does_not_block_other_sinks(tmp_path):
+    failing = FlakySink(failures=-1, retry_policy=RetryPolicy(max_attempts=5, base_delay=10, max_delay=10))
+    healthy = FlakySink()
+    firehose = MiniFirehose("isolated", [failing, healthy], retry_config(tmp_path))
+    for i in range(30):
+        firehose.add_message({"data": i})
+    deadline = time.time() + 2
+    while len(healthy.records) < 30 and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(healthy.records) == 30
+    assert len(firehose.retry_tasks) == 3
+
+    # Stopping gives the pending retries one last attempt and spools what still fails
+    firehose.stop()
+    assert firehose.retry_tasks == {}
+    assert len(firehose.dead_letters.entries(0)) == 3
+
+
+def test_budget_limits_retries(tmp_path):
+    sink = FlakySink(failures=-1, retry_policy=fast_policy(max_attempts=5, budget_reserve=2))
+    firehose = MiniFirehose("budget", [sink], retry_config(tmp_path))
+    for i in range(10):
+        firehose.add_message({"data": i})
+    deadline = time.time() + 2
+    while not firehose.dead_letters.entries() and time.time() < deadline:
+        time.sleep(0.01)
+    firehose.stop()
+    assert sink.attempts == 3
+
+
+def test_spool_round_trip(tmp_path):
+    spool = DeadLetterSpool(str(tmp_path))
+    first = spool.spool(1, [{"data": 1}])
+    second = spool.spool(0, ["message"])
+    assert spool.entries() == [(1, first), (0, second)]
+    assert spool.read(first) == [{"data": 1}]
+    spool.remove(first)
+    assert spool.entries() == [(0, second)]
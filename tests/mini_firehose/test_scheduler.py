@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+
+from mini_firehose.scheduler import FlushScheduler, LoopScheduler
+
+
+def test_tasks_fire_in_deadline_order():
+    scheduler = FlushScheduler()
+    fired = []
+    done = threading.Event()
+    scheduler.schedule(0.2, lambda: (fired.append("late"), done.set()))
+    scheduler.schedule(0.05, lambda: fired.append("early"))
+    assert done.wait(2)
+    assert fired == ["early", "late"]
+
+
+def test_task_fires_when_due():
+    scheduler = FlushScheduler()
+    fired_at = []
+    done = threading.Event()
+    scheduled_at = time.monotonic()
+    scheduler.schedule(0.1, lambda: (fired_at.append(time.monotonic()), done.set()))
+    assert done.wait(2)
+    # Never early, the upper bound leaves room for a loaded machine
+    assert 0.1 <= fired_at[0] - scheduled_at < 1
+
+
+def test_cancelled_task_does_not_fire():
+    scheduler = FlushScheduler()
+    fired = []
+    task = scheduler.schedule(0.05, lambda: fired.append("cancelled"))
+    scheduler.cancel(task)
+    time.sleep(0.15)
+    assert fired == []
+    assert scheduler.pending() == 0
+
+
+def test_single_thread_serves_many_tasks():
+    scheduler = FlushScheduler()
+    done = threading.Semaphore(0)
+    threads_before = threading.active_count()
+    for i in range(100):
+        scheduler.schedule(0.01 * (i % 5), done.release)
+    for _ in range(100):
+        assert done.acquire(timeout=2)
+    assert threading.active_count() <= threads_before + 1
+
+
+def test_failing_task_does_not_stop_scheduler():
+    scheduler = FlushScheduler()
+    done = threading.Event()
+    scheduler.schedule(0, lambda: 1 / 0)
+    scheduler.schedule(0.02, done.set)
+    assert done.wait(2)
+
+
+def test_loop_scheduler_runs_callbacks_on_the_loop():
+    async def main():
+        scheduler = LoopScheduler(asyncio.get_running_loop())
+        fired = []
+        # Scheduled and cancelled from another thread, like retries scheduled by delivery threads
+        thread = threading.Thread(target=lambda: (
+            scheduler.schedule(0.05, lambda: fired.append(threading.current_thread().name)),
+            scheduler.cancel(scheduler.schedule(0.01, lambda: fired.append("cancelled")))))
+        thread.start()
+        thread.join()
+        assert scheduler.pending() == 1
+        await asyncio.sleep(0.2)
+        assert fired == [threading.current_thread().name]
+        assert scheduler.pending() == 0
+
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+from mini_firehose.mini_firehose import FirehoseConfig
+from mini_firehose.sharded import ShardedMiniFirehose
+from sinks.local.local_sink import LocalSink
+from sinks.sink import Sink
+
+
+class CollectingSink(Sink):
+    def __init__(self):
+        self.batches = []
+        self.starts = 0
+        self.stops = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.starts += 1
+
+    def stop(self):
+        self.stops += 1
+
+    def deliver(self, data, filename=None):
+        with self.lock:
+            self.batches.append(list(data))
+
+
+def count_config():
+    return FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1)
+
+
+def test_round_robin_spreads_chunks():
+    sink = CollectingSink()
+    firehose = ShardedMiniFirehose("test", [sink], count_config(), shards=3)
+    firehose.start()
+    assert firehose.add_messages([{"id": i} for i in range(25)], chunk_size=5) == 25
+    # Chunks go to shards 0, 1, 2, 0, 1, the first two shards reached their count limit and flushed
+    assert [shard.buffer_count for shard in firehose.shards] == [0, 0, 5]
+    firehose.stop()
+
+    assert sorted(record["id"] for batch in sink.batches for record in batch) == list(range(25))
+    assert sink.starts == 1 and sink.stops == 1
+
+
+def test_hash_keeps_a_key_on_one_shard():
+    sink = CollectingSink()
+    firehose = ShardedMiniFirehose("test", [sink], count_config(), shards=4, shard_strategy="hash", shard_key="user")
+    firehose.start()
+    messages = [{"user": f"user-{i % 7}", "id": i} for i in range(100)]
+    assert firehose.add_messages(messages[:50]) == 50
+    for message in messages[50:]:
+        firehose.add_message(message)
+    firehose.stop()
+
+    users = {}
+    for batch in sink.batches:
+        for record in batch:
+            users.setdefault(record["user"], set()).add(firehose.shard_index(record))
+    assert all(len(shards) == 1 for shards in users.values())
+    assert len({shard for shards in users.values() for shard in shards}) > 1
+    assert sum(len(batch) for batch in sink.batches) == 100
+
+
+def test_hash_counts_messages_before_the_first_rejection():
+    sink = CollectingSink()
+    config = FirehoseConfig(buffer_count_limit=100, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                            schema={"user": "str", "id": "int64"})
+    firehose = ShardedMiniFirehose("test", [sink], config, shards=4, shard_strategy="hash", shard_key="user")
+    messages = [{"user": f"user-{i % 7}", "id": i} for i in range(40)]
+    messages[25]["id"] = "twenty-five"
+    bad_shard = firehose.shard_index(messages[25])
+    assert firehose.add_messages(messages) == 25
+    buffered = sorted(row for shard in firehose.shards for row in shard.buffer.to_frame()["id"])
+    # Every message before the rejected one is buffered, its shard stopped there
+    assert buffered[:25] == list(range(25))
+    assert not any(firehose.shard_index(messages[row]) == bad_shard for row in buffered[25:])
+    firehose.stop()
+
+
+def test_callable_shard_key():
+    firehose = ShardedMiniFirehose("test", [CollectingSink()], count_config(), shards=8, shard_strategy="hash",
+                                   shard_key=lambda message: message[:1])
+    assert firehose.shard_index("abc") == firehose.shard_index("axy")
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"shards": 0},
+    {"shard_strategy": "random"},
+    {"shard_strategy": "hash"},
+    {"encode_processes": -1},
+])
+def test_validation(kwargs):
+    with pytest.raises(ValueError):
+        ShardedMiniFirehose("test", [CollectingSink()], count_config(), **kwargs)
+
+
+@pytest.mark.parametrize("output_format", ["json", "parquet"])
+def test_files_are_encoded_in_a_process_pool(tmp_path, output_format):
+    sink = LocalSink(str(tmp_path), output_format, partition_cols=["Region"], compression="gzip")
+    firehose = ShardedMiniFirehose("test", [sink], count_config(), shards=2, encode_processes=1)
+    firehose.start()
+    assert sink.handler.encode_pool is not None
+    firehose.add_messages([{"Region": ["East", "West"][i % 2], "id": i} for i in range(40)], chunk_size=10)
+    firehose.stop()
+    assert sink.handler.encode_pool is None
+
+    files = [os.path.join(root, name) for root, _, names in os.walk(tmp_path) for name in names]
+    df = pd.concat([sink.handler._read_data(path) for path in files])
+    assert list(df.columns) == ["id"]
+    assert sorted(df["id"]) == list(range(40))
+
+
+def test_stats_cover_every_shard():
+    sink = CollectingSink()
+    firehose = ShardedMiniFirehose("test_stats", [sink], count_config(), shards=2)
+    firehose.start()
+    firehose.add_messages([{"id": i} for i in range(15)], chunk_size=5)
+    stats = firehose.stats()
+    firehose.stop()
+
+    assert stats["buffer-count"] == 5
+    assert [shard["buffer-count"] for shard in stats["shards"]] == [0, 5]
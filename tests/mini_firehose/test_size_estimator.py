@@ -0,0 +1,71 @@
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from mini_firehose.size_estimator import EncodedSizeEstimator, SampledSizeEstimator, encode_json
+from sinks.local.local_sink import LocalSink
+
+
+@pytest.fixture
+def sample_data():
+    return [
+        {'Salesperson': f'Alice-{i:04d}', 'Region': ['East', 'North', 'South', 'West'][i % 4], 'SalesAmount': 1000 + i % 1000}
+        for i in range(2000)
+    ]
+
+
+def test_encoded_size_is_exact():
+    estimator = EncodedSizeEstimator()
+    assert estimator.estimate(b"abc") == 3
+    assert estimator.estimate("abc") == 3
+    assert estimator.estimate("héllo") == len("héllo".encode("utf-8"))
+    assert estimator.estimate({"a": 1}) == len(b'{"a":1}')
+
+
+def test_sampled_estimator_encodes_one_in_n_messages():
+    encoder = MagicMock(side_effect=encode_json)
+    estimator = SampledSizeEstimator(sample_every=10, encoder=encoder)
+    for i in range(10000):
+        estimator.estimate({"data": "message-" + str(i)})
+    assert 800 < encoder.call_count < 1200
+
+
+def test_sampled_estimator_measures_serialized_messages_exactly():
+    estimator = SampledSizeEstimator()
+    assert estimator.estimate("x" * 1024) == 1024
+    assert estimator.estimate(b"x" * 10) == 10
+
+
+def test_sampled_estimator_scales_with_field_count():
+    estimator = SampledSizeEstimator(sample_every=1000)
+    first = estimator.estimate({"a": "value", "b": "value"})
+    assert estimator.estimate({"a": "value", "b": "value", "c": "value", "d": "value"}) == 2 * first
+
+
+def test_estimate_matches_json_output_size(tmp_path, sample_data):
+    estimator = SampledSizeEstimator()
+    estimated = sum(estimator.estimate(message) for message in sample_data)
+    LocalSink(tmp_path, 'json').deliver(sample_data, "test.json")
+    actual = os.path.getsize(os.path.join(tmp_path, "test.json"))
+    assert abs(estimated - actual) / actual < 0.05
+
+
+def test_scaled_estimate_matches_csv_output_size(tmp_path, sample_data):
+    LocalSink(tmp_path, 'csv').deliver(sample_data[:100], "calibration.csv")
+    LocalSink(tmp_path, 'json').deliver(sample_data[:100], "calibration.json")
+    scale = os.path.getsize(tmp_path / "calibration.csv") / os.path.getsize(tmp_path / "calibration.json")
+
+    estimator = SampledSizeEstimator(scale=scale)
+    estimated = sum(estimator.estimate(message) for message in sample_data)
+    LocalSink(tmp_path, 'csv').deliver(sample_data, "test.csv")
+    actual = os.path.getsize(os.path.join(tmp_path, "test.csv"))
+    assert abs(estimated - actual) / actual < 0.05
+
+
+def test_estimate_many_matches_per_message_estimate(sample_data):
+    single = SampledSizeEstimator()
+    batch = SampledSizeEstimator()
+    per_message = sum(single.estimate(message) for message in sample_data)
+    batched = sum(batch.estimate_many(sample_data))
+    assert abs(per_message - batched) / per_message < 0.05
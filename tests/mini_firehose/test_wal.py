@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+
+import pytest
+
+from mini_firehose.mini_firehose import FirehoseConfig, MiniFirehose
+from mini_firehose.wal import WriteAheadLog
+from sinks.sink import Sink
+
+
+class CollectingSink(Sink):
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.records = []
+
+    def deliver(self, data, filename=None):
+        if self.fail:
+            raise IOError("Sink unavailable")
+        self.records.extend(data)
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".wal"))
+
+
+def wal_config(tmp_path, **kwargs):
+    return FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                          wal_directory=str(tmp_path), **kwargs)
+
+
+@pytest.mark.parametrize("fsync_policy", ["always", "group", "interval"])
+def test_append_roll_and_recover(tmp_path, fsync_policy):
+    wal = WriteAheadLog(str(tmp_path), fsync_policy=fsync_policy, fsync_interval=0.05)
+    wal.append([wal.encode({"data": 1}), wal.encode({"data": 2})])
+    wal.commit()
+    sealed = wal.roll()
+    wal.append([wal.encode("message")])
+    wal.close()
+
+    recovered = WriteAheadLog(str(tmp_path))
+    assert recovered.recovered == [sealed, sealed + 1]
+    assert recovered.read_segment(sealed) == [{"data": 1}, {"data": 2}]
+    assert recovered.read_segment(sealed + 1) == ["message"]
+    recovered.close()
+
+
+def test_roll_of_empty_segment(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    assert wal.roll() is None
+    wal.close()
+    assert segment_files(tmp_path) == []
+
+
+def test_roll_leaves_the_fsync_to_seal(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), fsync_policy="group")
+    wal.append([wal.encode({"data": 1})])
+    # A group fsync is running, rolling must not wait for it
+    with wal.sync_condition:
+        wal.syncing = True
+    rolled = []
+    roller = threading.Thread(target=lambda: rolled.append(wal.roll()))
+    roller.start()
+    roller.join(1)
+    assert rolled == [1]
+    assert 1 in wal.sealing
+    with wal.sync_condition:
+        wal.syncing = False
+        wal.sync_condition.notify_all()
+
+    # Commits cover records appended before the roll
+    wal.append([wal.encode({"data": 2})])
+    wal.commit()
+    assert os.path.getsize(os.path.join(tmp_path, segment_files(tmp_path)[0])) > 0
+    wal.seal(1)
+    wal.seal(1)
+    assert wal.sealing == {}
+    wal.close()
+    recovered = WriteAheadLog(str(tmp_path))
+    assert recovered.read_segment(1) == [{"data": 1}]
+    recovered.close()
+
+
+def recording_fsync(monkeypatch):
+    # Records the thread of every fsync
+    threads = []
+    fsync = os.fsync
+
+    def record(descriptor):
+        threads.append(threading.current_thread().name)
+        fsync(descriptor)
+
+    monkeypatch.setattr(os, "fsync", record)
+    return threads
+
+
+def test_always_syncs_on_commit_not_on_append(tmp_path, monkeypatch):
+    threads = recording_fsync(monkeypatch)
+    wal = WriteAheadLog(str(tmp_path), fsync_policy="always")
+    wal.append([wal.encode({"data": 1})])
+    wal.append([wal.encode({"data": 2})])
+    assert threads == []
+    wal.commit()
+    assert len(threads) == 1
+    assert wal.synced == wal.written == 2
+    wal.close()
+
+
+def test_interval_sync_runs_on_its_own_thread(tmp_path, monkeypatch):
+    threads = recording_fsync(monkeypatch)
+    wal = WriteAheadLog(str(tmp_path), fsync_policy="interval", fsync_interval=0.01)
+    wal.append([wal.encode({"data": 1})])
+    wal.commit()
+    deadline = time.time() + 2
+    while wal.synced < wal.written and time.time() < deadline:
+        time.sleep(0.01)
+    assert wal.synced == 1
+    assert set(threads) == {"wal-fsync"}
+    wal.close()
+
+
+def test_checkpoint_removes_segment(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.append([wal.encode({"data": 1})])
+    sealed = wal.roll()
+    wal.checkpoint(sealed)
+    wal.close()
+    assert segment_files(tmp_path) == []
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    wal = WriteAheadLog(str(tmp_path))
+    wal.append([wal.encode({"data": 1})])
+    wal.close()
+    with open(os.path.join(tmp_path, segment_files(tmp_path)[0]), "ab") as segment:
+        segment.write(b'{"data":')
+    recovered = WriteAheadLog(str(tmp_path))
+    assert recovered.read_segment(recovered.recovered[0]) == [{"data": 1}]
+    recovered.close()
+
+
+def test_group_commit_with_concurrent_producers(tmp_path):
+    wal = WriteAheadLog(str(tmp_path), fsync_policy="group")
+    lock = threading.Lock()
+
+    def produce():
+        for i in range(200):
+            with lock:
+                wal.append([wal.encode({"data": i})])
+            wal.commit()
+
+    producers = [threading.Thread(target=produce) for _ in range(8)]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    assert wal.synced == wal.written == 1600
+    wal.close()
+
+
+def test_unflushed_messages_are_replayed_after_crash(tmp_path):
+    crashed = MiniFirehose(name="test_firehose", sinks=[CollectingSink()], config=wal_config(tmp_path))
+    crashed.add_messages({"data": i} for i in range(5))
+    # The process dies without stopping the firehose
+
+    sink = CollectingSink()
+    firehose = MiniFirehose(name="test_firehose", sinks=[sink], config=wal_config(tmp_path))
+    firehose.start()
+    firehose.stop()
+    assert sink.records == [{"data": i} for i in range(5)]
+    assert segment_files(tmp_path / "test_firehose") == []
+
+
+def test_failed_delivery_keeps_segment_for_replay(tmp_path):
+    firehose = MiniFirehose(name="test_firehose", sinks=[CollectingSink(fail=True)], config=wal_config(tmp_path))
+    firehose.start()
+    firehose.add_messages({"data": i} for i in range(10))
+    firehose.stop()
+    assert len(segment_files(tmp_path / "test_firehose")) == 1
+
+    sink = CollectingSink()
+    firehose = MiniFirehose(name="test_firehose", sinks=[sink], config=wal_config(tmp_path))
+    firehose.start()
+    firehose.stop()
+    assert sink.records == [{"data": i} for i in range(10)]
+    assert segment_files(tmp_path / "test_firehose") == []
+
+
+def test_delivered_segments_are_checkpointed(tmp_path):
+    sink = CollectingSink()
+    firehose = MiniFirehose(name="test_firehose", sinks=[sink], config=wal_config(tmp_path))
+    firehose.start()
+    for i in range(25):
+        firehose.add_message({"data": i})
+    firehose.stop()
+    assert len(sink.records) == 25
+    assert segment_files(tmp_path / "test_firehose") == []
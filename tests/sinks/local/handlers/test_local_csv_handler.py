@@ -41,10 +41,11 @@ def test_write_csv_file_with_name(mock_to_csv, local_csv_handler, sample_data):
     mock_to_csv.assert_called_with(os.path.join(local_csv_handler._get_directory(), filename), index=False)
 
 
-@patch('common.handler.datetime')
+@patch('common.FileNameGenerator.datetime')
 @patch("pandas.DataFrame.to_csv")
-def test_generate_filename_based_on_datetime(mock_to_csv, mock_datetime, local_csv_handler, sample_data):
+def test_generate_filename_based_on_datetime(mock_to_csv, mock_datetime, tmp_path, sample_data):
     mock_datetime.now.return_value = datetime(2023, 1, 1, 12, 0, 0)
+    local_csv_handler = LocalCSVHandler(tmp_path, filename_based_on='datetime')
     local_csv_handler.write(sample_data)
     mock_to_csv.assert_called_with(os.path.join(local_csv_handler._get_directory(), '20230101120000.csv'), index=False)
 
@@ -1,21 +1,26 @@
 import os
+import shutil
 from datetime import datetime
 
+import pandas as pd
 import pytest
+
+from common.handler import PartitionWriteError
+from sinks.local.handlers.local_csv_handler import LocalCSVHandler
 from sinks.local.handlers.local_handler import LocalHandler
 from unittest.mock import patch
 
 
 @pytest.fixture()
 def local_handler(tmp_path):
-    return LocalHandler(tmp_path, 'csv')
+    return LocalHandler(tmp_path, 'csv', filename_based_on='datetime')
 
 
 def test_base_directory(tmp_path, local_handler):
     assert local_handler._get_directory() == tmp_path
 
 
-@patch('common.handler.datetime')
+@patch('common.FileNameGenerator.datetime')
 def test_get_file_path_with_no_name(mock_datetime, local_handler):
     mock_datetime.now.return_value = datetime(2023, 1, 1, 12, 0, 0)
     expected_file_path = os.path.join(local_handler._get_directory(), '20230101120000.csv')
@@ -27,26 +32,61 @@ def test_get_file_path_with_name(local_handler):
     assert local_handler.get_file_path('test.csv') == expected_file_path
 
 
-@patch('common.handler.datetime')
+@patch('common.FileNameGenerator.datetime')
 def test_get_partition_path_single_level(mock_datetime, tmp_path):
     mock_datetime.now.return_value = datetime(2023, 1, 1, 12, 0, 0)
     filename = "20230101120000.csv"
     partition_cols = ["Region"]
-    local_handler = LocalHandler(tmp_path, 'csv', partition_cols=partition_cols)
+    local_handler = LocalHandler(tmp_path, 'csv', partition_cols=partition_cols, filename_based_on='datetime')
     expected_path = os.path.join(local_handler._get_directory(), "Region=North", filename)
     assert expected_path == local_handler.get_partition_path("North")
 
 
-@patch('common.handler.datetime')
+@patch('common.FileNameGenerator.datetime')
 def test_get_partition_path_multi_level(mock_datetime, tmp_path):
     mock_datetime.now.return_value = datetime(2023, 1, 1, 12, 0, 0)
     filename = "20230101120000.csv"
     partition_cols = ["Region", "SalePerson"]
-    local_handler = LocalHandler(tmp_path, 'csv', partition_cols=partition_cols)
+    local_handler = LocalHandler(tmp_path, 'csv', partition_cols=partition_cols, filename_based_on='datetime')
     expected_path = os.path.join(local_handler._get_directory(), "Region=North", "SalePerson=John", filename)
     assert expected_path == local_handler.get_partition_path(("North", "John"))
 
     partition_cols = ["A", "B", "C"]
-    local_handler = LocalHandler(tmp_path, 'csv', partition_cols=partition_cols)
+    local_handler = LocalHandler(tmp_path, 'csv', partition_cols=partition_cols, filename_based_on='datetime')
     expected_path = os.path.join(local_handler._get_directory(), "A=a", "B=b", "C=c", filename)
-    assert expected_path == local_handler.get_partition_path(("a", "b", "c"))
\ No newline at end of file
+    assert expected_path == local_handler.get_partition_path(("a", "b", "c"))
+
+
+@pytest.fixture
+def partitioned_data():
+    return pd.DataFrame({"Region": ["East", "West", "North", "East"], "SalesAmount": [1, 2, 3, 4]})
+
+
+def test_known_partition_directories_are_not_created_again(tmp_path, partitioned_data):
+    local_handler = LocalCSVHandler(tmp_path, partition_cols=["Region"])
+    local_handler.write(partitioned_data)
+    with patch('os.makedirs') as mock_makedirs, patch('os.path.exists') as mock_exists:
+        local_handler.write(partitioned_data)
+    mock_makedirs.assert_not_called()
+    mock_exists.assert_not_called()
+
+
+def test_partition_directory_cache_is_bounded(tmp_path, partitioned_data):
+    local_handler = LocalCSVHandler(tmp_path, partition_cols=["Region"])
+    local_handler.directory_cache_size = 2
+    local_handler.write(partitioned_data)
+    assert len(local_handler.known_directories) == 2
+    with patch('os.makedirs') as mock_makedirs:
+        local_handler.get_partition_path("East")
+    mock_makedirs.assert_called_once_with(os.path.join(tmp_path, "Region=East"), exist_ok=True)
+
+
+def test_removed_partition_directory_is_recreated(tmp_path, partitioned_data):
+    local_handler = LocalCSVHandler(tmp_path, partition_cols=["Region"], filename_based_on='epoch')
+    local_handler.write(partitioned_data)
+    shutil.rmtree(os.path.join(tmp_path, "Region=West"))
+    with pytest.raises(PartitionWriteError):
+        local_handler.write(partitioned_data)
+    results = local_handler.write(partitioned_data)
+    assert all(result.ok for result in results)
+    assert os.listdir(os.path.join(tmp_path, "Region=West"))
@@ -1,6 +1,7 @@
 import os
 import pandas as pd
 import pytest
+from common.batch import Batch
 from sinks.local.local_sink import LocalSink
 from unittest.mock import patch
 
@@ -26,7 +27,7 @@ def sample_data():
 @patch("pandas.DataFrame.to_csv")
 def test_deliver(mock_to_csv, tmp_path, local_sink, sample_data):
         filename = "test.csv"
-        local_sink.deliver(sample_data, filename)
+        local_sink.deliver(pd.DataFrame(sample_data), filename)
         mock_to_csv.assert_called_with(os.path.join(tmp_path, filename), index=False)
 
 
@@ -52,3 +53,85 @@ def test_transformation(tmp_path, sample_data):
 
     assert expected_df.shape == actual_df.shape, "DataFrames have different shapes."
     pd.testing.assert_frame_equal(expected_df, actual_df)
+
+
+def test_transformation_does_not_leak_into_shared_batch(tmp_path, sample_data):
+    def transformation_callback(df):
+        df["new_column"] = 1
+        df.loc[0, "SalesAmount"] = 0
+        return df
+
+    batch = Batch(sample_data)
+    batch.expect(2)
+    transforming_sink = LocalSink(tmp_path / "transformed", 'csv', transformation_callback=transformation_callback)
+    plain_sink = LocalSink(tmp_path / "plain", 'csv')
+    transforming_sink.deliver(batch, "test.csv")
+    plain_sink.deliver(batch, "test.csv")
+
+    pd.testing.assert_frame_equal(batch.frame(), pd.DataFrame(sample_data))
+    actual_df = pd.read_csv(os.path.join(tmp_path, "plain", "test.csv"))
+    pd.testing.assert_frame_equal(pd.DataFrame(sample_data), actual_df)
+
+
+@pytest.mark.parametrize("output_format, compression, suffix", [
+    ("csv", "gzip", ".csv.gz"),
+    ("json", "zstd", ".json.zst"),
+    ("json", "lz4", ".json.lz4"),
+    ("parquet", "zstd", ".parquet"),
+])
+def test_compression(tmp_path, sample_data, output_format, compression, suffix):
+    local_sink = LocalSink(str(tmp_path), output_format, partition_cols=["Region"], compression=compression)
+    results = local_sink.deliver(sample_data)
+
+    assert len(results) == 4
+    assert all(result.path.endswith(suffix) for result in results)
+    actual = pd.concat([local_sink.handler._read_data(result.path) for result in results], ignore_index=True)
+    assert sorted(actual["SalesAmount"]) == sorted(record["SalesAmount"] for record in sample_data)
+
+
+def test_compressed_streaming_writers_and_compaction(tmp_path, sample_data):
+    from sinks.compaction import CompactionConfig
+    from sinks.local.appenders import StreamingWriterConfig
+
+    local_sink = LocalSink(str(tmp_path), "csv", compression="gzip", compression_level=9,
+                           streaming_writers=StreamingWriterConfig(roll_size_mb=0.0001),
+                           compaction=CompactionConfig(min_file_age=0, interval=-1))
+    # Every flush is larger than the roll size, so each one is committed to its own file
+    for _ in range(3):
+        local_sink.deliver(sample_data)
+    assert len(os.listdir(tmp_path)) == 3
+
+    assert local_sink.compact()["files-written"] == 1
+    files = os.listdir(tmp_path)
+    assert len(files) == 1 and files[0].endswith(".csv.gz")
+    actual = local_sink.handler._read_data(os.path.join(tmp_path, files[0]))
+    assert len(actual) == 3 * len(sample_data)
+
+
+def test_invalid_compression(tmp_path):
+    with pytest.raises(ValueError) as ex:
+        LocalSink(tmp_path, 'csv', compression='snappy')
+    assert "Unsupported compression for csv: snappy" in str(ex.value)
+
+
+@pytest.mark.parametrize("output_format", ["csv", "json"])
+@patch("pandas.DataFrame.to_json")
+@patch("pandas.DataFrame.to_csv")
+def test_records_are_written_without_pandas(mock_to_csv, mock_to_json, tmp_path, sample_data, output_format):
+    local_sink = LocalSink(str(tmp_path), output_format, partition_cols=["Region"])
+    results = local_sink.deliver(Batch(sample_data))
+    mock_to_csv.assert_not_called()
+    mock_to_json.assert_not_called()
+
+    assert [result.partition for result in results] == [{"Region": region} for region in ["East", "North", "South", "West"]]
+    actual = local_sink.handler._read_data(results[0].path)
+    pd.testing.assert_frame_equal(actual, pd.DataFrame(sample_data[:2]).drop(columns=["Region"]))
+
+
+@pytest.mark.parametrize("output_format", ["csv", "json"])
+def test_records_match_the_pandas_output(tmp_path, sample_data, output_format):
+    local_sink = LocalSink(str(tmp_path), output_format)
+    local_sink.deliver(sample_data, "records")
+    local_sink.deliver(pd.DataFrame(sample_data), "frame")
+    pd.testing.assert_frame_equal(local_sink.handler._read_data(os.path.join(tmp_path, "records")),
+                                  local_sink.handler._read_data(os.path.join(tmp_path, "frame")))
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from mini_firehose.mini_firehose import FirehoseConfig, MiniFirehose
+from sinks.local.appenders import StreamingWriterConfig
+from sinks.local.local_sink import LocalSink
+
+
+def sample_batch(start, count=10):
+    return [{"Region": ["East", "West"][i % 2], "id": i, "name": f"name-{i}"} for i in range(start, start + count)]
+
+
+def committed_files(directory):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names
+                  if not name.startswith("."))
+
+
+def read_ids(sink, files):
+    return sorted(pd.concat([sink.handler._read_data(path) for path in files])["id"])
+
+
+@pytest.mark.parametrize("output_format", ["csv", "json", "parquet"])
+def test_flushes_are_appended_to_one_file_per_partition(tmp_path, output_format):
+    sink = LocalSink(str(tmp_path), output_format, partition_cols=["Region"],
+                     streaming_writers=StreamingWriterConfig())
+    results = []
+    for start in range(0, 50, 10):
+        results.extend(sink.deliver(sample_batch(start)))
+    # Files are hidden until they are committed
+    assert committed_files(tmp_path) == []
+    sink.stop()
+
+    files = committed_files(tmp_path)
+    assert [os.path.basename(os.path.dirname(path)) for path in files] == ["Region=East", "Region=West"]
+    assert sorted({result.path for result in results}) == files
+    assert read_ids(sink, files) == list(range(50))
+
+
+def test_unpartitioned_files_roll_on_size(tmp_path):
+    sink = LocalSink(str(tmp_path), "csv", streaming_writers=StreamingWriterConfig(roll_size_mb=0.0003))
+    for start in range(0, 60, 10):
+        sink.deliver(sample_batch(start))
+    # Rolled once a file reached about 315 bytes, that is after every second flush
+    assert len(committed_files(tmp_path)) == 3
+    sink.stop()
+    files = committed_files(tmp_path)
+    assert len(files) == 3
+    assert read_ids(sink, files) == list(range(60))
+
+
+def test_idle_files_roll_on_age(tmp_path):
+    sink = LocalSink(str(tmp_path), "json", streaming_writers=StreamingWriterConfig(roll_interval=0.1))
+    sink.deliver(sample_batch(0))
+    deadline = time.time() + 2
+    while not committed_files(tmp_path) and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(committed_files(tmp_path)) == 1
+    assert sink.handler.appenders == {}
+
+
+def test_idle_files_are_not_rolled_on_the_scheduler_thread(tmp_path):
+    sink = LocalSink(str(tmp_path), "csv", streaming_writers=StreamingWriterConfig(roll_interval=0.1))
+    sink.deliver(sample_batch(0))
+    appender = next(iter(sink.handler.appenders.values()))
+    threads = []
+    appender.when_committed(lambda: threads.append(threading.current_thread().name))
+    deadline = time.time() + 2
+    while not threads and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(threads) == 1
+    assert threads[0].startswith("partition-writer")
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_schema_change_rolls_the_file(tmp_path, output_format):
+    sink = LocalSink(str(tmp_path), output_format, streaming_writers=StreamingWriterConfig())
+    sink.deliver(sample_batch(0))
+    sink.deliver([{"id": 100, "city": "Berlin"}])
+    sink.stop()
+    assert len(committed_files(tmp_path)) == 2
+
+
+def test_open_files_are_bounded(tmp_path):
+    sink = LocalSink(str(tmp_path), "parquet", partition_cols=["Region"],
+                     streaming_writers=StreamingWriterConfig(max_open_files=1))
+    sink.deliver(sample_batch(0))
+    assert len(sink.handler.appenders) == 1
+    assert len(committed_files(tmp_path)) == 1
+    sink.stop()
+    assert read_ids(sink, committed_files(tmp_path)) == list(range(10))
+
+
+def test_firehose_stop_commits_open_files(tmp_path):
+    sink = LocalSink(str(tmp_path), "parquet", streaming_writers=StreamingWriterConfig())
+    firehose = MiniFirehose("streaming", [sink], FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1,
+                                                                buffer_size_limit_mb=-1))
+    firehose.start()
+    for i in range(35):
+        firehose.add_message({"id": i})
+    firehose.stop()
+    files = committed_files(tmp_path)
+    assert len(files) == 1
+    assert read_ids(sink, files) == list(range(35))
+
+
+@pytest.mark.parametrize("output_format,compression", [("csv", None), ("json", None), ("json", "gzip")])
+def test_files_left_open_by_a_crash_are_committed_on_start(tmp_path, output_format, compression):
+    crashed = LocalSink(str(tmp_path), output_format, compression=compression,
+                        streaming_writers=StreamingWriterConfig())
+    crashed.deliver(sample_batch(0))
+    crashed.deliver(sample_batch(10))
+    [appender] = crashed.handler.appenders.values()
+    if compression is None:
+        # A torn last line
+        appender.file.write(b"20,name-")
+        appender.file.flush()
+    # The process dies without stopping the sink
+
+    sink = LocalSink(str(tmp_path), output_format, compression=compression,
+                     streaming_writers=StreamingWriterConfig())
+    sink.start()
+    files = committed_files(tmp_path)
+    assert files == [appender.path]
+    assert read_ids(sink, files) == list(range(20))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".inprogress")]
+    sink.stop()
+
+
+def test_parquet_files_left_open_by_a_crash_are_removed(tmp_path):
+    crashed = LocalSink(str(tmp_path), "parquet", streaming_writers=StreamingWriterConfig())
+    crashed.deliver(sample_batch(0))
+
+    sink = LocalSink(str(tmp_path), "parquet", streaming_writers=StreamingWriterConfig())
+    sink.start()
+    assert os.listdir(tmp_path) == []
+    sink.stop()
+
+
+def test_wal_segments_are_kept_until_the_file_is_committed(tmp_path):
+    wal_directory = tmp_path / "wal"
+    sink = LocalSink(str(tmp_path / "data"), "json", streaming_writers=StreamingWriterConfig())
+    config = FirehoseConfig(buffer_count_limit=10, buffer_time_limit=-1, buffer_size_limit_mb=-1,
+                            wal_directory=str(wal_directory))
+    firehose = MiniFirehose("test_streaming_wal", [sink], config)
+    firehose.start()
+    firehose.add_messages(sample_batch(0, 30))
+    deadline = time.time() + 2
+    while firehose.in_flight_batches and time.time() < deadline:
+        time.sleep(0.01)
+    # Delivered, but only appended to an open file
+    assert len(os.listdir(wal_directory / "test_streaming_wal")) == 4
+
+    sink.handler.close_appenders()
+    assert os.listdir(wal_directory / "test_streaming_wal") == ["00000000000000000004.wal"]
+    firehose.stop()
+    assert os.listdir(wal_directory / "test_streaming_wal") == []
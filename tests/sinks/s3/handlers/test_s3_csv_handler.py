@@ -90,12 +90,12 @@ def test_write_csv_file_to_s3(mock_boto, s3_csv_handler, sample_data):
     assert key_exists(bucket, "/".join([prefix, filename])), f"File does not exist"
 
 
-@patch('common.handler.datetime')
+@patch('common.FileNameGenerator.datetime')
 def test_write_partitioned_data_to_s3(mock_datetime, mock_boto, sample_data):
     mock_datetime.now.return_value = datetime(2023, 1, 1, 12, 0, 0)
     filename = '20230101120000.csv'
     partition_cols = ["Region"]
-    s3_csv_handler = S3CSVHandler(bucket, prefix, partition_cols=partition_cols)
+    s3_csv_handler = S3CSVHandler(bucket, prefix, partition_cols=partition_cols, filename_based_on='datetime')
     s3_csv_handler.write(sample_data)
     all_combinations = set(tuple(entry[col] for col in partition_cols) for i, entry in sample_data.iterrows())
     expected_objects = [
@@ -108,12 +108,12 @@ def test_write_partitioned_data_to_s3(mock_datetime, mock_boto, sample_data):
     assert sorted(expected_objects) == sorted(actual_objects)
 
 
-@patch('common.handler.datetime')
+@patch('common.FileNameGenerator.datetime')
 def test_write_multi_level_partitioned_data_to_s3(mock_datetime, mock_boto, sample_data):
     mock_datetime.now.return_value = datetime(2023, 1, 1, 12, 0, 0)
     filename = '20230101120000.csv'
     partition_cols = ["Region", "Salesperson"]
-    s3_csv_handler = S3CSVHandler(bucket, prefix, partition_cols=partition_cols)
+    s3_csv_handler = S3CSVHandler(bucket, prefix, partition_cols=partition_cols, filename_based_on='datetime')
     s3_csv_handler.write(sample_data)
     all_combinations = set(tuple(entry[col] for col in partition_cols) for i, entry in sample_data.iterrows())
     expected_objects = [
@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+import boto3
+import pandas as pd
+import pytest
+import s3fs
+from moto import mock_s3
+
+from sinks.s3.handlers.s3_csv_handler import S3CSVHandler
+from sinks.s3.handlers.s3_json_handler import S3JsonHandler
+from sinks.s3.handlers.s3_parquet_handler import S3ParquetHandler
+
+bucket = "testbucket"
+prefix = "testprefix"
+
+
+@pytest.fixture()
+def mock_boto():
+    with mock_s3():
+        res = boto3.resource('s3')
+        res.create_bucket(Bucket=bucket, CreateBucketConfiguration={
+            'LocationConstraint': 'eu-west-1'
+        })
+        yield
+
+
+@pytest.fixture
+def sample_data():
+    return pd.DataFrame({
+        "id": range(1000),
+        "name": [f"name-{i}" for i in range(1000)],
+        "amount": [i * 0.5 for i in range(1000)]
+    })
+
+
+@pytest.mark.parametrize("handler_class, read", [
+    (S3CSVHandler, pd.read_csv),
+    (S3JsonHandler, lambda f: pd.read_json(f, lines=True)),
+    (S3ParquetHandler, pd.read_parquet),
+])
+@patch("common.handler.ENCODE_CHUNK_ROWS", 300)
+def test_chunked_encoding_round_trip(mock_boto, sample_data, handler_class, read):
+    handler = handler_class(bucket, prefix)
+    handler.write(sample_data, "data")
+
+    with s3fs.S3FileSystem().open(f"s3://{bucket}/{prefix}/data", mode="rb") as f:
+        actual = read(f)
+    pd.testing.assert_frame_equal(sample_data, actual, check_dtype=False)
+
+
+@pytest.mark.parametrize("handler_class, read", [
+    (S3CSVHandler, pd.read_csv),
+    (S3JsonHandler, lambda f: pd.read_json(f, lines=True)),
+])
+@patch("common.handler.ENCODE_CHUNK_ROWS", 300)
+def test_chunked_record_encoding_round_trip(mock_boto, sample_data, handler_class, read):
+    handler = handler_class(bucket, prefix)
+    handler.write(sample_data.to_dict("records"), "data")
+
+    with s3fs.S3FileSystem().open(f"s3://{bucket}/{prefix}/data", mode="rb") as f:
+        actual = read(f)
+    pd.testing.assert_frame_equal(sample_data, actual, check_dtype=False)
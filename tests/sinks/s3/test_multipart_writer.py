@@ -0,0 +1,58 @@
+import os
+from unittest.mock import patch
+
+import boto3
+import pytest
+from moto import mock_s3
+
+from sinks.s3.multipart_writer import MultipartWriter
+
+bucket = "testbucket"
+MB = 1024 * 1024
+
+
+@pytest.fixture()
+def s3_client():
+    with mock_s3():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket=bucket, CreateBucketConfiguration={
+            'LocationConstraint': 'eu-west-1'
+        })
+        yield client
+
+
+def read_object(client, key):
+    return client.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+
+def test_small_object_is_put_in_one_request(s3_client):
+    with patch.object(s3_client, "create_multipart_upload") as create_multipart_upload:
+        with MultipartWriter(s3_client, f"s3://{bucket}/prefix/small.csv", part_size_mb=5) as writer:
+            writer.write("a,b\n")
+            writer.write(b"1,2\n")
+    create_multipart_upload.assert_not_called()
+    assert read_object(s3_client, "prefix/small.csv") == b"a,b\n1,2\n"
+
+
+def test_large_object_is_uploaded_in_parts(s3_client):
+    data = os.urandom(12 * MB)
+    with MultipartWriter(s3_client, f"s3://{bucket}/large.bin", part_size_mb=5, max_concurrency=2) as writer:
+        for start in range(0, len(data), MB):
+            writer.write(data[start:start + MB])
+        assert writer.tell() == len(data)
+    assert [part["PartNumber"] for part in writer.parts] == [1, 2, 3]
+    assert read_object(s3_client, "large.bin") == data
+
+
+def test_failed_write_aborts_upload(s3_client):
+    with pytest.raises(RuntimeError):
+        with MultipartWriter(s3_client, f"s3://{bucket}/failed.bin", part_size_mb=5) as writer:
+            writer.write(os.urandom(6 * MB))
+            raise RuntimeError("Encoding failed")
+    assert s3_client.list_multipart_uploads(Bucket=bucket).get("Uploads", []) == []
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=bucket)
+
+
+def test_part_size_validation(s3_client):
+    with pytest.raises(ValueError):
+        MultipartWriter(s3_client, f"s3://{bucket}/key", part_size_mb=1)
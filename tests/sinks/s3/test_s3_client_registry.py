@@ -0,0 +1,46 @@
+from unittest.mock import patch
+
+import pytest
+from botocore.exceptions import EndpointConnectionError
+
+from sinks.s3.s3_client_registry import S3ClientRegistry
+from sinks.s3.s3_sink import S3Sink
+
+s3_config = {"access-key": "key", "secret-key": "secret", "endpoint-url": "http://localhost:9000"}
+
+
+@pytest.fixture
+def registry():
+    registry = S3ClientRegistry(max_pool_connections=8)
+    yield registry
+    registry.clear()
+
+
+def test_clients_are_shared_per_credentials(registry):
+    assert registry.get() is registry.get()
+    assert registry.get(s3_config) is registry.get(dict(s3_config))
+    assert registry.get(s3_config) is not registry.get()
+    assert registry.get(s3_config) is not registry.get({**s3_config, "access-key": "other"})
+
+
+def test_pool_is_sized_for_uploads(registry):
+    client = registry.get(s3_config)
+    assert client.s3_fs.s3.meta.config.max_pool_connections == 8
+    assert client.executor._max_workers == 8
+
+
+@patch("sinks.s3.s3_client_registry.boto3.client")
+def test_credentials_are_checked_once(boto_client, registry):
+    boto_client.return_value.get_caller_identity.side_effect = EndpointConnectionError(endpoint_url="sts")
+    assert registry.check_credentials(s3_config) is False
+    assert registry.check_credentials(s3_config) is False
+    assert boto_client.return_value.get_caller_identity.call_count == 1
+
+
+@patch("sinks.s3.s3_client_registry.boto3.client")
+def test_sink_creation_does_not_check_credentials(boto_client, registry):
+    with patch("sinks.s3.handlers.s3_handler.S3Handler.registry", registry):
+        first = S3Sink("bucket", "prefix", "csv", s3_config=s3_config)
+        second = S3Sink("bucket", "prefix", "json", s3_config=s3_config)
+    boto_client.assert_not_called()
+    assert first.handler.s3_fs is second.handler.s3_fs
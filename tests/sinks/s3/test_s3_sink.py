@@ -68,4 +68,19 @@ def test_transformation(mock_boto, sample_data):
     actual_df = pd.read_csv(s3_fs.open(file_path, mode="r"))
 
     assert expected_df.shape == actual_df.shape, "DataFrames have different shapes."
-    pd.testing.assert_frame_equal(expected_df, actual_df)
\ No newline at end of file
+    pd.testing.assert_frame_equal(expected_df, actual_df)
+
+
+@pytest.mark.parametrize("output_format, compression, suffix", [
+    ("csv", "zstd", ".csv.zst"),
+    ("json", "gzip", ".json.gz"),
+    ("parquet", "gzip", ".parquet"),
+])
+def test_compression(mock_boto, sample_data, output_format, compression, suffix):
+    sink = S3Sink(bucket, prefix, output_format, compression=compression, compression_level=5)
+    sink.deliver(sample_data)
+
+    objects = list_objects(bucket, prefix)
+    assert len(objects) == 1 and objects[0].endswith(suffix)
+    actual = sink.handler._read_data(objects[0])
+    pd.testing.assert_frame_equal(pd.DataFrame(sample_data), actual, check_dtype=False)
@@ -0,0 +1,161 @@
+import json
+import os
+import time
+
+import boto3
+import pandas as pd
+import pytest
+from moto import mock_s3
+
+from mini_firehose.cli import MiniFirehoseCLI
+from sinks.compaction import CompactionConfig, MANIFEST_PREFIX
+from sinks.local.local_sink import LocalSink
+from sinks.s3.s3_sink import S3Sink
+
+bucket = "testbucket"
+
+
+def sample_batch(start, count=10):
+    return [{"Region": ["East", "West"][i % 2], "id": i, "name": f"name-{i}"} for i in range(start, start + count)]
+
+
+def data_files(directory, suffix):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names
+                  if name.endswith(suffix))
+
+
+def read_bytes(sink, path):
+    with open(path, "rb") as f:
+        return sink.handler.compression.open_input(f).read() if sink.handler.compression.compresses_text else f.read()
+
+
+def read_all(sink, files):
+    return pd.concat([sink.handler._read_data(path) for path in files], ignore_index=True)
+
+
+@pytest.mark.parametrize("output_format", ["csv", "json", "parquet"])
+def test_small_files_are_merged_per_partition(tmp_path, output_format):
+    sink = LocalSink(str(tmp_path), output_format, partition_cols=["Region"],
+                     compaction=CompactionConfig(min_file_age=0, interval=-1))
+    for start in range(0, 50, 10):
+        sink.deliver(sample_batch(start))
+    before = read_all(sink, data_files(tmp_path, output_format))
+    assert len(data_files(tmp_path, output_format)) == 10
+
+    stats = sink.compact()
+    files = data_files(tmp_path, output_format)
+    assert stats["files-compacted"] == 10 and stats["files-written"] == 2
+    assert [os.path.basename(os.path.dirname(path)) for path in files] == ["Region=East", "Region=West"]
+    after = read_all(sink, files)
+    pd.testing.assert_frame_equal(before.sort_values("id", ignore_index=True), after.sort_values("id", ignore_index=True))
+
+
+@pytest.mark.parametrize("output_format,compression", [("csv", None), ("json", None), ("csv", "gzip"),
+                                                        ("json", "zstd")])
+def test_text_files_are_merged_byte_for_byte(tmp_path, output_format, compression):
+    sink = LocalSink(str(tmp_path), output_format, compression=compression,
+                     compaction=CompactionConfig(min_file_age=0, interval=-1))
+    batches = [[{"zip": "00501", "note": "", "count": 1}], [{"zip": "02134", "note": "x", "count": None}],
+               [{"zip": "10001", "note": "", "count": 3}]]
+    for batch in batches:
+        sink.deliver(batch)
+        # Unique file names are ordered by time, compaction keeps that order
+        time.sleep(0.002)
+    lines = [line for path in data_files(tmp_path, sink.handler.file_extension)
+             for line in read_bytes(sink, path).splitlines()]
+
+    sink.compact()
+    [merged] = data_files(tmp_path, sink.handler.file_extension)
+    data = read_bytes(sink, merged)
+    if output_format == "csv":
+        header = lines[0]
+        assert data.splitlines() == [header] + [line for line in lines if line != header]
+        assert b"00501,," in data
+    else:
+        assert data.splitlines() == lines
+        assert b'"zip":"00501","note":""' in data
+
+
+def test_csv_files_with_different_columns_are_merged_separately(tmp_path):
+    sink = LocalSink(str(tmp_path), "csv", compaction=CompactionConfig(min_file_age=0, interval=-1))
+    for batch in ([{"a": 1}], [{"a": 2}], [{"a": 3, "b": 4}], [{"a": 5, "b": 6}]):
+        sink.deliver(batch)
+        time.sleep(0.002)
+    stats = sink.compact()
+    assert stats["files-compacted"] == 4 and stats["files-written"] == 2
+    contents = sorted(open(path).read() for path in data_files(tmp_path, "csv"))
+    assert contents == ["a\n1\n2\n", "a,b\n3,4\n5,6\n"]
+
+
+def test_target_size_and_min_age(tmp_path):
+    sink = LocalSink(str(tmp_path), "csv", compaction=CompactionConfig(min_file_age=0, interval=-1,
+                                                                     target_file_mb=0.0005))
+    for start in range(0, 60, 10):
+        sink.deliver(sample_batch(start))
+    # Each file is about 190 bytes, so at most two fit into a merged file of 524 bytes
+    sink.compact()
+    assert len(data_files(tmp_path, "csv")) == 3
+
+    sink.compactor.config.min_file_age = 3600
+    sink.deliver(sample_batch(100))
+    assert sink.compact()["files-compacted"] == 0
+
+
+def test_interrupted_compaction_is_finished(tmp_path):
+    sink = LocalSink(str(tmp_path), "csv", compaction=CompactionConfig(min_file_age=0, interval=-1))
+    for start in range(0, 30, 10):
+        sink.deliver(sample_batch(start))
+    inputs = data_files(tmp_path, "csv")
+    # Simulates a crash after the merged file was committed but before its inputs were removed
+    output = os.path.join(tmp_path, "merged.csv")
+    read_all(sink, inputs).to_csv(output, index=False)
+    with open(os.path.join(tmp_path, f"{MANIFEST_PREFIX}1.json"), "w") as manifest:
+        json.dump({"output": output, "inputs": inputs[:2]}, manifest)
+
+    sink.compact()
+    assert data_files(tmp_path, "csv") == sorted([output, inputs[2]])
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(MANIFEST_PREFIX)]
+
+
+def test_background_compaction_runs_with_the_firehose(tmp_path):
+    sink = LocalSink(str(tmp_path), "json", compaction=CompactionConfig(min_file_age=0, interval=0.05))
+    for start in range(0, 30, 10):
+        sink.deliver(sample_batch(start))
+    sink.start()
+    deadline = time.time() + 2
+    while len(data_files(tmp_path, "json")) > 1 and time.time() < deadline:
+        time.sleep(0.01)
+    sink.stop()
+    assert len(data_files(tmp_path, "json")) == 1
+
+
+def test_s3_compaction(monkeypatch):
+    with mock_s3():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket=bucket, CreateBucketConfiguration={'LocationConstraint': 'eu-west-1'})
+        sink = S3Sink(bucket, "prefix", "parquet", partition_cols=["Region"],
+                      compaction=CompactionConfig(min_file_age=0, interval=-1))
+        monkeypatch.setattr(sink.handler.registry, "check_credentials", lambda s3_config: True)
+        for start in range(0, 30, 10):
+            sink.deliver(sample_batch(start))
+        assert sink.compact()["files-written"] == 2
+        keys = sorted(obj["Key"] for obj in client.list_objects_v2(Bucket=bucket)["Contents"])
+        assert len(keys) == 2
+        assert all(key.endswith(".parquet") for key in keys)
+        df = pd.concat([sink.handler._read_data(f"s3://{bucket}/{key}") for key in keys])
+        assert sorted(df["id"]) == list(range(30))
+
+
+def test_compact_command(tmp_path, capsys):
+    sink = LocalSink(str(tmp_path), "csv")
+    for start in range(0, 30, 10):
+        sink.deliver(sample_batch(start))
+    MiniFirehoseCLI().run(["compact", "local", "--directory", str(tmp_path), "--output-format", "csv",
+                           "--min-file-age", "0"])
+    assert json.loads(capsys.readouterr().out)["files-compacted"] == 3
+    assert len(data_files(tmp_path, "csv")) == 1
+
+
+def test_compaction_not_configured(tmp_path):
+    with pytest.raises(ValueError):
+        LocalSink(str(tmp_path), "csv").compact()